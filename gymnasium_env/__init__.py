@@ -0,0 +1,41 @@
+import gymnasium as gym
+
+from gymnasium_env.env_pool import EnvPool
+
+#
+# Registration of the environments of the package.
+#
+# `register_envs()` registers every environment with gymnasium, once per
+# process however many times it is called. Entry points are strings, so the
+# environment modules (and their dependencies, e.g. matplotlib for the 3D
+# one) are only imported by `gym.make`:
+#
+#   gymnasium_env/GridWorld-v0          grid_world.py
+#   gymnasium_env/GridWorldRender-v0    grid_world_render.py
+#   gymnasium_env/GridWorld-v1          grid_world_obstacles.py
+#   gymnasium_env/GridWorldCPP-v0       grid_world_cpp.py
+#   gymnasium_env/GridWorldCPPMulti-v0  grid_world_cpp_multi.py
+#   gymnasium_env/GridWorld3D-v0        grid_world_3D.py
+#
+# Usage:
+#
+#   from gymnasium_env import register_envs
+#   register_envs()
+#   env = gym.make("gymnasium_env/GridWorldCPP-v0", size=10, obs_quantity=12)
+#
+
+ENV_IDS = {
+    "gymnasium_env/GridWorld-v0": "gymnasium_env.grid_world:GridWorldEnv",
+    "gymnasium_env/GridWorldRender-v0": "gymnasium_env.grid_world_render:GridWorldRenderEnv",
+    "gymnasium_env/GridWorld-v1": "gymnasium_env.grid_world_obstacles:GridWorldRenderEnv",
+    "gymnasium_env/GridWorldCPP-v0": "gymnasium_env.grid_world_cpp:GridWorldCPPEnv",
+    "gymnasium_env/GridWorldCPPMulti-v0": "gymnasium_env.grid_world_cpp_multi:GridWorldCPPMultiEnv",
+    "gymnasium_env/GridWorld3D-v0": "gymnasium_env.grid_world_3D:GridWorldEnv",
+}
+
+
+def register_envs():
+    """Register the environments of ENV_IDS that are not registered yet."""
+    for env_id, entry_point in ENV_IDS.items():
+        if env_id not in gym.registry:
+            gym.register(id=env_id, entry_point=entry_point)
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import numpy as np
+import torch
+
+from gymnasium_env.recorder import TrajectoryDataset
+
+#
+# Behavior cloning: supervised pretraining of an SB3 policy on expert data.
+#
+# `pretrain_policy` maximizes the log-probability that the policy assigns to
+# the expert actions of a `TrajectoryDataset` (e.g. recorded with
+# `gymnasium_env.planners.record_expert_episodes`). Only the actor is
+# trained; the model is then handed to the usual `model.learn`, which
+# starts from the warm-started policy instead of a random one.
+#
+# Usage:
+#
+#   model = PPO("MultiInputPolicy", env, ...)
+#   pretrain_policy(model.policy, TrajectoryDataset("datasets/expert_cpp_5_3_200"))
+#   model.learn(total_timesteps=...)
+#
+
+
+def _to_tensor(observation):
+    if isinstance(observation, dict):
+        return {key: torch.as_tensor(value, dtype=torch.float32) for key, value in observation.items()}
+    return torch.as_tensor(observation, dtype=torch.float32)
+
+
+def pretrain_policy(policy, dataset: TrajectoryDataset, epochs: int = 10, batch_size: int = 256,
+                    learning_rate: float = 1e-3, seed: Optional[int] = 0, verbose: int = 1):
+    """Train `policy` to imitate the actions of `dataset`; returns the per-epoch metrics."""
+    optimizer = torch.optim.Adam(policy.parameters(), lr=learning_rate)
+    policy.set_training_mode(True)
+    history = []
+    for epoch in range(epochs):
+        losses, correct, total = [], 0, 0
+        for batch in dataset.iter_batches(batch_size, shuffle=True, seed=None if seed is None else seed + epoch):
+            observation = _to_tensor(batch["obs"])
+            actions = torch.as_tensor(batch["action"])
+            _, log_prob, _ = policy.evaluate_actions(observation, actions)
+            loss = -log_prob.mean()
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+            with torch.no_grad():
+                predicted = policy.get_distribution(observation).mode()
+            losses.append(loss.item())
+            correct += int((predicted == actions).sum())
+            total += len(actions)
+
+        metrics = {"epoch": epoch + 1, "loss": float(np.mean(losses)), "accuracy": correct / total}
+        history.append(metrics)
+        if verbose:
+            print(f"BC epoch {metrics['epoch']}/{epochs}: loss {metrics['loss']:.4f}, accuracy {metrics['accuracy']:.1%}")
+    policy.set_training_mode(False)
+    return history
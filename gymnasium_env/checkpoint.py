@@ -0,0 +1,214 @@
+import glob
+import json
+import os
+import pickle
+import signal
+from typing import Optional
+
+import numpy as np
+import torch
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.logger import CSVOutputFormat, configure
+
+from gymnasium_env.model_registry import parse_model_name
+from gymnasium_env.rng import RandomBuffer
+
+#
+# Periodic, preemption-safe checkpoints for the train scripts.
+#
+# `PreemptionCheckpoint` is an SB3 callback that, every `save_freq`
+# timesteps, writes to `checkpoint_dir`:
+#
+#   checkpoint.zip   model (policy and optimizer state), via model.save
+#   rng.pkl          RNG state of every training env (its generator and the
+#                    position of its RandomBuffer, see gymnasium_env/rng.py),
+#                    numpy and torch
+#   checkpoint.json  number of timesteps; written last, marks a complete checkpoint
+#
+# Every file is written to a temporary path and then renamed, so a job
+# killed while saving never leaves a corrupted checkpoint behind.
+#
+# Checkpoints are only taken between rollouts, after the policy update on
+# the previous rollout: there the saved weights have been trained on every
+# one of the `num_timesteps` counted, so a resumed run neither loses nor
+# skips transitions.
+#
+# When the process receives SIGTERM (e.g. a preemptible node being
+# reclaimed), the callback saves a final checkpoint when the current
+# rollout and its update are done, and stops training; the script should
+# then exit without saving the final model (see `interrupted`).
+#
+# Usage in a train script:
+#
+#   checkpoint = PreemptionCheckpoint(f'{log_dir}/checkpoint', save_freq=50_000)
+#   model = checkpoint.load(env) or PPO("MlpPolicy", env, ...)
+#   model.set_logger(configure_logger(log_dir))
+#   model.learn(total_timesteps=TOTAL_TIMESTEPS - model.num_timesteps,
+#               reset_num_timesteps=False, callback=checkpoint)
+#   if checkpoint.interrupted:
+#       sys.exit(143)
+#
+
+
+def _dump_atomic(path: str, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class PreemptionCheckpoint(BaseCallback):
+
+    def __init__(self, checkpoint_dir: str, save_freq: int = 50_000, verbose: int = 1):
+        super().__init__(verbose)
+        self.checkpoint_dir = checkpoint_dir
+        self.save_freq = save_freq
+        self.interrupted = False
+        self._stop_requested = False
+        self._last_save = 0
+        self._previous_handler = None
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.checkpoint_dir, "checkpoint.zip")
+
+    @property
+    def rng_path(self) -> str:
+        return os.path.join(self.checkpoint_dir, "rng.pkl")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.checkpoint_dir, "checkpoint.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def load(self, env, algorithm=PPO, **kwargs):
+        """Load the latest checkpoint bound to `env`, or return None if there is none."""
+        if not self.exists():
+            return None
+        model = algorithm.load(self.model_path, env=env, device="cpu", **kwargs)
+        with open(self.rng_path, "rb") as f:
+            rng_state = pickle.load(f)
+        vec_env = model.get_env()
+        buffer_states = rng_state.get("rng_buffers") or [None] * len(rng_state["envs"])
+        for i, (generator, buffer_state) in enumerate(zip(rng_state["envs"], buffer_states)):
+            if buffer_state is not None:
+                # The resets draw from the block buffered at the checkpoint: restore
+                # it, bound to the generator the env gets, or the env would drop it
+                buffer = RandomBuffer(buffer_state["block_size"])
+                buffer.set_state(generator, buffer_state["state"])
+                vec_env.env_method("set_wrapper_attr", "_rng_buffer", buffer, indices=i)
+            vec_env.set_attr("np_random", generator, indices=i)
+        np.random.set_state(rng_state["numpy"])
+        torch.set_rng_state(rng_state["torch"])
+        self._last_save = model.num_timesteps
+        if self.verbose:
+            print(f"Resuming from checkpoint at {model.num_timesteps} timesteps ({self.checkpoint_dir})")
+        return model
+
+    def save(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        rng_state = {
+            "envs": self.training_env.get_attr("np_random"),
+            "rng_buffers": self._buffer_states(),
+            "numpy": np.random.get_state(),
+            "torch": torch.get_rng_state(),
+        }
+        _dump_atomic(self.rng_path, lambda f: pickle.dump(rng_state, f))
+        # model.save appends ".zip" to paths without it
+        tmp_model_path = f"{self.model_path[:-4]}.{os.getpid()}.tmp.zip"
+        self.model.save(tmp_model_path)
+        os.replace(tmp_model_path, self.model_path)
+        meta = {"num_timesteps": self.model.num_timesteps}
+        _dump_atomic(self.meta_path, lambda f: f.write(json.dumps(meta).encode()))
+        self._last_save = self.model.num_timesteps
+        if self.verbose:
+            print(f"Checkpoint saved at {self.model.num_timesteps} timesteps")
+
+    def _buffer_states(self):
+        # Position of the RandomBuffer of each env; None for envs without one
+        # or that have not drawn from it yet
+        states = []
+        for i in range(self.training_env.num_envs):
+            try:
+                buffer = self.training_env.get_attr("_rng_buffer", indices=i)[0]
+            except AttributeError:
+                buffer = None
+            if buffer is None or buffer._generator is None:
+                states.append(None)
+            else:
+                states.append({"block_size": buffer.block_size, "state": buffer.get_state()})
+        return states
+
+    def _handle_sigterm(self, signum, frame):
+        # Only flag the request here: saving in the middle of a rollout
+        # could happen while the model is being updated
+        self._stop_requested = True
+
+    def _on_training_start(self):
+        try:
+            self._previous_handler = signal.signal(signal.SIGTERM, self._handle_sigterm)
+        except ValueError:
+            # signal handlers can only be installed from the main thread
+            self._previous_handler = None
+
+    def _on_rollout_start(self):
+        # Called after the update on the previous rollout, when the weights
+        # match num_timesteps (see the module comment)
+        if self._stop_requested:
+            self.save()
+            self.interrupted = True
+            if self.verbose:
+                print("SIGTERM received, training stopped after saving a checkpoint")
+        elif self.model.num_timesteps - self._last_save >= self.save_freq:
+            self.save()
+
+    def _on_step(self) -> bool:
+        # The first step of the rollout after an interruption checkpoint stops training
+        return not self.interrupted
+
+    def _on_training_end(self):
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+
+
+def configure_logger(log_dir: str, formats=("stdout", "csv", "tensorboard")):
+    """Like SB3's `configure`, but keeps the rows of an existing progress.csv.
+
+    SB3 truncates progress.csv when a logger is created, which would lose the
+    history of a resumed run. The old rows are written back and new rows are
+    appended after them.
+    """
+    csv_path = os.path.join(log_dir, "progress.csv")
+    old_rows = ""
+    if "csv" in formats and os.path.exists(csv_path):
+        with open(csv_path) as f:
+            old_rows = f.read()
+
+    logger = configure(log_dir, list(formats))
+    if old_rows:
+        for output_format in logger.output_formats:
+            if isinstance(output_format, CSVOutputFormat):
+                output_format.keys = old_rows.splitlines()[0].split(",")
+                output_format.file.write(old_rows)
+                output_format.file.flush()
+    return logger
+
+
+def find_incomplete_run(run_prefix: str, log_root: str = "log", data_dir: str = "data", tag: Optional[str] = None):
+    """Return the newest run named `run_prefix*` with a checkpoint but no final model.
+
+    Only runs whose name ends with the given model name `tag` (e.g. "masked")
+    are considered; with no tag, only untagged runs.
+    """
+    candidates = []
+    for meta_path in glob.glob(os.path.join(log_root, run_prefix + "*", "checkpoint", "checkpoint.json")):
+        run_name = os.path.basename(os.path.dirname(os.path.dirname(meta_path)))
+        if parse_model_name(run_name).tag != tag:
+            continue
+        if not os.path.exists(os.path.join(data_dir, run_name + ".zip")):
+            candidates.append(run_name)
+    return max(candidates) if candidates else None
@@ -0,0 +1,56 @@
+import gymnasium as gym
+import torch
+from stable_baselines3.common.preprocessing import is_image_space
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+#
+# Features extractor for the egocentric window observations of
+# GridWorldCPPEnv (obs_window, see gymnasium_env/grid_world_cpp.py).
+#
+# SB3's NatureCNN (the default of CnnPolicy and of the image keys of
+# MultiInputPolicy) was designed for 84x84 Atari frames and fails on windows
+# smaller than 36 cells. `WindowCNN` uses two 3x3 convolutions with padding,
+# which work for any window size, and flattens the other keys of a Dict
+# observation (agent position, coverage, 3x3 neighbors) next to the CNN
+# features.
+#
+# Usage:
+#
+#   env = GridWorldCPPEnv(size=20, obs_quantity=40, obs_window=11, obs_frontier=True)
+#   model = PPO("MultiInputPolicy", env, policy_kwargs={"features_extractor_class": WindowCNN})
+#
+#   env = GridWorldCPPEnv(size=20, obs_quantity=40, obs_window=11, obs_format="image")
+#   model = PPO("CnnPolicy", env, policy_kwargs={"features_extractor_class": WindowCNN})
+#
+
+
+class WindowCNN(BaseFeaturesExtractor):
+    """Small CNN for the image observations (or image keys) and flatten for the other keys."""
+
+    def __init__(self, observation_space: gym.Space, features_dim: int = 128, channels: int = 32):
+        super().__init__(observation_space, features_dim)
+        spaces = observation_space.spaces if isinstance(observation_space, gym.spaces.Dict) else {None: observation_space}
+        self.extractors = torch.nn.ModuleDict()
+        total = 0
+        for key, space in spaces.items():
+            if is_image_space(space, check_channels=False):
+                n_channels, height, width = space.shape
+                self.extractors[str(key)] = torch.nn.Sequential(
+                    torch.nn.Conv2d(n_channels, channels, 3, padding=1),
+                    torch.nn.ReLU(),
+                    torch.nn.Conv2d(channels, channels, 3, padding=1),
+                    torch.nn.ReLU(),
+                    torch.nn.Flatten(),
+                )
+                total += channels * height * width
+            else:
+                self.extractors[str(key)] = torch.nn.Flatten()
+                total += gym.spaces.flatdim(space)
+        self.keys = list(spaces)
+        self.linear = torch.nn.Sequential(torch.nn.Linear(total, features_dim), torch.nn.ReLU())
+
+    def forward(self, observations) -> torch.Tensor:
+        if not isinstance(observations, dict):
+            observations = {None: observations}
+        features = [self.extractors[str(key)](observations[key]) for key in self.keys]
+        return self.linear(torch.cat(features, dim=1))
@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from stable_baselines3 import PPO
+
+from gymnasium_env.checkpoint import PreemptionCheckpoint, configure_logger
+from gymnasium_env.evaluation import evaluate_policy, summarize
+from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
+from gymnasium_env.inference import BatchPolicy, export_policy
+
+#
+# Resumable curriculum learning for the CPP environment.
+#
+# The agent is trained on a list of stages of increasing difficulty, e.g.
+# 5x5 with 3 obstacles, then 10x10 with 12 obstacles, then 20x20 with 48
+# obstacles. The observation of GridWorldCPPEnv is normalized by the grid
+# size, so the weights learned in one stage are reused as they are in the
+# next one.
+#
+# Inside a stage, training runs in chunks of `eval_interval` timesteps. After
+# every chunk the model is checkpointed and evaluated with a batched
+# evaluation; the stage ends when the average coverage reaches the stage
+# threshold or when its timestep budget is exhausted. Checkpoints are taken
+# by `PreemptionCheckpoint` (gymnasium_env/checkpoint.py) in
+# `<run_dir>/stage<N>/`, also every `checkpoint_freq` timesteps and on
+# SIGTERM, in which case `run_curriculum` returns None and the script should
+# exit.
+#
+# The progress is stored in `<run_dir>/curriculum.json`. Calling
+# `run_curriculum` again with the same `run_dir` resumes from the last
+# checkpoint instead of starting over. A finished curriculum, or one started
+# from another initial model, is not resumed: it raises a ValueError.
+# `find_incomplete_curriculum` finds the unfinished run directory to resume,
+# so every new curriculum gets its own timestamped directory. The final
+# model of every stage is also saved in `data/` with the usual naming
+# convention and the `_curriculum` tag, so it can be found by
+# `ModelRegistry`, and its logs are in `log/` under the same name (appended
+# to when a stage is resumed).
+#
+
+
+class CurriculumStage(NamedTuple):
+    size: int
+    obstacles: int
+    max_steps: int
+    total_timesteps: int
+    coverage_threshold: float = 0.95
+
+
+DEFAULT_STAGES = [
+    CurriculumStage(5, 3, 200, 500_000),
+    CurriculumStage(10, 12, 500, 500_000),
+    CurriculumStage(20, 48, 1000, 500_000),
+]
+
+
+def _save_atomic(model, path: str):
+    # model.save appends ".zip" to paths without it
+    tmp_path = f"{path[:-4]}.{os.getpid()}.tmp.zip"
+    model.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _save_state(state: dict, state_path: str):
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def _make_env(stage: CurriculumStage):
+    return GridWorldCPPEnv(size=stage.size, obs_quantity=stage.obstacles, max_steps=stage.max_steps)
+
+
+def evaluate_coverage(model, stage: CurriculumStage, export_path: str, episodes: int, seed: int = 0) -> dict:
+    """Batched evaluation of the current weights of `model` on `stage`."""
+    module, meta = export_policy(model.policy, export_path)
+    policy = BatchPolicy(module, meta, seed=seed)
+    results = evaluate_policy(policy, lambda: _make_env(stage), n_episodes=episodes, seed=seed)
+    return summarize(results)
+
+
+def find_incomplete_curriculum(run_prefix: str, stages, initial_model: Optional[str] = None) -> Optional[str]:
+    """Return the newest unfinished run directory named `run_prefix*` with these `stages` and `initial_model`."""
+    stages = [list(CurriculumStage(*stage)) for stage in stages]
+    candidates = []
+    for state_path in glob.glob(run_prefix + "*/curriculum.json"):
+        with open(state_path) as f:
+            state = json.load(f)
+        if (state["stages"] == stages and state.get("initial_model") == initial_model
+                and state["completed"] < len(stages)):
+            candidates.append(os.path.dirname(state_path))
+    return max(candidates) if candidates else None
+
+
+def run_curriculum(stages, run_dir: str, initial_model: Optional[str] = None,
+                   ent_coef: float = 0.05, eval_interval: int = 50_000, eval_episodes: int = 50,
+                   data_dir: str = "data", log_root: str = "log", checkpoint_freq: int = 10_000):
+    """Train through `stages`, resuming from `run_dir` if it holds a previous run.
+
+    Returns the path of the final model of the last stage, or None if
+    training was interrupted by SIGTERM (after saving a checkpoint).
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    os.makedirs(data_dir, exist_ok=True)
+    state_path = os.path.join(run_dir, "curriculum.json")
+    stages = [CurriculumStage(*stage) for stage in stages]
+
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if [list(stage) for stage in stages] != state["stages"]:
+            raise ValueError(f"{run_dir} holds a curriculum with different stages: {state['stages']}")
+        if state.get("initial_model") != initial_model:
+            raise ValueError(f"{run_dir} holds a curriculum started from {state.get('initial_model')}, not {initial_model}")
+        if state["completed"] == len(stages):
+            raise ValueError(f"{run_dir} holds a finished curriculum, its final model is {state['models'][-1]}")
+        print(f"Resuming curriculum from stage {state['completed'] + 1}/{len(stages)}")
+    else:
+        state = {
+            "stages": [list(stage) for stage in stages],
+            "initial_model": initial_model,
+            "completed": 0,
+            "stage_timesteps": 0,
+            "stage_start": 0,
+            "models": [],
+            "evaluations": [],
+            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+        }
+        _save_state(state, state_path)
+
+    while state["completed"] < len(stages):
+        index = state["completed"]
+        stage = stages[index]
+        env = _make_env(stage)
+
+        checkpoint = PreemptionCheckpoint(os.path.join(run_dir, f"stage{index + 1}"), save_freq=checkpoint_freq)
+        # Interrupted in the middle of this stage
+        model = checkpoint.load(env)
+        if model is None:
+            if state["models"]:
+                model = PPO.load(state["models"][-1], env=env, device="cpu")
+            elif initial_model is not None:
+                model = PPO.load(initial_model, env=env, device="cpu")
+            else:
+                model = PPO("MultiInputPolicy", env, verbose=1, ent_coef=ent_coef, device="cpu")
+            state["stage_start"] = model.num_timesteps
+            _save_state(state, state_path)
+
+        # Same name as the model of the stage (see gymnasium_env/model_registry.py)
+        run_name = f"ppo_cpp_{stage.size}_{stage.obstacles}_{stage.max_steps}_{ent_coef}_{state['timestamp']}_curriculum"
+        model.set_logger(configure_logger(os.path.join(log_root, run_name)))
+        print(f"--- Stage {index + 1}/{len(stages)}: {stage.size}x{stage.size}, "
+              f"{stage.obstacles} obstacles, max_steps {stage.max_steps} ---")
+
+        state["stage_timesteps"] = model.num_timesteps - state["stage_start"]
+        while state["stage_timesteps"] < stage.total_timesteps:
+            chunk = min(eval_interval, stage.total_timesteps - state["stage_timesteps"])
+            model.learn(total_timesteps=chunk, reset_num_timesteps=False, callback=checkpoint)
+            if checkpoint.interrupted:
+                _save_state(state, state_path)
+                return None
+            checkpoint.save()
+            state["stage_timesteps"] = model.num_timesteps - state["stage_start"]
+
+            summary = evaluate_coverage(model, stage, os.path.join(run_dir, "latest.policy.pt"), eval_episodes)
+            summary.update(stage=index + 1, timesteps=state["stage_timesteps"])
+            state["evaluations"].append(summary)
+            _save_state(state, state_path)
+            print(f"Stage {index + 1} after {state['stage_timesteps']} timesteps: "
+                  f"coverage {summary['avg_coverage']:.1%}, full coverage {summary['success_rate']:.1%}")
+
+            if summary["avg_coverage"] >= stage.coverage_threshold:
+                print(f"Coverage threshold {stage.coverage_threshold:.0%} reached, advancing")
+                break
+
+        model_path = os.path.join(data_dir, run_name + ".zip")
+        _save_atomic(model, model_path)
+        state["models"].append(model_path)
+        state["completed"] = index + 1
+        state["stage_timesteps"] = 0
+        _save_state(state, state_path)
+        print(f"Stage {index + 1} saved to {model_path}")
+
+    return state["models"][-1]
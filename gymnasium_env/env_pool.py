@@ -0,0 +1,80 @@
+import contextlib
+from typing import Dict, List, Tuple
+
+import gymnasium as gym
+
+#
+# Pool of constructed environments for evaluation and sweep loops.
+#
+# `gym.make` builds the environment, its spaces and lookup tables, and wraps
+# it in the env checker, order enforcing and time limit wrappers. Loops that
+# make an environment per episode pay for all of this every time, and the
+# passive env checker runs its checks again on each new instance.
+# `EnvPool` caches the environments it made by (id, kwargs): `acquire` hands
+# out an idle one when there is one and makes a new one otherwise, `release`
+# returns it to the pool. A reused environment is not reset by the pool, the
+# caller resets it (with its own seed) as it would a new one.
+#
+# Usage:
+#
+#   register_envs()
+#   pool = EnvPool()
+#   for episode in range(100):
+#       with pool.borrow("gymnasium_env/GridWorld3D-v0", size=10, obs_format="flat") as env:
+#           obs, info = env.reset()
+#           ...
+#   pool.close()
+#
+
+
+def _key(env_id: str, kwargs: dict) -> Tuple[str, str]:
+    # repr makes unhashable arguments (lists, dicts) usable as keys
+    return env_id, repr(sorted(kwargs.items()))
+
+
+class EnvPool:
+
+    def __init__(self, max_idle: int = 16):
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[Tuple[str, str], List[gym.Env]] = {}
+        self._keys: Dict[int, Tuple[str, str]] = {}  # id(env) -> key, for the environments handed out
+
+    def acquire(self, env_id: str, **kwargs) -> gym.Env:
+        """An idle environment made with `gym.make(env_id, **kwargs)`, or a new one."""
+        key = _key(env_id, kwargs)
+        idle = self._idle.get(key)
+        if idle:
+            env = idle.pop()
+            self.reused += 1
+        else:
+            env = gym.make(env_id, **kwargs)
+            self.created += 1
+        self._keys[id(env)] = key
+        return env
+
+    def release(self, env: gym.Env):
+        """Return an environment obtained from `acquire`; it is closed if the pool is full."""
+        key = self._keys.pop(id(env))
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle:
+            idle.append(env)
+        else:
+            env.close()
+
+    @contextlib.contextmanager
+    def borrow(self, env_id: str, **kwargs):
+        """`acquire` for the duration of a with block."""
+        env = self.acquire(env_id, **kwargs)
+        try:
+            yield env
+        finally:
+            self.release(env)
+
+    def close(self):
+        """Close the idle environments."""
+        for idle in self._idle.values():
+            for env in idle:
+                env.close()
+        self._idle.clear()
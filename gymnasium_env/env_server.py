@@ -0,0 +1,419 @@
+import asyncio
+import json
+import pickle
+import socket
+import struct
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+#
+# Environment server for remote actors.
+#
+# `EnvServer` hosts environments built by `make_env` behind an asyncio server
+# on a TCP ("host:port") or Unix socket ("unix:/path") address. Each client
+# connection gets its own pool of `n_envs` environments and drives it with
+# batched requests: one STEP message carries the actions of the whole pool
+# and its reply carries all the observations, rewards and flags.
+#
+# `RemoteVecEnv` is the client: an SB3 VecEnv whose environments live in one
+# or more servers (`n_envs` on each), so it can be passed to PPO like a
+# DummyVecEnv/SubprocVecEnv. With several servers, a step sends the actions
+# to all of them before waiting for the replies, so the servers (separate
+# processes, possibly on other machines) simulate in parallel.
+#
+# Messages are a 5-byte header (type, payload length) followed by the
+# payload. Arrays travel as raw little-endian bytes in the dtypes of the
+# spaces, observation keys in sorted order:
+#
+#   HELLO  n_envs (uint32) + JSON options  ->  pickled spaces
+#   RESET  seeds (int64, -1 = no seed)     ->  observations
+#   STEP   actions (int64)                 ->  observations, rewards (float32),
+#                                              flags (uint8, bit 0 terminated, bit 1 truncated),
+#                                              info values (float64, n_envs x info_keys),
+#                                              terminal observations of the finished envs
+#   CALL   pickled (get_attr|set_attr|env_method|env_is_wrapped, ...)  ->  pickled results
+#   CLOSE                                  ->  OK
+#
+# Finished environments are reset by the server, as SB3 VecEnvs do. Only the
+# `info_keys` requested by the client (numeric values such as "coverage")
+# are sent back; other attributes and methods (e.g. `action_masks` for
+# MaskablePPO) are available through CALL. Spaces and CALL payloads are
+# pickled, so servers must only listen on trusted networks.
+#
+# Episode returns and lengths are not sent either: wrap the client in SB3's
+# VecMonitor, which computes them from the rewards and dones, so that PPO
+# logs rollout/ep_rew_mean and rollout/ep_len_mean.
+#
+# Usage:
+#
+#   python run_env_server.py cpp 5 3 200 127.0.0.1:5555    # on each simulation host
+#
+#   env = VecMonitor(RemoteVecEnv(["127.0.0.1:5555"], n_envs=8, info_keys=["coverage"]))
+#   model = PPO("MultiInputPolicy", env)
+#
+
+HEADER = struct.Struct("<BI")
+HELLO, RESET, STEP, CALL, CLOSE, OK, ERROR = range(1, 8)
+TERMINATED, TRUNCATED = 1, 2
+
+
+def parse_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """("unix", path) or ("tcp", (host, port)) for an address "unix:/path" or "host:port"."""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class ObservationCodec:
+    """Packs a list of observations of `space` into raw bytes and back into batched arrays."""
+
+    def __init__(self, space: gym.Space):
+        if isinstance(space, gym.spaces.Dict):
+            self.keys = sorted(space.spaces)
+            subspaces = [space.spaces[key] for key in self.keys]
+        else:
+            self.keys = None
+            subspaces = [space]
+        self.shapes = [subspace.shape for subspace in subspaces]
+        self.dtypes = [np.dtype(subspace.dtype).newbyteorder("<") for subspace in subspaces]
+        self.item_size = sum(int(np.prod(shape)) * dtype.itemsize for shape, dtype in zip(self.shapes, self.dtypes))
+
+    def encode(self, observations: list) -> bytes:
+        if self.keys is None:
+            return np.asarray(observations, dtype=self.dtypes[0]).tobytes()
+        return b"".join(
+            np.asarray([obs[key] for obs in observations], dtype=dtype).tobytes()
+            for key, dtype in zip(self.keys, self.dtypes)
+        )
+
+    def decode(self, buffer, n: int, offset: int = 0):
+        """Return (batched observations, offset after them)."""
+        arrays = []
+        for shape, dtype in zip(self.shapes, self.dtypes):
+            count = n * int(np.prod(shape))
+            arrays.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(n, *shape))
+            offset += count * dtype.itemsize
+        if self.keys is None:
+            return arrays[0], offset
+        return dict(zip(self.keys, arrays)), offset
+
+
+class _Session:
+    """The environments of one client connection."""
+
+    def __init__(self, make_env: Callable[[], gym.Env], n_envs: int, info_keys: Sequence[str]):
+        self.envs = [make_env() for _ in range(n_envs)]
+        self.info_keys = list(info_keys)
+        self.codec = ObservationCodec(self.envs[0].observation_space)
+
+    def spaces(self) -> bytes:
+        env = self.envs[0]
+        return pickle.dumps({"observation_space": env.observation_space, "action_space": env.action_space})
+
+    def reset(self, payload: bytes) -> bytes:
+        seeds = np.frombuffer(payload, dtype="<i8")
+        observations = [env.reset(seed=None if seed < 0 else int(seed))[0] for env, seed in zip(self.envs, seeds)]
+        return self.codec.encode(observations)
+
+    def step(self, payload: bytes) -> bytes:
+        actions = np.frombuffer(payload, dtype="<i8")
+        n = len(self.envs)
+        observations, terminal_observations = [], []
+        rewards = np.zeros(n, dtype="<f4")
+        flags = np.zeros(n, dtype=np.uint8)
+        infos = np.full((n, len(self.info_keys)), np.nan, dtype="<f8")
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            obs, rewards[i], terminated, truncated, info = env.step(int(action))
+            flags[i] = TERMINATED * bool(terminated) | TRUNCATED * bool(truncated)
+            for j, key in enumerate(self.info_keys):
+                if key in info:
+                    infos[i, j] = info[key]
+            if terminated or truncated:
+                terminal_observations.append(obs)
+                obs, _ = env.reset()
+            observations.append(obs)
+        parts = [self.codec.encode(observations), rewards.tobytes(), flags.tobytes(), infos.tobytes()]
+        if terminal_observations:
+            parts.append(self.codec.encode(terminal_observations))
+        return b"".join(parts)
+
+    def call(self, payload: bytes) -> bytes:
+        kind, name, args, kwargs, indices = pickle.loads(payload)
+        envs = [self.envs[i] for i in indices]
+        if kind == "get_attr":
+            results = [env.get_wrapper_attr(name) for env in envs]
+        elif kind == "set_attr":
+            results = [setattr(env, name, args[0]) for env in envs]
+        elif kind == "env_method":
+            results = [env.get_wrapper_attr(name)(*args, **kwargs) for env in envs]
+        elif kind == "env_is_wrapped":
+            from stable_baselines3.common.env_util import is_wrapped
+
+            results = [is_wrapped(env, args[0]) for env in envs]
+        else:
+            raise ValueError(f"Unknown call {kind}")
+        return pickle.dumps(results)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+        self.envs = []
+
+
+class EnvServer:
+    """Serves pools of environments built by `make_env` (see the module comment)."""
+
+    def __init__(self, make_env: Callable[[], gym.Env], address: str = "127.0.0.1:0"):
+        self.make_env = make_env
+        self.address = address
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    async def start(self) -> str:
+        """Start listening; returns the bound address (with the actual port for port 0)."""
+        family, target = parse_address(self.address)
+        if family == "unix":
+            self._server = await asyncio.start_unix_server(self._serve_connection, path=target)
+        else:
+            self._server = await asyncio.start_server(self._serve_connection, *target)
+            host, port = self._server.sockets[0].getsockname()[:2]
+            self.address = f"{host}:{port}"
+        return self.address
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def run(self):
+        """Serve until interrupted (blocking)."""
+        asyncio.run(self.serve_forever())
+
+    def start_background(self) -> str:
+        """Serve from a daemon thread (e.g. for local tests); returns the bound address."""
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.address
+
+    def stop(self):
+        """Stop a server started with `start_background`."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = None
+        try:
+            while True:
+                kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(length)
+                try:
+                    if kind == HELLO:
+                        n_envs, = struct.unpack_from("<I", payload)
+                        options = json.loads(payload[4:].decode() or "{}")
+                        if session is not None:
+                            session.close()
+                        session = _Session(self.make_env, n_envs, options.get("info_keys", []))
+                        reply_kind, reply = OK, session.spaces()
+                    elif kind == CLOSE:
+                        reply_kind, reply = OK, b""
+                    elif session is None:
+                        raise RuntimeError("HELLO must be the first message")
+                    elif kind == RESET:
+                        reply_kind, reply = OK, session.reset(payload)
+                    elif kind == STEP:
+                        reply_kind, reply = OK, session.step(payload)
+                    elif kind == CALL:
+                        reply_kind, reply = OK, session.call(payload)
+                    else:
+                        raise RuntimeError(f"Unknown message type {kind}")
+                except Exception as error:
+                    reply_kind, reply = ERROR, repr(error).encode()
+                writer.write(HEADER.pack(reply_kind, len(reply)))
+                writer.write(reply)
+                await writer.drain()
+                if kind == CLOSE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # the client went away
+        finally:
+            if session is not None:
+                session.close()
+            writer.close()
+
+
+class _Connection:
+    """Blocking client side of one server connection."""
+
+    def __init__(self, address: str):
+        family, target = parse_address(address)
+        if family == "unix":
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(target)
+        else:
+            self.sock = socket.create_connection(target)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.address = address
+
+    def send(self, kind: int, payload: bytes = b""):
+        self.sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+
+    def _receive_exactly(self, n: int) -> bytearray:
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        received = 0
+        while received < n:
+            count = self.sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError(f"Env server {self.address} closed the connection")
+            received += count
+        return buffer
+
+    def receive(self) -> bytearray:
+        kind, length = HEADER.unpack(self._receive_exactly(HEADER.size))
+        payload = self._receive_exactly(length)
+        if kind == ERROR:
+            raise RuntimeError(f"Env server {self.address}: {payload.decode()}")
+        return payload
+
+    def request(self, kind: int, payload: bytes = b"") -> bytearray:
+        self.send(kind, payload)
+        return self.receive()
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteVecEnv(VecEnv):
+    """SB3 VecEnv running `n_envs` environments on each of the `addresses` servers."""
+
+    def __init__(self, addresses: Union[str, Sequence[str]], n_envs: int = 1, info_keys: Sequence[str] = ()):
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        self.info_keys = list(info_keys)
+        self.n_envs_per_server = n_envs
+        self.connections = [_Connection(address) for address in addresses]
+        hello = struct.pack("<I", n_envs) + json.dumps({"info_keys": self.info_keys}).encode()
+        for connection in self.connections:
+            connection.send(HELLO, hello)
+        spaces = [pickle.loads(reply) for reply in self._gather(self.connections)]
+        self.codec = ObservationCodec(spaces[0]["observation_space"])
+        self._closed = False
+        super().__init__(n_envs * len(addresses), spaces[0]["observation_space"], spaces[0]["action_space"])
+
+    @staticmethod
+    def _gather(connections: list) -> list:
+        """Replies of `connections`; every reply is read before an error is raised, to keep them in sync."""
+        replies, error = [], None
+        for connection in connections:
+            try:
+                replies.append(connection.receive())
+            except RuntimeError as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return replies
+
+    def _concat(self, batches: list):
+        if self.codec.keys is None:
+            return np.concatenate(batches)
+        return {key: np.concatenate([batch[key] for batch in batches]) for key in self.codec.keys}
+
+    def reset(self):
+        seeds = np.array([-1 if seed is None else seed for seed in self._seeds], dtype="<i8")
+        n = self.n_envs_per_server
+        for k, connection in enumerate(self.connections):
+            connection.send(RESET, seeds[k * n:(k + 1) * n].tobytes())
+        batches = [self.codec.decode(buffer, n)[0] for buffer in self._gather(self.connections)]
+        # Seeds are only used once (options are not sent to the servers)
+        self._reset_seeds()
+        self._reset_options()
+        return self._concat(batches)
+
+    def step_async(self, actions: np.ndarray):
+        actions = np.asarray(actions, dtype="<i8").reshape(self.num_envs)
+        n = self.n_envs_per_server
+        for k, connection in enumerate(self.connections):
+            connection.send(STEP, actions[k * n:(k + 1) * n].tobytes())
+
+    def step_wait(self):
+        n = self.n_envs_per_server
+        observations, rewards, dones, infos = [], [], [], []
+        for buffer in self._gather(self.connections):
+            obs, offset = self.codec.decode(buffer, n)
+            reward = np.frombuffer(buffer, dtype="<f4", count=n, offset=offset)
+            offset += 4 * n
+            flags = np.frombuffer(buffer, dtype=np.uint8, count=n, offset=offset)
+            offset += n
+            values = np.frombuffer(buffer, dtype="<f8", count=n * len(self.info_keys), offset=offset)
+            values = values.reshape(n, len(self.info_keys))
+            offset += values.nbytes
+            finished = np.flatnonzero(flags)
+            terminal, _ = self.codec.decode(buffer, len(finished), offset)
+
+            for i in range(n):
+                terminated, truncated = bool(flags[i] & TERMINATED), bool(flags[i] & TRUNCATED)
+                info = {key: values[i, j] for j, key in enumerate(self.info_keys) if not np.isnan(values[i, j])}
+                info["TimeLimit.truncated"] = truncated and not terminated
+                infos.append(info)
+            for row, i in enumerate(finished):
+                if self.codec.keys is None:
+                    infos[-n + i]["terminal_observation"] = terminal[row].copy()
+                else:
+                    infos[-n + i]["terminal_observation"] = {key: terminal[key][row].copy() for key in self.codec.keys}
+            observations.append(obs)
+            rewards.append(reward)
+            dones.append(flags != 0)
+        return self._concat(observations), np.concatenate(rewards), np.concatenate(dones), infos
+
+    def _call(self, kind: str, name: Optional[str], args=(), kwargs=None, indices=None) -> list:
+        indices = list(self._get_indices(indices))
+        n = self.n_envs_per_server
+        requests = []
+        for k, connection in enumerate(self.connections):
+            local = [i - k * n for i in indices if k * n <= i < (k + 1) * n]
+            if local:
+                connection.send(CALL, pickle.dumps((kind, name, args, kwargs or {}, local)))
+                requests.append(connection)
+        return [result for reply in self._gather(requests) for result in pickle.loads(reply)]
+
+    def get_attr(self, attr_name: str, indices=None) -> List:
+        return self._call("get_attr", attr_name, indices=indices)
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        self._call("set_attr", attr_name, (value,), indices=indices)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List:
+        return self._call("env_method", method_name, method_args, method_kwargs, indices=indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return self._call("env_is_wrapped", None, (wrapper_class,), indices=indices)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for connection in self.connections:
+            try:
+                connection.request(CLOSE)
+            except (ConnectionError, RuntimeError):
+                pass
+            connection.close()
@@ -0,0 +1,190 @@
+from typing import Optional
+
+import numpy as np
+
+#
+# Batched evaluation of trained policies.
+#
+# Instead of running the evaluation episodes one after the other with one
+# `model.predict` call per step, `evaluate_policy` steps `n_envs`
+# environments in lockstep and asks the policy for all their actions in a
+# single batched call (see `gymnasium_env.inference.BatchPolicy`).
+#
+# Usage:
+#
+#   policy = ModelRegistry("data").load_policy("latest", env="cpp", dim=5)
+#   results = evaluate_policy(policy, lambda: GridWorldCPPEnv(size=5, obs_quantity=3), n_episodes=100)
+#   print(summarize(results))
+#
+# `CoverageTracker` records, for CPP episodes, the agent position and the
+# number of visited cells after every step into preallocated arrays, from
+# which it derives the visitation heatmap (one vectorized scatter-add over
+# all the recorded positions), coverage-vs-step curves, the revisit ratio and
+# the quantiles of the steps needed to reach a given coverage:
+#
+#   tracker = CoverageTracker(size=5, n_episodes=100, max_steps=200)
+#   results = evaluate_policy(policy, make_env, n_episodes=100, tracker=tracker)
+#   tracker.heatmap(), tracker.coverage_curves(), tracker.summary()
+#
+
+
+def _stack(observations):
+    if isinstance(observations[0], dict):
+        return {key: np.stack([obs[key] for obs in observations]) for key in observations[0]}
+    return np.stack(observations)
+
+
+class CoverageTracker:
+    """Per-step coverage metrics of up to `n_episodes` CPP episodes of at most `max_steps` steps."""
+
+    def __init__(self, size: int, n_episodes: int, max_steps: int):
+        self.size = size
+        self.max_steps = max_steps
+        self.positions = np.zeros((n_episodes, max_steps + 1, 2), dtype=np.int32)
+        self.visited = np.zeros((n_episodes, max_steps + 1), dtype=np.int32)
+        self.free_cells = np.zeros(n_episodes, dtype=np.int32)
+        self.lengths = np.full(n_episodes, -1, dtype=np.int64)
+
+    def record(self, episode: int, step: int, location, info: dict):
+        """Record the state after `step` steps (0 after reset) of `episode`; `info` is the CPP env's info."""
+        self.positions[episode, step] = location
+        self.visited[episode, step] = info["visited_cells"]
+        self.free_cells[episode] = info["total_free_cells"]
+        self.lengths[episode] = step
+
+    def _valid_steps(self) -> np.ndarray:
+        """(episodes, max_steps + 1) mask of the recorded steps of the recorded episodes."""
+        recorded = self.lengths >= 0
+        return recorded[:, None] & (np.arange(self.max_steps + 1) <= self.lengths[:, None])
+
+    def heatmap(self) -> np.ndarray:
+        """(size, size) number of steps the agents spent on each cell [x, y], over all episodes."""
+        positions = self.positions[self._valid_steps()]
+        counts = np.bincount(positions[:, 0] * self.size + positions[:, 1], minlength=self.size * self.size)
+        return counts.reshape(self.size, self.size)
+
+    def coverage_curves(self) -> np.ndarray:
+        """(episodes, max_steps + 1) coverage after each step; it stays at the final one after the episode ends."""
+        recorded = self.lengths >= 0
+        last = np.minimum(np.arange(self.max_steps + 1), np.maximum(self.lengths, 0)[:, None])
+        visited = np.take_along_axis(self.visited, last, axis=1)
+        return visited[recorded] / np.maximum(self.free_cells[recorded], 1)[:, None]
+
+    def revisit_ratio(self) -> np.ndarray:
+        """Fraction of the steps of each episode that moved the agent to an already visited cell."""
+        recorded = self.lengths >= 0
+        valid = self._valid_steps()[:, 1:]
+        moved = (self.positions[:, 1:] != self.positions[:, :-1]).any(axis=2)
+        new_cell = np.diff(self.visited, axis=1) > 0
+        revisits = (moved & ~new_cell & valid).sum(axis=1)
+        return revisits[recorded] / np.maximum(self.lengths[recorded], 1)
+
+    def time_to_coverage(self, fraction: float) -> np.ndarray:
+        """Steps each episode needed to cover `fraction` of the free cells (-1 if it never did)."""
+        recorded = self.lengths >= 0
+        needed = np.ceil(fraction * self.free_cells[recorded] - 1e-9)
+        reached = (self.visited[recorded] >= needed[:, None]) & self._valid_steps()[recorded]
+        return np.where(reached.any(axis=1), np.argmax(reached, axis=1), -1)
+
+    def summary(self, fractions=(0.5, 0.9, 1.0), quantiles=(0.5, 0.9)) -> dict:
+        """Mean revisit ratio, and per coverage fraction the share of episodes reaching it and the step quantiles."""
+        summary = {"revisit_ratio": float(np.mean(self.revisit_ratio()))}
+        for fraction in fractions:
+            steps = self.time_to_coverage(fraction)
+            reached = steps[steps >= 0]
+            summary[f"reached_{fraction:.0%}"] = float(np.mean(steps >= 0))
+            for q in quantiles:
+                summary[f"steps_to_{fraction:.0%}_q{q * 100:.0f}"] = float(np.quantile(reached, q)) if len(reached) else np.nan
+        return summary
+
+
+def evaluate_policy(policy, make_env, n_episodes: int = 100, n_envs: int = 16,
+                    deterministic: bool = False, seed: Optional[int] = None, use_masks: bool = False,
+                    tracker: Optional[CoverageTracker] = None):
+    """Run `n_episodes` episodes of `policy` on environments built by `make_env`.
+
+    Episode `i` is reset with `seed + i` when `seed` is given, so results do
+    not depend on `n_envs`. Returns a dict of per-episode arrays: `reward`,
+    `steps`, `terminated` and, when the environment reports it in `info`,
+    `coverage`. With `use_masks`, the actions are restricted to the
+    environments' `action_masks()` (for models trained with MaskablePPO).
+    With a `tracker`, every step of the CPP episodes is recorded into it.
+    """
+    envs = [make_env() for _ in range(min(n_envs, n_episodes))]
+
+    rewards = np.zeros(n_episodes, dtype=np.float64)
+    steps = np.zeros(n_episodes, dtype=np.int64)
+    terminated = np.zeros(n_episodes, dtype=bool)
+    coverage = np.full(n_episodes, np.nan, dtype=np.float64)
+
+    # Environments that can draw the seeded layouts of all the episodes at once
+    # get them in options["layout"] instead of being reseeded every episode
+    layouts = None
+    if seed is not None and hasattr(envs[0].unwrapped, "seeded_layouts"):
+        layouts = envs[0].unwrapped.seeded_layouts(seed + np.arange(n_episodes))
+
+    observations = [None] * len(envs)
+    episode_of_env = [-1] * len(envs)
+    next_episode = 0
+
+    def start_episode(i):
+        nonlocal next_episode
+        if layouts is not None:
+            observations[i], info = envs[i].reset(options={"layout": layouts[next_episode]})
+        else:
+            episode_seed = None if seed is None else seed + next_episode
+            observations[i], info = envs[i].reset(seed=episode_seed)
+        episode_of_env[i] = next_episode
+        if tracker is not None:
+            tracker.record(next_episode, 0, envs[i].unwrapped._agent_location, info)
+        next_episode += 1
+
+    for i in range(len(envs)):
+        start_episode(i)
+
+    active = list(range(len(envs)))
+    while active:
+        masks = np.stack([envs[i].action_masks() for i in active]) if use_masks else None
+        actions, _ = policy.predict(_stack([observations[i] for i in active]), deterministic=deterministic,
+                                    action_masks=masks)
+        still_active = []
+        for i, action in zip(active, actions):
+            episode = episode_of_env[i]
+            observations[i], reward, done, truncated, info = envs[i].step(int(action))
+            rewards[episode] += reward
+            steps[episode] += 1
+            if tracker is not None:
+                tracker.record(episode, steps[episode], envs[i].unwrapped._agent_location, info)
+            if done or truncated:
+                terminated[episode] = done
+                coverage[episode] = info.get("coverage", np.nan)
+                if next_episode < n_episodes:
+                    start_episode(i)
+                    still_active.append(i)
+            else:
+                still_active.append(i)
+        active = still_active
+
+    for env in envs:
+        env.close()
+
+    results = {"reward": rewards, "steps": steps, "terminated": terminated}
+    if not np.all(np.isnan(coverage)):
+        results["coverage"] = coverage
+    return results
+
+
+def summarize(results) -> dict:
+    """Aggregate the per-episode arrays returned by `evaluate_policy`."""
+    summary = {
+        "episodes": len(results["steps"]),
+        "success_rate": float(np.mean(results["terminated"])),
+        "avg_reward": float(np.mean(results["reward"])),
+        "avg_steps": float(np.mean(results["steps"])),
+        "std_steps": float(np.std(results["steps"])),
+    }
+    if "coverage" in results:
+        summary["avg_coverage"] = float(np.mean(results["coverage"]))
+        summary["std_coverage"] = float(np.std(results["coverage"]))
+        summary["min_coverage"] = float(np.min(results["coverage"]))
+    return summary
@@ -2,6 +2,8 @@ from typing import Optional
 import numpy as np
 import gymnasium as gym
 
+from gymnasium_env.rng import RandomBuffer
+
 #
 # This code is based on the example available at:
 # https://gymnasium.farama.org/introduction/create_custom_env/
@@ -9,13 +11,14 @@ import gymnasium as gym
 
 class GridWorldEnv(gym.Env):
 
-    def __init__(self, size: int = 5):
+    def __init__(self, size: int = 5, obs_format: str = "dict"):
         # The size of the square grid
         self.size = size
 
         # Define the agent and target location; randomly chosen in `reset` and updated in `step`
         self._agent_location = np.array([-1, -1], dtype=np.int32)
         self._target_location = np.array([-1, -1], dtype=np.int32)
+        self._rng_buffer = RandomBuffer()
 
         # Observations are dictionaries with the agent's and the target's location.
         # Each location is encoded as an element of {0, ..., `size`-1}^2
@@ -26,6 +29,18 @@ class GridWorldEnv(gym.Env):
             }
         )
 
+        # With obs_format="flat" the observation is a float32 vector with the same
+        # layout produced by the FlattenObservation wrapper (keys in sorted order),
+        # so models trained with the wrapper keep working without it. The other
+        # environments of the package follow the same convention.
+        assert obs_format in ("dict", "flat")
+        self.obs_format = obs_format
+        if obs_format == "flat":
+            flat_space = gym.spaces.flatten_space(self.observation_space)
+            self.observation_space = gym.spaces.Box(
+                flat_space.low.astype(np.float32), flat_space.high.astype(np.float32), dtype=np.float32
+            )
+
         # We have 4 actions, corresponding to "right", "up", "left", "down"
         self.action_space = gym.spaces.Discrete(4)
         # Dictionary maps the abstract actions to the directions on the grid
@@ -37,6 +52,8 @@ class GridWorldEnv(gym.Env):
         }
 
     def _get_obs(self):
+        if self.obs_format == "flat":
+            return np.concatenate((self._agent_location, self._target_location), dtype=np.float32)
         return {"agent": self._agent_location, "target": self._target_location}
     
     def _get_info(self):
@@ -50,16 +67,14 @@ class GridWorldEnv(gym.Env):
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
 
-        # Choose the agent's location uniformly at random
-        self._agent_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-
-        # We will sample the target's location randomly until it does not coincide with the agent's location
-        self._target_location = self._agent_location
-        while np.array_equal(self._target_location, self._agent_location):
-            self._target_location = self.np_random.integers(
-                0, self.size, size=2, dtype=int
-            )
+        # Agent and target are placed in two distinct random cells, drawn from a
+        # buffer of pre-drawn random numbers (see gymnasium_env/rng.py)
+        cells = self._rng_buffer.sample_distinct(self.size ** 2, 2)
+        self._agent_location, self._target_location = np.stack(
+            np.unravel_index(cells, (self.size, self.size)), axis=1
+        )
 
         observation = self._get_obs()
         info = self._get_info()
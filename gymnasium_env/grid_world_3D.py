@@ -7,39 +7,72 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 
+from gymnasium_env.rendering import AsyncRenderer
+from gymnasium_env.rng import RandomBuffer
+from gymnasium_env.voxels import VoxelGrid
+
 #
 # This code is based on the example available at:
 # https://gymnasium.farama.org/introduction/create_custom_env/
 #
 # The example above was adapted to create a 3D grid environment.
 #
+# With `obs_quantity` > 0, that many voxels are obstacles: the agent cannot
+# move into them and the observation gets a "neighbors" entry with the
+# occupancy (0 = free, 1 = obstacle or outside the grid) of the 6 voxels
+# next to the agent, in action order. The obstacles are kept in a sparse
+# bit-packed `VoxelGrid` (see gymnasium_env/voxels.py) and drawn without
+# building a size^3 volume, so the environment also runs at sizes like
+# 1000x1000x1000 (see experimento_grid_3D.md).
+#
+# Obstacles are only drawn by the matplotlib renderer up to
+# MAX_DRAWN_OBSTACLES of them.
+#
+
+MAX_DRAWN_OBSTACLES = 2000
 
 class GridWorldEnv(gym.Env):
-    metadata = {"render_modes": ["human"], "render_fps": 4}
+    metadata = {"render_modes": ["human", "human_async"], "render_fps": 4}
 
-    def __init__(self, render_mode: Optional[str] = None, size: int = 5, max_steps: int = 100):
+    def __init__(self, render_mode: Optional[str] = None, size: int = 5, max_steps: int = 100, obs_format: str = "dict",
+                 obs_quantity: int = 0):
         # The size of the square grid
         self.size = size
         self.count_steps = 0
         self.max_steps = max_steps
+        self.obs_quantity = obs_quantity
         
         # Rendering setup
         self.render_mode = render_mode
         self.fig = None
         self.ax = None
+        self._async_renderer = None
 
         # Define the agent and target location; randomly chosen in `reset` and updated in `step`
         self._agent_location = np.array([-1, -1, -1], dtype=np.int32)
         self._target_location = np.array([-1, -1, -1], dtype=np.int32)
+        self._rng_buffer = RandomBuffer()
+        self._voxels = VoxelGrid(size)
+        self._neighbors = np.zeros(6, dtype=np.uint8)
 
         # Observations are dictionaries with the agent's and the target's location.
         # Each location is encoded as an element of {0, ..., `size`-1}^2
-        self.observation_space = gym.spaces.Dict(
-            {
-                "agent": gym.spaces.Box(0, size - 1, shape=(3,), dtype=int),
-                "target": gym.spaces.Box(0, size - 1, shape=(3,), dtype=int),
-            }
-        )
+        spaces = {
+            "agent": gym.spaces.Box(0, size - 1, shape=(3,), dtype=int),
+            "target": gym.spaces.Box(0, size - 1, shape=(3,), dtype=int),
+        }
+        if obs_quantity > 0:
+            spaces["neighbors"] = gym.spaces.Box(0, 1, shape=(6,), dtype=np.uint8)
+        self.observation_space = gym.spaces.Dict(spaces)
+
+        # obs_format="flat": FlattenObservation's layout, see GridWorldEnv in grid_world.py
+        assert obs_format in ("dict", "flat")
+        self.obs_format = obs_format
+        if obs_format == "flat":
+            flat_space = gym.spaces.flatten_space(self.observation_space)
+            self.observation_space = gym.spaces.Box(
+                flat_space.low.astype(np.float32), flat_space.high.astype(np.float32), dtype=np.float32
+            )
 
         # We have 6 actions, corresponding to "right", "up", "left", "down", "forward", "backward"
         self.action_space = gym.spaces.Discrete(6)
@@ -54,6 +87,15 @@ class GridWorldEnv(gym.Env):
         }
 
     def _get_obs(self):
+        if self.obs_format == "flat":
+            # Keys in sorted order: agent, neighbors, target
+            if self.obs_quantity > 0:
+                parts = (self._agent_location, self._neighbors, self._target_location)
+            else:
+                parts = (self._agent_location, self._target_location)
+            return np.concatenate(parts, dtype=np.float32)
+        if self.obs_quantity > 0:
+            return {"agent": self._agent_location, "neighbors": self._neighbors.copy(), "target": self._target_location}
         return {"agent": self._agent_location, "target": self._target_location}
     
     def _get_info(self):
@@ -67,22 +109,23 @@ class GridWorldEnv(gym.Env):
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
         self.count_steps = 0
 
-        # Choose the agent's location uniformly at random
-        self._agent_location = self.np_random.integers(0, self.size, size=3, dtype=int)
-
-        # We will sample the target's location randomly until it does not coincide with the agent's location
-        self._target_location = self._agent_location
-        while np.array_equal(self._target_location, self._agent_location):
-            self._target_location = self.np_random.integers(
-                0, self.size, size=3, dtype=int
-            )
+        # Agent, target and obstacles are placed in distinct random cells, drawn
+        # from a buffer of pre-drawn random numbers (see gymnasium_env/rng.py);
+        # this only allocates memory for the drawn cells, not for the volume
+        cells = self._rng_buffer.sample_distinct(self.size ** 3, 2 + self.obs_quantity)
+        locations = np.stack(np.unravel_index(cells, (self.size, self.size, self.size)), axis=1)
+        self._agent_location, self._target_location = locations[0], locations[1]
+        if self.obs_quantity > 0:
+            self._voxels = VoxelGrid.from_points(self.size, locations[2:])
+            self._voxels.neighbors(self._agent_location, out=self._neighbors)
 
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, info
@@ -91,9 +134,16 @@ class GridWorldEnv(gym.Env):
         # Map the action (element of {0,1,2,3,4,5}) to the direction we walk in
         direction = self._action_to_direction[action]
         # We use `np.clip` to make sure we don't leave the grid bounds
-        self._agent_location = np.clip(
+        new_location = np.clip(
             self._agent_location + direction, 0, self.size - 1
         )
+        if self.obs_quantity > 0:
+            # The agent does not move into obstacles
+            if not self._voxels.occupied(*new_location.tolist()):
+                self._agent_location = new_location
+            self._voxels.neighbors(self._agent_location, out=self._neighbors)
+        else:
+            self._agent_location = new_location
 
         reward = 0
         self.count_steps += 1
@@ -124,7 +174,7 @@ class GridWorldEnv(gym.Env):
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, reward, terminated, truncated, info
@@ -134,83 +184,142 @@ class GridWorldEnv(gym.Env):
             print("Rendering frame...")  # Debug print
             self._render_frame()
 
-    def _render_frame(self):
-        if self.fig is None:
-            plt.ion()  # Turn on interactive mode
-            self.fig = plt.figure(figsize=(10, 10))
-            self.ax = self.fig.add_subplot(111, projection='3d')
-            plt.show(block=False)  # Show the window without blocking
-            
-            # Try to bring window to front if possible
-            try:
-                # For Tk backend
-                self.fig.canvas.manager.window.lift()
-            except:
-                try:
-                    # For Qt backend
-                    self.fig.canvas.manager.window.raise_()
-                except:
-                    pass  # If neither method works, continue without raising window
-
-        self.ax.clear()
-        
-        # Set axis labels and limits
-        self.ax.set_xlabel('X')
-        self.ax.set_ylabel('Y')
-        self.ax.set_zlabel('Z')
-        self.ax.set_xlim([-0.5, self.size - 0.5])
-        self.ax.set_ylim([-0.5, self.size - 0.5])
-        self.ax.set_zlim([-0.5, self.size - 0.5])
-
-        # Draw grid lines
-        for i in range(self.size):
-            for j in range(self.size):
-                # Draw vertical lines
-                self.ax.plot([i, i], [j, j], [0, self.size-1], 'gray', alpha=0.2)
-                # Draw horizontal lines on each level
-                self.ax.plot([i, i], [0, self.size-1], [j, j], 'gray', alpha=0.2)
-                self.ax.plot([0, self.size-1], [i, i], [j, j], 'gray', alpha=0.2)
-
-        # Draw grid boundaries
-        vertices = np.array([
-            [0, 0, 0], [self.size-1, 0, 0], [self.size-1, self.size-1, 0], [0, self.size-1, 0],
-            [0, 0, self.size-1], [self.size-1, 0, self.size-1], 
-            [self.size-1, self.size-1, self.size-1], [0, self.size-1, self.size-1]
-        ])
-        edges = [
-            [vertices[0], vertices[1]], [vertices[1], vertices[2]], 
-            [vertices[2], vertices[3]], [vertices[3], vertices[0]],
-            [vertices[4], vertices[5]], [vertices[5], vertices[6]], 
-            [vertices[6], vertices[7]], [vertices[7], vertices[4]],
-            [vertices[0], vertices[4]], [vertices[1], vertices[5]], 
-            [vertices[2], vertices[6]], [vertices[3], vertices[7]]
-        ]
-        for edge in edges:
-            self.ax.plot3D(*zip(*edge), color='black', linewidth=2)
-
-        # Draw agent (blue sphere)
-        self.ax.scatter(self._agent_location[0], self._agent_location[1], 
-                       self._agent_location[2], color='blue', s=200, label='Agent')
-        
-        # Draw target (red star)
-        self.ax.scatter(self._target_location[0], self._target_location[1], 
-                       self._target_location[2], color='red', marker='*', s=200, label='Target')
+    def _render_state(self):
+        state = {"size": self.size, "agent": self._agent_location.copy(), "target": self._target_location.copy()}
+        if 0 < self._voxels.count <= MAX_DRAWN_OBSTACLES:
+            state["obstacles"] = self._voxels.points()
+        return state
 
-        # Add legend
-        self.ax.legend()
-
-        # Set title with current positions
-        self.ax.set_title(f'Agent: {tuple(self._agent_location)}, Target: {tuple(self._target_location)}')
+    def _render_frame(self):
+        if self.render_mode == "human_async":
+            # Frames are drawn by a viewer process, stepping does not wait for plt.pause
+            if self._async_renderer is None:
+                self._async_renderer = AsyncRenderer(Viewer3D(), fps=self.metadata["render_fps"])
+            if self._async_renderer.due():
+                self._async_renderer.submit(self._render_state())
+            return
 
-        # Adjust the view angle for better visibility
-        self.ax.view_init(elev=30, azim=45)
+        if self.fig is None:
+            self.fig, self.ax = _open_figure()
 
+        draw_3d(self.ax, self._render_state())
         self.fig.canvas.draw()
         self.fig.canvas.flush_events()
         plt.pause(1)  # Smaller pause for smoother animation
 
     def close(self):
+        if self._async_renderer is not None:
+            self._async_renderer.close(self._render_state())
+            self._async_renderer = None
         if self.fig is not None:
             plt.close(self.fig)
             self.fig = None
-            self.ax = None
\ No newline at end of file
+            self.ax = None
+
+def _open_figure():
+    plt.ion()  # Turn on interactive mode
+    fig = plt.figure(figsize=(10, 10))
+    ax = fig.add_subplot(111, projection='3d')
+    plt.show(block=False)  # Show the window without blocking
+
+    # Try to bring window to front if possible
+    try:
+        # For Tk backend
+        fig.canvas.manager.window.lift()
+    except:
+        try:
+            # For Qt backend
+            fig.canvas.manager.window.raise_()
+        except:
+            pass  # If neither method works, continue without raising window
+    return fig, ax
+
+
+def draw_3d(ax, state: dict):
+    """Draw a render state (size, agent, target, obstacles; see gymnasium_env/rendering.py) on a 3D axis."""
+    size = state["size"]
+    agent, target = state["agent"], state["target"]
+    ax.clear()
+
+    # Set axis labels and limits
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Z')
+    ax.set_xlim([-0.5, size - 0.5])
+    ax.set_ylim([-0.5, size - 0.5])
+    ax.set_zlim([-0.5, size - 0.5])
+
+    # Draw grid lines
+    for i in range(size):
+        for j in range(size):
+            # Draw vertical lines
+            ax.plot([i, i], [j, j], [0, size-1], 'gray', alpha=0.2)
+            # Draw horizontal lines on each level
+            ax.plot([i, i], [0, size-1], [j, j], 'gray', alpha=0.2)
+            ax.plot([0, size-1], [i, i], [j, j], 'gray', alpha=0.2)
+
+    # Draw grid boundaries
+    vertices = np.array([
+        [0, 0, 0], [size-1, 0, 0], [size-1, size-1, 0], [0, size-1, 0],
+        [0, 0, size-1], [size-1, 0, size-1],
+        [size-1, size-1, size-1], [0, size-1, size-1]
+    ])
+    edges = [
+        [vertices[0], vertices[1]], [vertices[1], vertices[2]],
+        [vertices[2], vertices[3]], [vertices[3], vertices[0]],
+        [vertices[4], vertices[5]], [vertices[5], vertices[6]],
+        [vertices[6], vertices[7]], [vertices[7], vertices[4]],
+        [vertices[0], vertices[4]], [vertices[1], vertices[5]],
+        [vertices[2], vertices[6]], [vertices[3], vertices[7]]
+    ]
+    for edge in edges:
+        ax.plot3D(*zip(*edge), color='black', linewidth=2)
+
+    # Draw agent (blue sphere)
+    ax.scatter(agent[0], agent[1], agent[2], color='blue', s=200, label='Agent')
+
+    # Draw target (red star)
+    ax.scatter(target[0], target[1], target[2], color='red', marker='*', s=200, label='Target')
+
+    # Draw obstacles (black squares)
+    if state.get("obstacles") is not None:
+        obstacles = state["obstacles"]
+        ax.scatter(obstacles[:, 0], obstacles[:, 1], obstacles[:, 2], color='black', marker='s', s=60, alpha=0.5, label='Obstacles')
+
+    # Add legend
+    ax.legend()
+
+    # Set title with current positions
+    ax.set_title(f'Agent: {tuple(agent)}, Target: {tuple(target)}')
+
+    # Adjust the view angle for better visibility
+    ax.view_init(elev=30, azim=45)
+
+
+class Viewer3D:
+    """matplotlib window for the "human_async" mode (runs inside the `AsyncRenderer` process)."""
+
+    def __init__(self):
+        self.fig = None
+        self.ax = None
+
+    def open(self):
+        self.fig, self.ax = _open_figure()
+
+    def poll(self) -> bool:
+        """Process the window events; False once the window was closed."""
+        if not plt.fignum_exists(self.fig.number):
+            return False
+        self.fig.canvas.flush_events()
+        return True
+
+    def show(self, state: dict) -> bool:
+        if not plt.fignum_exists(self.fig.number):
+            return False
+        draw_3d(self.ax, state)
+        self.fig.canvas.draw_idle()
+        plt.pause(0.001)
+        return True
+
+    def close(self):
+        plt.close(self.fig)
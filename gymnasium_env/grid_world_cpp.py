@@ -1,9 +1,13 @@
+import struct
 from typing import Optional
 import numpy as np
 import gymnasium as gym
 
 import pygame
 
+from gymnasium_env.rendering import AsyncRenderer, PygameViewer, draw_grid, surface_to_array
+from gymnasium_env.rng import RandomBuffer, check_layout, sample_layouts
+
 #
 # Coverage Path Planning (CPP) environment based on GridWorld with obstacles.
 #
@@ -27,26 +31,68 @@ import pygame
 #       2 = already visited position.
 #     Cells outside the grid boundaries are treated as walls (1).
 #
+# With `obs_window` (odd width W) the observation also includes an egocentric
+# map for CNN policies: "window", a (C, W, W) uint8 image centered on the
+# agent (rows are y, columns are x), with the channels
+#   0 = obstacle or wall (including out-of-bounds), 1 = visited, 2 = agent,
+#   3 = frontier (free unvisited cell next to a visited one, with obs_frontier=True)
+# at 0 or 255. The channels are kept in a tensor padded by W // 2 cells, which
+# is updated in place when the agent moves or visits a cell, so the window is
+# a slice of it and costs O(W^2) per step whatever the grid size. With
+# obs_format="image" the window is the whole observation (for CnnPolicy).
+# SB3's default CNN needs W >= 36; gymnasium_env/cnn.py has an extractor for
+# small windows.
+#
+# With `coverage_features=True` the observation also includes "remaining",
+# features about the cells left to cover (also in info):
+#   - BFS distance (around obstacles) to the nearest unvisited cell, / (2 * size)
+#   - unvisited cells right, up, left and down of the agent (the columns or
+#     rows beyond it), / free cells
+#   - frontier cells (free unvisited cells next to a visited one), / free cells
+# They are maintained incrementally: per-row and per-column unvisited counters
+# and the frontier are updated in O(1) when a cell is visited, and the
+# distance is 1 while the agent has an unvisited neighbor (the common case).
+# Otherwise it is read from a field of distances to the unvisited cells,
+# grown by breadth-first waves only as far as the agent and kept until the
+# next cell is visited, so walking back across covered cells costs O(1) per
+# step after the first one.
+#
 # The episode ends when all free cells are visited or max steps is reached.
 #
 
 class GridWorldCPPEnv(gym.Env):
 
-    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
+    metadata = {"render_modes": ["human", "human_async", "rgb_array"], "render_fps": 4}
 
-    def __init__(self, render_mode=None, size: int = 5, obs_quantity: int = 3, max_steps: int = 200):
+    # Cell values of the grid (also used in the "neighbors" observation)
+    FREE, WALL, VISITED = 0, 1, 2
+
+    def __init__(self, render_mode=None, size: int = 5, obs_quantity: int = 3, max_steps: int = 200,
+                 obs_format: str = "dict", render_viewport: Optional[int] = None, obs_window: Optional[int] = None,
+                 obs_frontier: bool = False, coverage_features: bool = False):
         self.size = size
         self.window_size = 512
+        # Width in cells of the rendered view, which follows the agent (None: whole grid)
+        self.render_viewport = render_viewport
         self.obs_quantity = obs_quantity
-        self.obstacles_locations = []
         self.count_steps = 0
         self.max_steps = max_steps
 
-        # Track visited cells
-        self.visited = set()
+        # Grid of cell values indexed by [x, y], padded with a border of walls
+        # so that the 3x3 neighborhood of any cell is a plain slice.
+        # Cell (x, y) of the environment is self._cells[x + 1, y + 1].
+        self._cells = np.full((size + 2, size + 2), self.WALL, dtype=np.int8)
+        self._visited_count = 0
+        self._obstacle_count = 0
+        self._obstacles_cache = None
+        self._packed_obstacles = b""
 
         self._agent_location = np.array([-1, -1], dtype=int)
         self._neighbors = np.zeros((3, 3), dtype=int)  # 3x3 matrix centered on agent
+        self._action_mask = np.ones(4, dtype=bool)
+
+        # Random numbers for reset are drawn in blocks (see gymnasium_env/rng.py)
+        self._rng_buffer = RandomBuffer()
 
         # Observation: Dict with agent info (x, y, coverage) and 3x3 neighbor matrix
         self.observation_space = gym.spaces.Dict({
@@ -62,6 +108,50 @@ class GridWorldCPPEnv(gym.Env):
             ),
         })
 
+        # Egocentric window: channel tensor indexed by [channel, y, x], padded
+        # by W // 2 cells (obstacle channel set) so any window is a plain slice
+        assert obs_window is None or obs_window % 2 == 1, "obs_window must be odd"
+        assert obs_window is not None or obs_format != "image", "obs_format='image' needs obs_window"
+        assert obs_window is None or obs_format != "flat", "The window is not part of the flat observation"
+        self.obs_window = obs_window
+        self.obs_frontier = obs_frontier
+        if obs_window is not None:
+            self._window_pad = obs_window // 2
+            n_channels = 4 if obs_frontier else 3
+            padded = size + 2 * self._window_pad
+            self._channels = np.zeros((n_channels, padded, padded), dtype=np.uint8)
+            window_space = gym.spaces.Box(0, 255, (n_channels, obs_window, obs_window), dtype=np.uint8)
+            if obs_format == "image":
+                self.observation_space = window_space
+            else:
+                self.observation_space = gym.spaces.Dict({**self.observation_space.spaces, "window": window_space})
+
+        # Incremental remaining-coverage features
+        self.coverage_features = coverage_features
+        if coverage_features:
+            self._row_unvisited = np.zeros(size, dtype=np.int64)  # indexed by y
+            self._col_unvisited = np.zeros(size, dtype=np.int64)  # indexed by x
+            self._frontier = np.zeros((size + 2, size + 2), dtype=bool)  # padded like _cells
+            self._frontier_count = 0
+            self._distance = np.full((size + 2, size + 2), -1, dtype=np.int32)
+            self._wave = np.zeros((size + 2, size + 2), dtype=bool)
+            self._wave_distance = -1  # -1: the distance field must be rebuilt
+            self._remaining = np.zeros(6, dtype=np.float32)
+            self._unvisited_directions = np.zeros(4, dtype=np.int64)
+            self._nearest_unvisited = 0
+            remaining_space = gym.spaces.Box(0.0, 1.0, (6,), dtype=np.float32)
+            if obs_format != "image":
+                self.observation_space = gym.spaces.Dict({**self.observation_space.spaces, "remaining": remaining_space})
+
+        # obs_format="flat": FlattenObservation's layout, see GridWorldEnv in grid_world.py
+        assert obs_format in ("dict", "flat", "image")
+        self.obs_format = obs_format
+        if obs_format == "flat":
+            flat_space = gym.spaces.flatten_space(self.observation_space)
+            self.observation_space = gym.spaces.Box(
+                flat_space.low.astype(np.float32), flat_space.high.astype(np.float32), dtype=np.float32
+            )
+
         # 4 actions: right, up, left, down
         self.action_space = gym.spaces.Discrete(4)
         self._action_to_direction = {
@@ -76,16 +166,39 @@ class GridWorldCPPEnv(gym.Env):
 
         self.window = None
         self.clock = None
+        self._async_renderer = None
 
     @property
     def total_free_cells(self):
-        return self.size * self.size - len(self.obstacles_locations)
+        return self.size * self.size - self._obstacle_count
 
     @property
     def coverage_ratio(self):
-        return len(self.visited) / self.total_free_cells if self.total_free_cells > 0 else 1.0
+        return self._visited_count / self.total_free_cells if self.total_free_cells > 0 else 1.0
+
+    @property
+    def visited(self):
+        # Set of visited (x, y) cells, built on demand from the grid
+        xs, ys = np.nonzero(self._cells[1:-1, 1:-1] == self.VISITED)
+        return set(zip(xs.tolist(), ys.tolist()))
+
+    @property
+    def obstacles_locations(self):
+        # List of obstacle locations, built on demand from the grid
+        if self._obstacles_cache is None:
+            interior = self._cells[1:-1, 1:-1]
+            self._obstacles_cache = [np.array(loc) for loc in np.argwhere(interior == self.WALL)]
+        return self._obstacles_cache
 
     def _get_obs(self):
+        if self.obs_format == "image":
+            return self._window()
+        if self.obs_format == "flat":
+            # Keys in sorted order: agent, coverage, neighbors, remaining
+            parts = [self._agent_location / self.size, (self.coverage_ratio,), self._neighbors.ravel()]
+            if self.coverage_features:
+                parts.append(self._remaining)
+            return np.concatenate(parts, dtype=np.float32)
         return {
             "agent": np.array([
                 self._agent_location[0] / self.size,
@@ -93,61 +206,198 @@ class GridWorldCPPEnv(gym.Env):
                 self.coverage_ratio,
             ], dtype=np.float32),
             "neighbors": self._neighbors.astype(np.float32),
+            **({"remaining": self._remaining.copy()} if self.coverage_features else {}),
+            **({"window": self._window()} if self.obs_window is not None else {}),
         }
 
+    # Channels of the egocentric window
+    OBSTACLE_CHANNEL, VISITED_CHANNEL, AGENT_CHANNEL, FRONTIER_CHANNEL = range(4)
+
+    # Moves to the 4 neighbors of a cell (dx, dy)
+    _NEIGHBOR_DX = np.array([1, 0, -1, 0])
+    _NEIGHBOR_DY = np.array([0, -1, 0, 1])
+
+    def _window(self):
+        # Slice of the padded channels centered on the agent; copied because the
+        # channels keep changing while callers (e.g. SB3 buffers) keep observations
+        x, y = self._agent_location
+        w = self.obs_window
+        return self._channels[:, y:y + w, x:x + w].copy()
+
+    def _rebuild_channels(self):
+        # Whole channel tensor from the grid (on reset and set_state)
+        p, size = self._window_pad, self.size
+        interior = self._cells[1:-1, 1:-1].T  # indexed by [y, x]
+        self._channels[...] = 0
+        self._channels[self.OBSTACLE_CHANNEL] = 255
+        inner = (slice(p, p + size), slice(p, p + size))
+        self._channels[self.OBSTACLE_CHANNEL][inner] = (interior == self.WALL) * 255
+        self._channels[self.VISITED_CHANNEL][inner] = (interior == self.VISITED) * 255
+        x, y = self._agent_location
+        self._channels[self.AGENT_CHANNEL, y + p, x + p] = 255
+        if self.obs_frontier:
+            visited = self._cells == self.VISITED
+            next_to_visited = visited[:-2, 1:-1] | visited[2:, 1:-1] | visited[1:-1, :-2] | visited[1:-1, 2:]
+            frontier = (self._cells[1:-1, 1:-1] == self.FREE) & next_to_visited
+            self._channels[self.FRONTIER_CHANNEL][inner] = frontier.T * 255
+
+    def _move_channels(self, old_location):
+        p = self._window_pad
+        self._channels[self.AGENT_CHANNEL, old_location[1] + p, old_location[0] + p] = 0
+        self._channels[self.AGENT_CHANNEL, self._agent_location[1] + p, self._agent_location[0] + p] = 255
+
+    def _visit_channels(self, x: int, y: int):
+        # Cell (x, y) was just visited: it leaves the frontier and its free
+        # neighbors join it, O(1) per visited cell
+        p = self._window_pad
+        self._channels[self.VISITED_CHANNEL, y + p, x + p] = 255
+        if self.obs_frontier:
+            self._channels[self.FRONTIER_CHANNEL, y + p, x + p] = 0
+            nx, ny = x + self._NEIGHBOR_DX, y + self._NEIGHBOR_DY
+            free = self._cells[nx + 1, ny + 1] == self.FREE
+            self._channels[self.FRONTIER_CHANNEL, ny[free] + p, nx[free] + p] = 255
+
+    def _rebuild_coverage_features(self):
+        # Counters, frontier and distance field from the grid (on reset and set_state)
+        free = self._cells[1:-1, 1:-1] == self.FREE  # indexed by [x, y]
+        self._row_unvisited[:] = free.sum(axis=0)
+        self._col_unvisited[:] = free.sum(axis=1)
+        visited = self._cells == self.VISITED
+        self._frontier[...] = False
+        self._frontier[1:-1, 1:-1] = free & (visited[:-2, 1:-1] | visited[2:, 1:-1] | visited[1:-1, :-2] | visited[1:-1, 2:])
+        self._frontier_count = int(self._frontier.sum())
+        self._wave_distance = -1
+
+    def _visit_coverage_features(self, x: int, y: int):
+        # Cell (x, y) was just visited, O(1) per visited cell
+        self._row_unvisited[y] -= 1
+        self._col_unvisited[x] -= 1
+        if self._frontier[x + 1, y + 1]:
+            self._frontier[x + 1, y + 1] = False
+            self._frontier_count -= 1
+        nx, ny = x + 1 + self._NEIGHBOR_DX, y + 1 + self._NEIGHBOR_DY
+        joining = (self._cells[nx, ny] == self.FREE) & ~self._frontier[nx, ny]
+        self._frontier[nx[joining], ny[joining]] = True
+        self._frontier_count += int(joining.sum())
+        # The unvisited cells changed: the distance field is stale
+        self._wave_distance = -1
+
+    def _distance_to_unvisited(self) -> int:
+        """BFS distance from the agent to the nearest unvisited cell (-1 if none can be reached)."""
+        x, y = int(self._agent_location[0]) + 1, int(self._agent_location[1]) + 1
+        cells = self._cells
+        if self.FREE in (cells[x + 1, y], cells[x, y - 1], cells[x - 1, y], cells[x, y + 1]):
+            return 1
+        if self._wave_distance < 0:
+            # Rebuild from the unvisited cells; waves are only grown on demand below
+            self._wave[...] = self._cells == self.FREE
+            self._distance[...] = -1
+            self._distance[self._wave] = 0
+            self._wave_distance = 0
+        if self._distance[x, y] >= 0:
+            return int(self._distance[x, y])
+        passable = self._cells != self.WALL
+        while self._distance[x, y] < 0 and self._wave.any():
+            wave = self._wave
+            grown = np.zeros_like(wave)
+            grown[1:-1, 1:-1] = wave[:-2, 1:-1] | wave[2:, 1:-1] | wave[1:-1, :-2] | wave[1:-1, 2:]
+            self._wave = grown & passable & (self._distance < 0)
+            self._wave_distance += 1
+            self._distance[self._wave] = self._wave_distance
+        return int(self._distance[x, y])
+
+    def _update_coverage_features(self):
+        x, y = self._agent_location
+        free_cells = max(self.total_free_cells, 1)
+        unvisited = self.total_free_cells - self._visited_count
+        distance = 0 if unvisited <= 0 else self._distance_to_unvisited()
+        self._nearest_unvisited = distance
+        # Unreachable unvisited cells count as the farthest distance
+        self._remaining[0] = 1.0 if distance < 0 else min(distance / (2 * self.size), 1.0)
+        # Right, up, left and down; one O(size) sum per axis
+        left = int(self._col_unvisited[:x].sum())
+        up = int(self._row_unvisited[:y].sum())
+        directions = self._unvisited_directions
+        directions[:] = unvisited - left - self._col_unvisited[x], up, left, unvisited - up - self._row_unvisited[y]
+        self._remaining[1:5] = directions / free_cells
+        self._remaining[5] = self._frontier_count / free_cells
+
     def _get_info(self):
-        return {
+        info = {
             "coverage": self.coverage_ratio,
-            "visited_cells": len(self.visited),
+            "visited_cells": self._visited_count,
             "total_free_cells": self.total_free_cells,
             "steps": self.count_steps,
             "size": self.size,
+            "action_mask": self.action_masks(),
         }
-
-    def set_neighbors(self, obstacles_locations):
-        # Create a 3x3 matrix centered on the agent's location.
+        if self.coverage_features:
+            info["nearest_unvisited"] = self._nearest_unvisited
+            info["unvisited_directions"] = self._unvisited_directions.copy()  # right, up, left, down
+            info["frontier_cells"] = self._frontier_count
+        return info
+
+    # Cells of the 3x3 neighbors matrix reached by each action (row, col):
+    # right, up, left, down
+    _MASK_ROWS = np.array([1, 0, 1, 2])
+    _MASK_COLS = np.array([2, 1, 0, 1])
+
+    def action_masks(self):
+        # Valid actions (True) are the moves that do not bump into an obstacle
+        # or wall; computed by set_neighbors. Used by sb3_contrib's MaskablePPO.
+        return self._action_mask.copy()
+
+    def set_neighbors(self, obstacles_locations=None):
+        # 3x3 matrix centered on the agent's location, read directly from the padded grid.
         # Row index i corresponds to agent_y + (i-1), col index j to agent_x + (j-1).
         # 0 = free (not yet visited), 1 = obstacle or wall (out-of-bounds), 2 = already visited.
-        matrix = np.zeros((3, 3), dtype=int)
-        for i in range(3):
-            for j in range(3):
-                nx = self._agent_location[0] + (j - 1)
-                ny = self._agent_location[1] + (i - 1)
-                neighbor = np.array([nx, ny])
-                if not (0 <= nx < self.size and 0 <= ny < self.size):
-                    matrix[i][j] = 1
-                elif any(np.array_equal(neighbor, loc) for loc in obstacles_locations):
-                    matrix[i][j] = 1
-                elif (nx, ny) in self.visited:
-                    matrix[i][j] = 2
-        self._neighbors = matrix
+        # `obstacles_locations` is kept for compatibility; obstacles are read from the grid.
+        x, y = self._agent_location
+        self._neighbors = self._cells[x:x + 3, y:y + 3].T.astype(int)
+        self._action_mask = self._neighbors[self._MASK_ROWS, self._MASK_COLS] != self.WALL
+        if not self._action_mask.any():
+            # Agent enclosed by obstacles: every action is a no-op, allow them all
+            self._action_mask[:] = True
+
+    def seeded_layouts(self, seeds) -> np.ndarray:
+        """The cells `reset(seed=s)` places for each seed, drawn in one batched call, for options["layout"]."""
+        return sample_layouts(seeds, self.size * self.size, 1 + self.obs_quantity)
 
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
         super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
         self.count_steps = 0
-        self.obstacles_locations = []
-        self.visited = set()
-
-        # Place agent randomly
-        self._agent_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-
-        # Place obstacles
-        for _ in range(self.obs_quantity):
-            obstacle_location = self._agent_location.copy()
-            while (np.array_equal(obstacle_location, self._agent_location) or
-                   any(np.array_equal(obstacle_location, loc) for loc in self.obstacles_locations)):
-                obstacle_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-            self.obstacles_locations.append(obstacle_location)
+        self._cells[1:-1, 1:-1] = self.FREE
+        self._obstacles_cache = None
+
+        # Agent and obstacles are placed in distinct random cells (cell index
+        # x * size + y), the agent first. A caller can pass the cells
+        # in options["layout"] instead, e.g. from `seeded_layouts`.
+        if options is not None and "layout" in options:
+            cells = check_layout(options["layout"], self.size * self.size, 1 + self.obs_quantity)
+        else:
+            cells = self._rng_buffer.sample_distinct(self.size * self.size, 1 + self.obs_quantity)
+        xs, ys = np.divmod(cells, self.size)
+        self._agent_location = np.array([xs[0], ys[0]], dtype=int)
+        self._cells[xs[1:] + 1, ys[1:] + 1] = self.WALL
+        self._obstacle_count = self.obs_quantity
+        self._packed_obstacles = b""
 
         # Mark starting position as visited
-        self.visited.add(tuple(self._agent_location))
+        self._cells[self._agent_location[0] + 1, self._agent_location[1] + 1] = self.VISITED
+        self._visited_count = 1
 
-        self.set_neighbors(self.obstacles_locations)
+        self.set_neighbors()
+        if self.obs_window is not None:
+            self._rebuild_channels()
+        if self.coverage_features:
+            self._rebuild_coverage_features()
+            self._update_coverage_features()
 
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, info
@@ -162,15 +412,17 @@ class GridWorldCPPEnv(gym.Env):
         )
 
         # If the agent hits an obstacle, stay in place
-        if any(np.array_equal(self._agent_location, loc) for loc in self.obstacles_locations):
+        cell = self._cells[self._agent_location[0] + 1, self._agent_location[1] + 1]
+        if cell == self.WALL:
             self._agent_location = old_location
 
-        self.set_neighbors(self.obstacles_locations)
+        # Neighbors are read before marking the new cell as visited, as the
+        # trained models expect (the center of a newly visited cell is 0)
+        self.set_neighbors()
         self.count_steps += 1
 
         # --- CPP Reward Function ---
-        current_pos = tuple(self._agent_location)
-        is_new_cell = current_pos not in self.visited
+        is_new_cell = cell == self.FREE
         stayed_in_place = np.array_equal(self._agent_location, old_location)
 
         # Base step penalty
@@ -182,13 +434,21 @@ class GridWorldCPPEnv(gym.Env):
         elif is_new_cell:
             # Reward for exploring new cell
             reward += 1.0
-            self.visited.add(current_pos)
+            self._cells[self._agent_location[0] + 1, self._agent_location[1] + 1] = self.VISITED
+            self._visited_count += 1
+            if self.obs_window is not None:
+                self._visit_channels(*self._agent_location)
+            if self.coverage_features:
+                self._visit_coverage_features(*self._agent_location)
         else:
             # Penalty for revisiting
             reward -= 0.3
 
+        if self.obs_window is not None and not stayed_in_place:
+            self._move_channels(old_location)
+
         # Check if full coverage achieved
-        full_coverage = len(self.visited) >= self.total_free_cells
+        full_coverage = self._visited_count >= self.total_free_cells
         terminated = full_coverage
 
         if full_coverage:
@@ -201,19 +461,163 @@ class GridWorldCPPEnv(gym.Env):
         else:
             truncated = False
 
+        if self.coverage_features:
+            self._update_coverage_features()
+
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, reward, terminated, truncated, info
 
+    #
+    # Snapshot/restore of the environment state for planners (e.g. MCTS).
+    #
+    # The state is a fixed-size byte string:
+    #   - agent x, y (int16) and step counter (int32)
+    #   - visited and obstacle bitmaps, packed with np.packbits (size*size bits each)
+    #   - optionally, the state of the PCG64 generator used by reset, taken at
+    #     the start of the current block of pre-drawn numbers, and the
+    #     position in that block (-1 when no block has been drawn)
+    #
+
+    _HEADER = struct.Struct("<hhi")
+    _RNG = struct.Struct("<16s16sBQi")
+
+    def state_size(self, include_rng: bool = True) -> int:
+        bitmap_bytes = (self.size * self.size + 7) // 8
+        return self._HEADER.size + 2 * bitmap_bytes + (self._RNG.size if include_rng else 0)
+
+    def get_state(self, include_rng: bool = True) -> bytes:
+        """Return a compact snapshot of the environment that `set_state` can restore."""
+        interior = self._cells[1:-1, 1:-1]
+        if not self._packed_obstacles:
+            # The obstacles do not change during an episode: pack them once
+            self._packed_obstacles = np.packbits(interior == self.WALL).tobytes()
+        parts = [
+            self._HEADER.pack(self._agent_location[0], self._agent_location[1], self.count_steps),
+            np.packbits(interior == self.VISITED).tobytes(),
+            self._packed_obstacles,
+        ]
+        if include_rng:
+            self._rng_buffer.bind(self.np_random)
+            rng_state, position = self._rng_buffer.get_state()
+            assert rng_state["bit_generator"] == "PCG64", "Only PCG64 generators can be saved"
+            parts.append(self._RNG.pack(
+                rng_state["state"]["state"].to_bytes(16, "little"),
+                rng_state["state"]["inc"].to_bytes(16, "little"),
+                rng_state["has_uint32"],
+                rng_state["uinteger"],
+                position,
+            ))
+        return b"".join(parts)
+
+    def set_state(self, state: bytes):
+        """Restore a snapshot taken with `get_state` on an environment of the same size."""
+        n_cells = self.size * self.size
+        bitmap_bytes = (n_cells + 7) // 8
+        if len(state) not in (self.state_size(False), self.state_size(True)):
+            raise ValueError(f"State of {len(state)} bytes does not match a {self.size}x{self.size} grid")
+
+        x, y, self.count_steps = self._HEADER.unpack_from(state, 0)
+        self._agent_location = np.array([x, y], dtype=int)
+
+        offset = self._HEADER.size
+        visited = np.unpackbits(np.frombuffer(state, np.uint8, bitmap_bytes, offset), count=n_cells).astype(bool)
+        offset += bitmap_bytes
+        packed_obstacles = state[offset:offset + bitmap_bytes]
+        offset += bitmap_bytes
+
+        interior = self._cells[1:-1, 1:-1]
+        if packed_obstacles != self._packed_obstacles:
+            obstacles = np.unpackbits(np.frombuffer(packed_obstacles, np.uint8), count=n_cells).astype(bool)
+            interior[...] = self.FREE
+            interior[obstacles.reshape(self.size, self.size)] = self.WALL
+            self._obstacle_count = int(obstacles.sum())
+            self._obstacles_cache = None
+            self._packed_obstacles = packed_obstacles
+        else:
+            # Same obstacles as the current episode (the common case when branching)
+            interior[interior == self.VISITED] = self.FREE
+
+        visited = visited.reshape(self.size, self.size)
+        interior[visited] = self.VISITED
+        self._visited_count = int(visited.sum())
+
+        if len(state) > offset:
+            rng_state, inc, has_uint32, uinteger, position = self._RNG.unpack_from(state, offset)
+            self._rng_buffer.set_state(self.np_random, ({
+                "bit_generator": "PCG64",
+                "state": {"state": int.from_bytes(rng_state, "little"), "inc": int.from_bytes(inc, "little")},
+                "has_uint32": has_uint32,
+                "uinteger": uinteger,
+            }, position))
+
+        if x >= 0:
+            self.set_neighbors()
+            if self.obs_window is not None:
+                self._rebuild_channels()
+            if self.coverage_features:
+                self._rebuild_coverage_features()
+                self._update_coverage_features()
+
+    #
+    # Pickling (e.g. when shipping envs to subprocess workers) transfers only
+    # the constructor arguments and the compact `get_state` record, not the
+    # spaces, lookup tables or pygame handles, which are rebuilt by __init__.
+    #
+
+    def __getstate__(self):
+        return {
+            "kwargs": {
+                "render_mode": self.render_mode,
+                "size": self.size,
+                "obs_quantity": self.obs_quantity,
+                "max_steps": self.max_steps,
+                "obs_format": self.obs_format,
+                "render_viewport": self.render_viewport,
+                "obs_window": self.obs_window,
+                "obs_frontier": self.obs_frontier,
+                "coverage_features": self.coverage_features,
+            },
+            "spec": self.spec,
+            "seed": self._np_random_seed,
+            "state": self.get_state(include_rng=self._np_random is not None),
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state["kwargs"])
+        self.spec = state["spec"]
+        self.set_state(state["state"])
+        self._np_random_seed = state["seed"]
+
     def render(self):
         if self.render_mode == "rgb_array":
             return self._render_frame()
 
+    def _render_state(self):
+        # What is drawn on screen (see gymnasium_env/rendering.py)
+        state = {
+            "size": self.size,
+            "agent": self._agent_location.copy(),
+            "cells": self._cells[1:-1, 1:-1].copy(),
+            "text": f"Coverage: {self.coverage_ratio:.1%} | Steps: {self.count_steps}",
+        }
+        if self.render_viewport is not None:
+            state["viewport"] = self.render_viewport
+        return state
+
     def _render_frame(self):
+        if self.render_mode == "human_async":
+            # Frames are drawn and shown by a viewer process, stepping does not wait for it
+            if self._async_renderer is None:
+                self._async_renderer = AsyncRenderer(PygameViewer(self.window_size, "GridWorldCPP"))
+            if self._async_renderer.due():
+                self._async_renderer.submit(self._render_state())
+            return
+
         if self.window is None and self.render_mode == "human":
             pygame.init()
             pygame.display.init()
@@ -223,55 +627,7 @@ class GridWorldCPPEnv(gym.Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((self.window_size, self.window_size))
-        canvas.fill((255, 255, 255))
-        pix_square_size = self.window_size / self.size
-
-        # Draw visited cells in light green
-        for cell in self.visited:
-            cell_arr = np.array(cell)
-            pygame.draw.rect(
-                canvas,
-                (144, 238, 144),  # light green
-                pygame.Rect(
-                    pix_square_size * cell_arr,
-                    (pix_square_size, pix_square_size),
-                ),
-            )
-
-        # Draw obstacles in black
-        for obs in self.obstacles_locations:
-            pygame.draw.rect(
-                canvas,
-                (0, 0, 0),
-                pygame.Rect(
-                    pix_square_size * obs,
-                    (pix_square_size, pix_square_size),
-                ),
-            )
-
-        # Draw agent as blue circle
-        pygame.draw.circle(
-            canvas,
-            (0, 0, 255),
-            (self._agent_location + 0.5) * pix_square_size,
-            pix_square_size / 3,
-        )
-
-        # Draw coverage info text
-        font = pygame.font.SysFont(None, 24)
-        coverage_text = font.render(
-            f"Coverage: {self.coverage_ratio:.1%} | Steps: {self.count_steps}",
-            True, (0, 0, 0)
-        )
-        canvas.blit(coverage_text, (5, 5))
-
-        # Draw gridlines
-        for x in range(self.size + 1):
-            pygame.draw.line(canvas, 0, (0, pix_square_size * x),
-                             (self.window_size, pix_square_size * x), width=3)
-            pygame.draw.line(canvas, 0, (pix_square_size * x, 0),
-                             (pix_square_size * x, self.window_size), width=3)
+        canvas = draw_grid(self._render_state(), self.window_size)
 
         if self.render_mode == "human":
             self.window.blit(canvas, canvas.get_rect())
@@ -279,11 +635,12 @@ class GridWorldCPPEnv(gym.Env):
             pygame.display.update()
             self.clock.tick(self.metadata["render_fps"])
         else:
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )
+            return surface_to_array(canvas)
 
     def close(self):
+        if self._async_renderer is not None:
+            self._async_renderer.close(self._render_state())
+            self._async_renderer = None
         if self.window is not None:
             pygame.display.quit()
             pygame.quit()
@@ -0,0 +1,308 @@
+from typing import Optional
+import numpy as np
+import gymnasium as gym
+
+import pygame
+
+from gymnasium_env.rendering import draw_grid, surface_to_array
+from gymnasium_env.rng import RandomBuffer, check_layout, sample_layouts
+
+#
+# Multi-agent Coverage Path Planning (CPP) environment.
+#
+# Same task as grid_world_cpp.py, but a fleet of `n_agents` agents shares one
+# grid of obstacles and visited cells, so a cell covered by one agent is
+# covered for all of them. The whole fleet is stepped by one call: the action
+# is one move per agent (MultiDiscrete), and the moves, collisions, rewards
+# and the 3x3 neighborhoods of all the agents are computed with array
+# operations over the agents, so a step costs about the same for 1 or 32
+# agents instead of growing like n_agents separate environments.
+#
+# Moves are simultaneous. An agent stays in place when it moves into an
+# obstacle or wall, when it would end in the same cell as another agent
+# (all the agents moving there stay), and when it would swap cells with
+# another agent. Following an agent that moves away in the same step is
+# allowed.
+#
+# Reward, summed over the agents (the per-agent values are in
+# info["agent_rewards"]):
+#   - -0.1 step penalty per agent
+#   - +1.0 for visiting a new (unvisited) cell
+#   - -0.3 for revisiting an already-visited cell
+#   - -0.5 for staying in place (obstacle, wall or collision)
+#   - +10.0 bonus for achieving full coverage (all free cells visited)
+#   - -5.0 penalty when max steps reached without full coverage
+#
+# The observation space includes, for each agent k:
+#   - agents[k]: agent's (x, y) location (normalized) and the coverage ratio
+#   - neighbors[k]: 3x3 matrix centered on the agent, as in grid_world_cpp.py
+#     (0 = free, 1 = obstacle or wall, 2 = visited) plus 3 = another agent
+#
+# action_masks() returns the n_agents x 4 valid moves flattened, the format
+# of sb3_contrib's MaskablePPO for MultiDiscrete action spaces.
+#
+# Usage:
+#
+#   env = GridWorldCPPMultiEnv(size=20, n_agents=4, obs_quantity=40, max_steps=400)
+#   observation, info = env.reset(seed=0)
+#   observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+#
+
+class GridWorldCPPMultiEnv(gym.Env):
+
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
+
+    # Cell values of the grid (AGENT is only used in the "neighbors" observation)
+    FREE, WALL, VISITED, AGENT = 0, 1, 2, 3
+
+    # Moves of the actions (dx, dy): right, up, left, down
+    _DIRECTIONS = np.array([[1, 0], [0, -1], [-1, 0], [0, 1]])
+
+    # Offsets of the 3x3 neighbors matrix: row i is y + (i-1), col j is x + (j-1)
+    _ROWS, _COLS = np.mgrid[0:3, 0:3]
+
+    # Cells of the 3x3 neighbors matrix reached by each action (row, col)
+    _MASK_ROWS = np.array([1, 0, 1, 2])
+    _MASK_COLS = np.array([2, 1, 0, 1])
+
+    def __init__(self, render_mode=None, size: int = 5, n_agents: int = 2, obs_quantity: int = 3,
+                 max_steps: int = 200, obs_format: str = "dict"):
+        assert n_agents + obs_quantity <= size * size, "Not enough cells for the agents and obstacles"
+        self.size = size
+        self.window_size = 512
+        self.n_agents = n_agents
+        self.obs_quantity = obs_quantity
+        self.count_steps = 0
+        self.max_steps = max_steps
+
+        # Grids indexed by [x, y], padded with a border of walls so that the 3x3
+        # neighborhood of any cell is a plain slice (cell (x, y) is [x + 1, y + 1]):
+        # the cell values, and the index of the agent in each cell (-1: none)
+        self._cells = np.full((size + 2, size + 2), self.WALL, dtype=np.int8)
+        self._occupant = np.full((size + 2, size + 2), -1, dtype=np.int32)
+        self._visited_count = 0
+        self._obstacle_count = 0
+
+        self._agent_locations = np.zeros((n_agents, 2), dtype=int)
+        self._neighbors = np.zeros((n_agents, 3, 3), dtype=np.int8)
+        self._action_mask = np.ones((n_agents, 4), dtype=bool)
+        self._agent_index = np.arange(n_agents)
+
+        # Random numbers for reset are drawn in blocks (see gymnasium_env/rng.py)
+        self._rng_buffer = RandomBuffer()
+
+        self.observation_space = gym.spaces.Dict({
+            "agents": gym.spaces.Box(0.0, 1.0, (n_agents, 3), dtype=np.float32),
+            "neighbors": gym.spaces.Box(0.0, 3.0, (n_agents, 3, 3), dtype=np.float32),
+        })
+
+        # With obs_format="flat" the observation is a float32 vector with the layout
+        # of the FlattenObservation wrapper (keys in sorted order), as in grid_world_cpp.py
+        assert obs_format in ("dict", "flat")
+        self.obs_format = obs_format
+        if obs_format == "flat":
+            flat_space = gym.spaces.flatten_space(self.observation_space)
+            self.observation_space = gym.spaces.Box(
+                flat_space.low.astype(np.float32), flat_space.high.astype(np.float32), dtype=np.float32
+            )
+
+        # 4 actions per agent: right, up, left, down
+        self.action_space = gym.spaces.MultiDiscrete(np.full(n_agents, 4))
+
+        assert render_mode is None or render_mode in self.metadata["render_modes"]
+        self.render_mode = render_mode
+
+        self.window = None
+        self.clock = None
+
+    @property
+    def total_free_cells(self):
+        return self.size * self.size - self._obstacle_count
+
+    @property
+    def coverage_ratio(self):
+        return self._visited_count / self.total_free_cells if self.total_free_cells > 0 else 1.0
+
+    def _get_obs(self):
+        agents = np.empty((self.n_agents, 3), dtype=np.float32)
+        agents[:, :2] = self._agent_locations / self.size
+        agents[:, 2] = self.coverage_ratio
+        if self.obs_format == "flat":
+            return np.concatenate([agents.ravel(), self._neighbors.ravel()]).astype(np.float32)
+        return {"agents": agents, "neighbors": self._neighbors.astype(np.float32)}
+
+    def _get_info(self):
+        return {
+            "coverage": self.coverage_ratio,
+            "visited_cells": self._visited_count,
+            "total_free_cells": self.total_free_cells,
+            "steps": self.count_steps,
+            "size": self.size,
+            "action_mask": self.action_masks(),
+        }
+
+    def action_masks(self):
+        # Valid moves (True) of each agent, flattened (n_agents * 4), as
+        # sb3_contrib's MaskablePPO expects for MultiDiscrete actions
+        return self._action_mask.ravel().copy()
+
+    def set_neighbors(self):
+        # 3x3 matrices centered on all the agents at once, gathered from the padded grids
+        xs = self._agent_locations[:, 0, None, None] + self._COLS
+        ys = self._agent_locations[:, 1, None, None] + self._ROWS
+        self._neighbors = self._cells[xs, ys]
+        occupant = self._occupant[xs, ys]
+        self._neighbors[(occupant >= 0) & (occupant != self._agent_index[:, None, None])] = self.AGENT
+        self._action_mask = self._neighbors[:, self._MASK_ROWS, self._MASK_COLS] != self.WALL
+        # Agents enclosed by obstacles: every action is a no-op, allow them all
+        self._action_mask[~self._action_mask.any(axis=1)] = True
+
+    def seeded_layouts(self, seeds) -> np.ndarray:
+        """The cells `reset(seed=s)` places for each seed, drawn in one batched call, for options["layout"]."""
+        return sample_layouts(seeds, self.size * self.size, self.n_agents + self.obs_quantity)
+
+    def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
+        super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
+        self.count_steps = 0
+        self._cells[1:-1, 1:-1] = self.FREE
+        self._occupant[...] = -1
+
+        # Agents and obstacles are placed in distinct random cells (cell index
+        # x * size + y), the agents first. A caller can pass the cells
+        # in options["layout"] instead, e.g. from `seeded_layouts`.
+        if options is not None and "layout" in options:
+            cells = check_layout(options["layout"], self.size * self.size, self.n_agents + self.obs_quantity)
+        else:
+            cells = self._rng_buffer.sample_distinct(self.size * self.size, self.n_agents + self.obs_quantity)
+        xs, ys = np.divmod(cells, self.size)
+        self._agent_locations = np.stack([xs[:self.n_agents], ys[:self.n_agents]], axis=1).astype(int)
+        self._cells[xs[self.n_agents:] + 1, ys[self.n_agents:] + 1] = self.WALL
+        self._obstacle_count = self.obs_quantity
+
+        # Mark starting positions as visited
+        ax, ay = self._agent_locations.T + 1
+        self._cells[ax, ay] = self.VISITED
+        self._occupant[ax, ay] = self._agent_index
+        self._visited_count = self.n_agents
+
+        self.set_neighbors()
+
+        if self.render_mode == "human":
+            self._render_frame()
+
+        return self._get_obs(), self._get_info()
+
+    def _resolve_moves(self, actions: np.ndarray):
+        """New locations of the agents after the simultaneous `actions`, and which agents were blocked by another."""
+        current = self._agent_locations
+        target = np.clip(current + self._DIRECTIONS[actions], 0, self.size - 1)
+        moving = self._cells[target[:, 0] + 1, target[:, 1] + 1] != self.WALL
+        moving &= (target != current).any(axis=1)
+        free_moves = moving.copy()
+
+        # Swaps: agent i moves into the cell of agent j while j moves into the cell of i
+        other = self._occupant[target[:, 0] + 1, target[:, 1] + 1]
+        has_other = moving & (other >= 0)
+        swapped = np.zeros(self.n_agents, dtype=bool)
+        j = other[has_other]
+        swapped[has_other] = moving[j] & (target[j] == current[has_other]).all(axis=1)
+        moving &= ~swapped
+
+        # Agents ending in the same cell stay in place; staying can block other
+        # agents in turn, so repeat until the final cells are distinct
+        target_index = target[:, 0] * self.size + target[:, 1]
+        current_index = current[:, 0] * self.size + current[:, 1]
+        while True:
+            final = np.where(moving, target_index, current_index)
+            _, inverse, counts = np.unique(final, return_inverse=True, return_counts=True)
+            blocked = moving & (counts[inverse] > 1)
+            if not blocked.any():
+                break
+            moving &= ~blocked
+        return np.where(moving[:, None], target, current), free_moves & ~moving
+
+    def step(self, action):
+        actions = np.asarray(action, dtype=int).reshape(self.n_agents)
+        old_locations = self._agent_locations
+        self._agent_locations, collided = self._resolve_moves(actions)
+
+        ox, oy = old_locations.T + 1
+        nx, ny = self._agent_locations.T + 1
+        self._occupant[ox, oy] = -1
+        self._occupant[nx, ny] = self._agent_index
+        cells = self._cells[nx, ny]
+
+        # Neighbors are read before marking the new cells as visited, as in grid_world_cpp.py
+        self.set_neighbors()
+        self.count_steps += 1
+
+        # --- CPP Reward Function, per agent ---
+        stayed = (self._agent_locations == old_locations).all(axis=1)
+        is_new_cell = (cells == self.FREE) & ~stayed
+        agent_rewards = np.full(self.n_agents, -0.1)
+        agent_rewards[stayed] -= 0.5
+        agent_rewards[is_new_cell] += 1.0
+        agent_rewards[~stayed & ~is_new_cell] -= 0.3
+
+        # Final cells are distinct, so each new cell is counted once
+        self._cells[nx[is_new_cell], ny[is_new_cell]] = self.VISITED
+        self._visited_count += int(is_new_cell.sum())
+
+        reward = float(agent_rewards.sum())
+        terminated = self._visited_count >= self.total_free_cells
+        if terminated:
+            reward += 10.0
+
+        # Truncation on max steps
+        truncated = self.count_steps >= self.max_steps and not terminated
+        if truncated:
+            reward -= 5.0
+
+        info = self._get_info()
+        info["agent_rewards"] = agent_rewards
+        info["collisions"] = int(collided.sum())
+
+        if self.render_mode == "human":
+            self._render_frame()
+
+        return self._get_obs(), reward, terminated, truncated, info
+
+    def render(self):
+        if self.render_mode == "rgb_array":
+            return self._render_frame()
+
+    def _render_state(self):
+        # What is drawn on screen (see gymnasium_env/rendering.py)
+        return {
+            "size": self.size,
+            "agent": self._agent_locations[0].copy(),
+            "agents": self._agent_locations.copy(),
+            "cells": self._cells[1:-1, 1:-1].copy(),
+            "text": f"Coverage: {self.coverage_ratio:.1%} | Steps: {self.count_steps}",
+        }
+
+    def _render_frame(self):
+        if self.window is None and self.render_mode == "human":
+            pygame.init()
+            pygame.display.init()
+            self.window = pygame.display.set_mode(
+                (self.window_size, self.window_size)
+            )
+        if self.clock is None and self.render_mode == "human":
+            self.clock = pygame.time.Clock()
+
+        canvas = draw_grid(self._render_state(), self.window_size)
+
+        if self.render_mode == "human":
+            self.window.blit(canvas, canvas.get_rect())
+            pygame.event.pump()
+            pygame.display.update()
+            self.clock.tick(self.metadata["render_fps"])
+        else:
+            return surface_to_array(canvas)
+
+    def close(self):
+        if self.window is not None:
+            pygame.display.quit()
+            pygame.quit()
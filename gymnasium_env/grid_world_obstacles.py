@@ -4,6 +4,9 @@ import gymnasium as gym
 
 import pygame
 
+from gymnasium_env.rendering import AsyncRenderer, PygameViewer, draw_grid, surface_to_array
+from gymnasium_env.rng import RandomBuffer, check_layout, sample_layouts
+
 #
 # This code is based on the example from Gymnasium: 
 # https://gymnasium.farama.org/introduction/create_custom_env/
@@ -17,6 +20,13 @@ import pygame
 # - the state of the 4 neighboring cells (up, down, left, right),
 #   where 0 indicates a free cell and 1 indicates an obstacle or wall.
 #
+# The `obs_encoding` option selects how this array is typed:
+# - "int" (default): int64 values, every component bounded by [0, size-1];
+# - "compact": the same values as uint8 (int16 for grids larger than 256),
+#   with coordinates bounded by [0, size-1] and neighbor flags by [0, 1];
+# - "normalized": float32, coordinates divided by size-1 and neighbor flags in {0, 1}.
+# Models trained with "int" can be used with "compact", as the values are the same.
+#
 # The action space is discrete with 4 actions: move right, up, left, down.
 #
 # The agent receives a reward of +10 for reaching the target, a small negative reward (-0.1) for each step taken,
@@ -26,24 +36,51 @@ import pygame
 
 class GridWorldRenderEnv(gym.Env):
 
-    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
+    metadata = {"render_modes": ["human", "human_async", "rgb_array"], "render_fps": 4}
+
+    # Cell values of the padded obstacle grid
+    FREE, WALL = 0, 1
+
+    # Offsets of the neighbors in `_neighbors` order (right, up, left, down),
+    # the same order as the actions
+    _NEIGHBOR_OFFSETS = np.array([[1, 0], [0, -1], [-1, 0], [0, 1]], dtype=np.int16)
 
-    def __init__(self, render_mode=None, size: int = 5, obs_quantity: int = 5, max_steps: int = 100):
+    def __init__(self, render_mode=None, size: int = 5, obs_quantity: int = 5, max_steps: int = 100,
+                 obs_encoding: str = "int", render_viewport: Optional[int] = None):
         # The size of the square grid
         self.size = size
         self.window_size = 512
+        # Width in cells of the rendered view, which follows the agent (None: whole grid)
+        self.render_viewport = render_viewport
         self.obs_quantity = obs_quantity
-        self.obstacles_locations = []
         self.count_steps = 0
         self.max_steps = max_steps
 
+        # Grid of obstacles indexed by [x, y], padded with a border of walls so that
+        # neighbors never fall outside of it. Cell (x, y) is self._cells[x + 1, y + 1].
+        self._cells = np.full((size + 2, size + 2), self.WALL, dtype=np.uint8)
+        self._obstacles_cache = None
+
         # Define the agent and target location; randomly chosen in `reset` and updated in `step`
-        self._agent_location = np.array([-1, -1], dtype=int)
-        self._target_location = np.array([-1, -1], dtype=int)
-        self._neighbors = np.array([0,0,0,0], dtype=int)  #up, down, left, right
+        self._agent_location = np.array([-1, -1], dtype=np.int16)
+        self._target_location = np.array([-1, -1], dtype=np.int16)
+        self._neighbors = np.array([0,0,0,0], dtype=np.uint8)  #right, up, left, down
+        self._action_mask = np.ones(4, dtype=bool)
+
+        # Random numbers for reset are drawn in blocks (see gymnasium_env/rng.py)
+        self._rng_buffer = RandomBuffer()
 
         # The state is represented with the agent's and target's location and the grid of neighbors
-        self.observation_space = gym.spaces.Box(0, size - 1, shape=(2 + 2 + 4,), dtype=int)
+        assert obs_encoding in ("int", "compact", "normalized")
+        self.obs_encoding = obs_encoding
+        if obs_encoding == "int":
+            self.observation_space = gym.spaces.Box(0, size - 1, shape=(2 + 2 + 4,), dtype=int)
+        elif obs_encoding == "compact":
+            dtype = np.uint8 if size <= 256 else np.int16
+            high = np.array([size - 1] * 4 + [1] * 4, dtype=dtype)
+            self.observation_space = gym.spaces.Box(np.zeros(8, dtype=dtype), high, dtype=dtype)
+        else:
+            self.observation_space = gym.spaces.Box(0.0, 1.0, shape=(2 + 2 + 4,), dtype=np.float32)
 
         # We have 4 actions, corresponding to "right", "up", "left", "down"
         self.action_space = gym.spaces.Discrete(4)
@@ -67,71 +104,95 @@ class GridWorldRenderEnv(gym.Env):
         """
         self.window = None
         self.clock = None
+        self._async_renderer = None
+
+    @property
+    def obstacles_locations(self):
+        # List of obstacle locations, built on demand from the grid
+        if self._obstacles_cache is None:
+            interior = self._cells[1:-1, 1:-1]
+            self._obstacles_cache = [np.array(loc) for loc in np.argwhere(interior == self.WALL)]
+        return self._obstacles_cache
+
+    def _is_blocked(self, location) -> bool:
+        return self._cells[location[0] + 1, location[1] + 1] == self.WALL
 
     def _get_obs(self):
-        flattened = []
-        flattened.extend(self._agent_location)
-        flattened.extend(self._target_location)
-        flattened.extend(self._neighbors)
-        return np.array(flattened, dtype=int)
+        observation = np.empty(2 + 2 + 4, dtype=self.observation_space.dtype)
+        if self.obs_encoding == "normalized":
+            scale = max(self.size - 1, 1)
+            observation[0:2] = self._agent_location / scale
+            observation[2:4] = self._target_location / scale
+        else:
+            observation[0:2] = self._agent_location
+            observation[2:4] = self._target_location
+        observation[4:8] = self._neighbors
+        return observation
 
     def _get_info(self):
         return {
             "distance": np.linalg.norm(
                 self._agent_location - self._target_location, ord=1
             ),
-            "size": self.size
+            "size": self.size,
+            "action_mask": self.action_masks(),
         }
 
-    def set_neighbors(self, obstacles_locations):
-        # create a map of the neighbors
-        # 1 = free, 0 = obstacle or wall
-        directions = [np.array([1, 0]), np.array([0, -1]), np.array([-1, 0]), np.array([0, 1])]
-        for i, direction in enumerate(directions):
-            neighbor = self._agent_location + direction
-            if (0 <= neighbor[0] < self.size) and (0 <= neighbor[1] < self.size) and not any(np.array_equal(neighbor, loc) for loc in obstacles_locations):
-                self._neighbors[i] = 0
-            else:
-                self._neighbors[i] = 1
+    def action_masks(self):
+        # Valid actions (True) are the moves to a free neighbor; the neighbors
+        # are in action order. Used by sb3_contrib's MaskablePPO.
+        return self._action_mask.copy()
+
+    def set_neighbors(self, obstacles_locations=None):
+        # create a map of the neighbors, read from the padded grid
+        # 0 = free, 1 = obstacle or wall
+        # `obstacles_locations` is kept for compatibility; obstacles are read from the grid.
+        neighbors = self._agent_location + 1 + self._NEIGHBOR_OFFSETS
+        self._neighbors = self._cells[neighbors[:, 0], neighbors[:, 1]]
+        self._action_mask = self._neighbors == self.FREE
+        if not self._action_mask.any():
+            # Agent enclosed by obstacles: every action is a no-op, allow them all
+            self._action_mask[:] = True
+
+    def seeded_layouts(self, seeds) -> np.ndarray:
+        """The cells `reset(seed=s)` places for each seed, drawn in one batched call, for options["layout"]."""
+        return sample_layouts(seeds, self.size * self.size, 2 + self.obs_quantity)
 
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
         self.count_steps = 0
-        self.obstacles_locations = []
-
-        # Choose the agent's location uniformly at random
-        self._agent_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-
-        # We will sample the target's location randomly until it does not coincide with the agent's location
-        self._target_location = self._agent_location
-        while np.array_equal(self._target_location, self._agent_location):
-            self._target_location = self.np_random.integers(
-                0, self.size, size=2, dtype=int
-            )        
-
-        for _ in range(self.obs_quantity):
-            obstacle_location = self._agent_location
-            while (np.array_equal(obstacle_location, self._agent_location) or 
-                   np.array_equal(obstacle_location, self._target_location) or
-                   any(np.array_equal(obstacle_location, loc) for loc in self.obstacles_locations)):
-                obstacle_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-            self.obstacles_locations.append(obstacle_location)
+        self._cells[1:-1, 1:-1] = self.FREE
+        self._obstacles_cache = None
+
+        # Agent, target and obstacles are placed in distinct random cells (cell
+        # index x * size + y), in this order. A caller can pass the cells
+        # in options["layout"] instead, e.g. from `seeded_layouts`.
+        if options is not None and "layout" in options:
+            cells = check_layout(options["layout"], self.size * self.size, 2 + self.obs_quantity)
+        else:
+            cells = self._rng_buffer.sample_distinct(self.size * self.size, 2 + self.obs_quantity)
+        xs, ys = np.divmod(cells, self.size)
+        self._agent_location = np.array([xs[0], ys[0]], dtype=np.int16)
+        self._target_location = np.array([xs[1], ys[1]], dtype=np.int16)
+        self._cells[xs[2:] + 1, ys[2:] + 1] = self.WALL
 
-        self.set_neighbors(self.obstacles_locations)
+        self.set_neighbors()
 
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, info
     
     def distance(self, location, target):
-        x = (location[0] - target[0])*(location[0] - target[0])
-        y = (location[1] - target[1])*(location[1] - target[1])
-        return np.sqrt(x+y)
+        # Python ints: the locations are int16 and their squares could overflow
+        dx = int(location[0]) - int(target[0])
+        dy = int(location[1]) - int(target[1])
+        return np.sqrt(dx*dx + dy*dy)
 
     def step(self, action):
 
@@ -145,13 +206,13 @@ class GridWorldRenderEnv(gym.Env):
         # We use `np.clip` to make sure we don't leave the grid bounds
         self._agent_location = np.clip(
             self._agent_location + direction, 0, self.size - 1
-        )
+        ).astype(np.int16)
 
         # If the agent hits an obstacle, it stays in the same position
-        if any(np.array_equal(self._agent_location, loc) for loc in self.obstacles_locations):
+        if self._is_blocked(self._agent_location):
             self._agent_location = old_location
 
-        self.set_neighbors(self.obstacles_locations)
+        self.set_neighbors()
 
         # Calculate current distance
         current_distance = self.distance(self._agent_location, self._target_location)
@@ -176,17 +237,95 @@ class GridWorldRenderEnv(gym.Env):
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, reward, terminated, truncated, info
     
     
+    #
+    # Pickling (e.g. when shipping envs to subprocess workers) transfers only the
+    # constructor arguments and a compact record of the state: int16 locations,
+    # the step counter and the packed obstacle bitmap. Spaces, lookup tables and
+    # pygame handles are rebuilt by __init__.
+    #
+
+    _STATE_DTYPE = np.dtype([
+        ("agent", np.int16, (2,)),
+        ("target", np.int16, (2,)),
+        ("count_steps", np.int32),
+    ])
+
+    def _rng_buffer_state(self):
+        if self._np_random is None:
+            return None
+        self._rng_buffer.bind(self._np_random)
+        return self._rng_buffer.get_state()
+
+    def __getstate__(self):
+        record = np.zeros((), dtype=self._STATE_DTYPE)
+        record["agent"] = self._agent_location
+        record["target"] = self._target_location
+        record["count_steps"] = self.count_steps
+        return {
+            "kwargs": {
+                "render_mode": self.render_mode,
+                "size": self.size,
+                "obs_quantity": self.obs_quantity,
+                "max_steps": self.max_steps,
+                "obs_encoding": self.obs_encoding,
+                "render_viewport": self.render_viewport,
+            },
+            "spec": self.spec,
+            "np_random": (self._np_random, self._np_random_seed),
+            "rng_buffer": self._rng_buffer_state(),
+            "record": record.tobytes(),
+            "obstacles": np.packbits(self._cells[1:-1, 1:-1]).tobytes(),
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state["kwargs"])
+        self.spec = state["spec"]
+        self._np_random, self._np_random_seed = state["np_random"]
+        if state.get("rng_buffer") is not None:
+            self._rng_buffer.set_state(self._np_random, state["rng_buffer"])
+
+        record = np.frombuffer(state["record"], dtype=self._STATE_DTYPE)[0]
+        self._agent_location = record["agent"].copy()
+        self._target_location = record["target"].copy()
+        self.count_steps = int(record["count_steps"])
+
+        n_cells = self.size * self.size
+        obstacles = np.unpackbits(np.frombuffer(state["obstacles"], np.uint8), count=n_cells)
+        self._cells[1:-1, 1:-1] = obstacles.reshape(self.size, self.size)
+        if self._agent_location[0] >= 0:
+            self.set_neighbors()
+
     def render(self):
         if self.render_mode == "rgb_array":
             return self._render_frame()
 
+    def _render_state(self):
+        # What is drawn on screen (see gymnasium_env/rendering.py)
+        state = {
+            "size": self.size,
+            "agent": self._agent_location.copy(),
+            "target": self._target_location.copy(),
+            "cells": self._cells[1:-1, 1:-1].copy(),
+        }
+        if self.render_viewport is not None:
+            state["viewport"] = self.render_viewport
+        return state
+
     def _render_frame(self):
+        if self.render_mode == "human_async":
+            # Frames are drawn and shown by a viewer process, stepping does not wait for it
+            if self._async_renderer is None:
+                self._async_renderer = AsyncRenderer(PygameViewer(self.window_size, "GridWorld obstacles"))
+            if self._async_renderer.due():
+                self._async_renderer.submit(self._render_state())
+            return
+
         if self.window is None and self.render_mode == "human":
             pygame.init()
             pygame.display.init()
@@ -196,56 +335,7 @@ class GridWorldRenderEnv(gym.Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((self.window_size, self.window_size))
-        canvas.fill((255, 255, 255))
-        pix_square_size = (
-            self.window_size / self.size
-        )  # The size of a single grid square in pixels
-
-        # First we draw the target
-        pygame.draw.rect(
-            canvas,
-            (255, 0, 0),
-            pygame.Rect(
-                pix_square_size * self._target_location,
-                (pix_square_size, pix_square_size),
-            ),
-        )
-        # Now we draw the agent
-        pygame.draw.circle(
-            canvas,
-            (0, 0, 255),
-            (self._agent_location + 0.5) * pix_square_size,
-            pix_square_size / 3,
-        )
-
-        # Draw the obstacles
-        for obs in self.obstacles_locations:
-            pygame.draw.rect(
-                canvas,
-                (0, 0, 0),
-                pygame.Rect(
-                    pix_square_size * obs,
-                    (pix_square_size, pix_square_size),
-                ),
-            )
-
-        # Finally, add some gridlines
-        for x in range(self.size + 1):
-            pygame.draw.line(
-                canvas,
-                0,
-                (0, pix_square_size * x),
-                (self.window_size, pix_square_size * x),
-                width=3,
-            )
-            pygame.draw.line(
-                canvas,
-                0,
-                (pix_square_size * x, 0),
-                (pix_square_size * x, self.window_size),
-                width=3,
-            )
+        canvas = draw_grid(self._render_state(), self.window_size)
 
         if self.render_mode == "human":
             # The following line copies our drawings from `canvas` to the visible window
@@ -257,11 +347,12 @@ class GridWorldRenderEnv(gym.Env):
             # The following line will automatically add a delay to keep the framerate stable.
             self.clock.tick(self.metadata["render_fps"])
         else:  # rgb_array
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )    
+            return surface_to_array(canvas)
         
     def close(self):
+        if self._async_renderer is not None:
+            self._async_renderer.close(self._render_state())
+            self._async_renderer = None
         if self.window is not None:
             pygame.display.quit()
             pygame.quit()
\ No newline at end of file
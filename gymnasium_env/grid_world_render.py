@@ -4,6 +4,9 @@ import gymnasium as gym
 
 import pygame
 
+from gymnasium_env.rendering import AsyncRenderer, PygameViewer, draw_grid, surface_to_array
+from gymnasium_env.rng import RandomBuffer
+
 #
 # This code is based on the example from Gymnasium: 
 # https://gymnasium.farama.org/introduction/create_custom_env/
@@ -18,16 +21,20 @@ import pygame
 
 class GridWorldRenderEnv(gym.Env):
 
-    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 4}
+    metadata = {"render_modes": ["human", "human_async", "rgb_array"], "render_fps": 4}
 
-    def __init__(self, render_mode=None, size: int = 5):
+    def __init__(self, render_mode=None, size: int = 5, obs_format: str = "dict",
+                 render_viewport: Optional[int] = None):
         # The size of the square grid
         self.size = size
         self.window_size = 512
+        # Width in cells of the rendered view, which follows the agent (None: whole grid)
+        self.render_viewport = render_viewport
 
         # Define the agent and target location; randomly chosen in `reset` and updated in `step`
         self._agent_location = np.array([-1, -1], dtype=int)
         self._target_location = np.array([-1, -1], dtype=int)
+        self._rng_buffer = RandomBuffer()
 
         # Observations are dictionaries with the agent's and the target's location.
         # Each location is encoded as an element of {0, ..., `size`-1}^2
@@ -38,6 +45,15 @@ class GridWorldRenderEnv(gym.Env):
             }
         )
 
+        # obs_format="flat": FlattenObservation's layout, see GridWorldEnv in grid_world.py
+        assert obs_format in ("dict", "flat")
+        self.obs_format = obs_format
+        if obs_format == "flat":
+            flat_space = gym.spaces.flatten_space(self.observation_space)
+            self.observation_space = gym.spaces.Box(
+                flat_space.low.astype(np.float32), flat_space.high.astype(np.float32), dtype=np.float32
+            )
+
         # We have 4 actions, corresponding to "right", "up", "left", "down"
         self.action_space = gym.spaces.Discrete(4)
         # Dictionary maps the abstract actions to the directions on the grid
@@ -60,8 +76,11 @@ class GridWorldRenderEnv(gym.Env):
         """
         self.window = None
         self.clock = None
+        self._async_renderer = None
 
     def _get_obs(self):
+        if self.obs_format == "flat":
+            return np.concatenate((self._agent_location, self._target_location), dtype=np.float32)
         return {"agent": self._agent_location, "target": self._target_location}
     
     def _get_info(self):
@@ -75,21 +94,19 @@ class GridWorldRenderEnv(gym.Env):
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None):
         # We need the following line to seed self.np_random
         super().reset(seed=seed)
+        self._rng_buffer.bind(self.np_random)
 
-        # Choose the agent's location uniformly at random
-        self._agent_location = self.np_random.integers(0, self.size, size=2, dtype=int)
-
-        # We will sample the target's location randomly until it does not coincide with the agent's location
-        self._target_location = self._agent_location
-        while np.array_equal(self._target_location, self._agent_location):
-            self._target_location = self.np_random.integers(
-                0, self.size, size=2, dtype=int
-            )
+        # Agent and target are placed in two distinct random cells, drawn from a
+        # buffer of pre-drawn random numbers (see gymnasium_env/rng.py)
+        cells = self._rng_buffer.sample_distinct(self.size ** 2, 2)
+        self._agent_location, self._target_location = np.stack(
+            np.unravel_index(cells, (self.size, self.size)), axis=1
+        )
 
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, info
@@ -109,7 +126,7 @@ class GridWorldRenderEnv(gym.Env):
         observation = self._get_obs()
         info = self._get_info()
 
-        if self.render_mode == "human":
+        if self.render_mode in ("human", "human_async"):
             self._render_frame()
 
         return observation, reward, terminated, truncated, info
@@ -119,7 +136,26 @@ class GridWorldRenderEnv(gym.Env):
         if self.render_mode == "rgb_array":
             return self._render_frame()
 
+    def _render_state(self):
+        # What is drawn on screen (see gymnasium_env/rendering.py)
+        state = {
+            "size": self.size,
+            "agent": self._agent_location.copy(),
+            "target": self._target_location.copy(),
+        }
+        if self.render_viewport is not None:
+            state["viewport"] = self.render_viewport
+        return state
+
     def _render_frame(self):
+        if self.render_mode == "human_async":
+            # Frames are drawn and shown by a viewer process, stepping does not wait for it
+            if self._async_renderer is None:
+                self._async_renderer = AsyncRenderer(PygameViewer(self.window_size, "GridWorld"))
+            if self._async_renderer.due():
+                self._async_renderer.submit(self._render_state())
+            return
+
         if self.window is None and self.render_mode == "human":
             pygame.init()
             pygame.display.init()
@@ -129,45 +165,7 @@ class GridWorldRenderEnv(gym.Env):
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        canvas = pygame.Surface((self.window_size, self.window_size))
-        canvas.fill((255, 255, 255))
-        pix_square_size = (
-            self.window_size / self.size
-        )  # The size of a single grid square in pixels
-
-        # First we draw the target
-        pygame.draw.rect(
-            canvas,
-            (255, 0, 0),
-            pygame.Rect(
-                pix_square_size * self._target_location,
-                (pix_square_size, pix_square_size),
-            ),
-        )
-        # Now we draw the agent
-        pygame.draw.circle(
-            canvas,
-            (0, 0, 255),
-            (self._agent_location + 0.5) * pix_square_size,
-            pix_square_size / 3,
-        )
-
-        # Finally, add some gridlines
-        for x in range(self.size + 1):
-            pygame.draw.line(
-                canvas,
-                0,
-                (0, pix_square_size * x),
-                (self.window_size, pix_square_size * x),
-                width=3,
-            )
-            pygame.draw.line(
-                canvas,
-                0,
-                (pix_square_size * x, 0),
-                (pix_square_size * x, self.window_size),
-                width=3,
-            )
+        canvas = draw_grid(self._render_state(), self.window_size)
 
         if self.render_mode == "human":
             # The following line copies our drawings from `canvas` to the visible window
@@ -179,11 +177,12 @@ class GridWorldRenderEnv(gym.Env):
             # The following line will automatically add a delay to keep the framerate stable.
             self.clock.tick(self.metadata["render_fps"])
         else:  # rgb_array
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
-            )    
+            return surface_to_array(canvas)
         
     def close(self):
+        if self._async_renderer is not None:
+            self._async_renderer.close(self._render_state())
+            self._async_renderer = None
         if self.window is not None:
             pygame.display.quit()
             pygame.quit()
\ No newline at end of file
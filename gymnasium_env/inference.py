@@ -0,0 +1,224 @@
+import io
+import json
+import os
+import warnings
+import zipfile
+from typing import Optional
+
+import numpy as np
+import torch
+from stable_baselines3.common.policies import BasePolicy
+from stable_baselines3.common.save_util import json_to_data
+
+#
+# Fast inference path for trained PPO policies.
+#
+# `PPO.load(...)` followed by `model.predict(obs)` goes through the full SB3
+# machinery (observation checks, numpy -> tensor conversion, distribution
+# objects) for every single observation. For evaluation loops and for
+# deploying the coverage planner this overhead dominates the cost of the
+# tiny MLPs used in this repository.
+#
+# This module exports only the actor part of the policy
+# (features extractor -> mlp_extractor.forward_actor -> action_net) to a
+# frozen TorchScript module optimized for CPU inference. The exported
+# artifact is cached next to the model, e.g.:
+#
+#   data/ppo_cpp_5_3_200_0.05_20260324_100000.zip
+#   data/ppo_cpp_5_3_200_0.05_20260324_100000.policy.pt
+#
+# and is rebuilt automatically when the `.zip` is newer than the cache.
+#
+# Both `MlpPolicy` (Box observations) and `MultiInputPolicy` (Dict
+# observations, as used by the CPP environment) are supported. Only
+# discrete action spaces are supported, which covers every environment
+# in `gymnasium_env`.
+#
+# Usage:
+#
+#   policy = BatchPolicy.from_model("data/ppo_cpp_5_3_200_0.05_20260324_100000.zip")
+#   action, _ = policy.predict(obs)                # single observation
+#   actions, _ = policy.predict(batch_of_obs)      # batch of observations
+#
+
+EXPORT_SUFFIX = ".policy.pt"
+
+
+class _ActorModule(torch.nn.Module):
+    # Wraps the actor part of an SB3 ActorCriticPolicy so that it can be
+    # traced. Dict observations are passed positionally (in `keys` order)
+    # because tracing works on tensors, not on dictionaries.
+
+    def __init__(self, policy, keys):
+        super().__init__()
+        self.policy = policy
+        self.keys = keys
+
+    def forward(self, *inputs):
+        if self.keys:
+            obs = dict(zip(self.keys, inputs))
+        else:
+            obs = inputs[0]
+        features = BasePolicy.extract_features(self.policy, obs, self.policy.pi_features_extractor)
+        latent_pi = self.policy.mlp_extractor.forward_actor(features)
+        return self.policy.action_net(latent_pi)
+
+
+def _observation_layout(observation_space):
+    # Returns (keys, shapes); keys is None for non-Dict observation spaces.
+    if hasattr(observation_space, "spaces") and isinstance(observation_space.spaces, dict):
+        keys = list(observation_space.spaces.keys())
+        shapes = [tuple(observation_space.spaces[k].shape) for k in keys]
+        return keys, shapes
+    return None, [tuple(observation_space.shape)]
+
+
+def load_policy(model_path: str):
+    """Rebuild only the policy network of an SB3 `.zip` on the CPU.
+
+    Unlike `PPO.load`, this reads just the `data` and `policy.pth` members of
+    the archive: the optimizer state and the algorithm object are skipped.
+    """
+    with zipfile.ZipFile(model_path) as archive:
+        data = json_to_data(archive.read("data").decode())
+        state_dict = torch.load(io.BytesIO(archive.read("policy.pth")), map_location="cpu", weights_only=True)
+
+    policy_kwargs = dict(data.get("policy_kwargs", {}))
+    policy_kwargs.pop("device", None)
+    policy = data["policy_class"](
+        data["observation_space"], data["action_space"], lambda _: 0.0, **policy_kwargs
+    )
+    policy.load_state_dict(state_dict)
+    return policy.eval()
+
+
+def export_policy(policy, export_path: str):
+    """Trace, freeze and save the actor of an SB3 policy to `export_path`."""
+    assert hasattr(policy.action_space, "n"), "Only Discrete action spaces are supported"
+
+    policy = policy.to("cpu").eval()
+    keys, shapes = _observation_layout(policy.observation_space)
+    example = tuple(torch.zeros((1, *shape), dtype=torch.float32) for shape in shapes)
+
+    meta = {"keys": keys, "shapes": shapes, "n_actions": int(policy.action_space.n)}
+    # Per-process temporary file: concurrent exports of the same model (e.g.
+    # two runs loading it through ModelRegistry) do not write to the same one
+    tmp_path = f"{export_path}.{os.getpid()}.tmp"
+
+    # Recent PyTorch versions flag the TorchScript API as deprecated; it is
+    # still the only format that runs without extra runtime dependencies.
+    with warnings.catch_warnings(), torch.no_grad():
+        warnings.simplefilter("ignore", FutureWarning)
+        traced = torch.jit.trace(_ActorModule(policy, keys), example)
+        frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+        torch.jit.save(frozen, tmp_path, _extra_files={"meta.json": json.dumps(meta)})
+    os.replace(tmp_path, export_path)
+    return frozen, meta
+
+
+def load_exported(export_path: str):
+    extra_files = {"meta.json": ""}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        module = torch.jit.load(export_path, map_location="cpu", _extra_files=extra_files)
+    meta = json.loads(extra_files["meta.json"])
+    meta["shapes"] = [tuple(shape) for shape in meta["shapes"]]
+    return module, meta
+
+
+def export_path_for(model_path: str) -> str:
+    base = model_path[:-4] if model_path.endswith(".zip") else model_path
+    return base + EXPORT_SUFFIX
+
+
+class BatchPolicy:
+    """Batched, allocation-free inference over an exported policy.
+
+    Input tensors are preallocated for `max_batch` observations and reused
+    on every call; they grow automatically if a larger batch is seen.
+    """
+
+    def __init__(self, module, meta: dict, max_batch: int = 256, seed: Optional[int] = None):
+        self.module = module
+        self.keys = meta["keys"]
+        self.shapes = meta["shapes"]
+        self.n_actions = meta["n_actions"]
+        self.max_batch = 0
+        self._inputs = []
+        self._reserve(max_batch)
+
+        self._generator = torch.Generator()
+        if seed is not None:
+            self._generator.manual_seed(seed)
+
+    @classmethod
+    def from_model(cls, model_path: str, max_batch: int = 256, rebuild: bool = False, seed: Optional[int] = None):
+        """Load the cached export of `model_path`, exporting it first if needed."""
+        if not model_path.endswith(".zip"):
+            model_path += ".zip"
+        export_path = export_path_for(model_path)
+
+        if (rebuild or not os.path.exists(export_path)
+                or os.path.getmtime(export_path) < os.path.getmtime(model_path)):
+            policy = load_policy(model_path)
+            export_policy(policy, export_path)
+
+        module, meta = load_exported(export_path)
+        return cls(module, meta, max_batch=max_batch, seed=seed)
+
+    def _reserve(self, batch_size: int):
+        if batch_size <= self.max_batch:
+            return
+        self.max_batch = batch_size
+        self._inputs = [torch.zeros((batch_size, *shape), dtype=torch.float32) for shape in self.shapes]
+
+    def _is_single(self, observation) -> bool:
+        if self.keys:
+            return np.shape(observation[self.keys[0]]) == self.shapes[0]
+        return np.shape(observation) == self.shapes[0]
+
+    def _fill_inputs(self, observation, n: int):
+        arrays = [observation[k] for k in self.keys] if self.keys else [observation]
+        for buffer, shape, array in zip(self._inputs, self.shapes, arrays):
+            array = np.asarray(array, dtype=np.float32).reshape((n, *shape))
+            buffer[:n].copy_(torch.from_numpy(array))
+        return [buffer[:n] for buffer in self._inputs]
+
+    def logits(self, observation):
+        """Return the action logits for a batch of observations as a tensor."""
+        first = observation[self.keys[0]] if self.keys else observation
+        n = len(first)
+        self._reserve(n)
+        with torch.inference_mode():
+            return self.module(*self._fill_inputs(observation, n))
+
+    def predict(self, observation, deterministic: bool = False, action_masks=None):
+        """Mimics `model.predict`: returns (actions, None).
+
+        A single observation returns a 0-d array (so `.item()` works as with
+        SB3), a batch returns an array with one action per observation.
+        `action_masks` (bool, one row per observation) excludes invalid
+        actions, like `MaskablePPO.predict`.
+        """
+        single = self._is_single(observation)
+        if single:
+            if self.keys:
+                observation = {k: np.expand_dims(observation[k], 0) for k in self.keys}
+            else:
+                observation = np.expand_dims(observation, 0)
+
+        logits = self.logits(observation)
+        with torch.inference_mode():
+            if action_masks is not None:
+                mask = torch.as_tensor(np.asarray(action_masks, dtype=bool).reshape(logits.shape))
+                logits = logits.masked_fill(~mask, float("-inf"))
+            if deterministic:
+                actions = torch.argmax(logits, dim=1)
+            else:
+                probs = torch.softmax(logits, dim=1)
+                actions = torch.multinomial(probs, 1, generator=self._generator).squeeze(1)
+        actions = actions.numpy()
+
+        if single:
+            return actions[0], None
+        return actions, None
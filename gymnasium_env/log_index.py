@@ -0,0 +1,203 @@
+import io
+import json
+import os
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from gymnasium_env.model_registry import parse_model_name
+
+#
+# Columnar index of the training logs (`log/<run>/progress.csv`) for the
+# results notebooks.
+#
+# `LogIndex.update` ingests the progress.csv files into a Parquet store under
+# `<log_dir>/.index/`, and records in `<log_dir>/.index/manifest.json` the
+# size and modification time of each CSV, how many bytes of it were
+# ingested, its columns and the hyperparameters parsed from the run name
+# (same convention as the model names, see gymnasium_env/model_registry.py):
+#
+#   env, dim, obstacles, max_steps, entropy_coef, timestamp, tag
+#
+# Runs whose CSV did not change are skipped. When a CSV grew (a run still
+# training or a resumed one) only the new rows are read; it is re-read in
+# full only when its header changed (SB3 rewrites the file when new keys are
+# logged). The rows read by one `update` go to a single delta file, and once
+# there are more than `max_deltas` of them they are merged into
+# `data.parquet`, so loading reads a handful of files however many runs
+# there are:
+#
+#   <log_dir>/.index/data.parquet          rows of all the runs (column "run")
+#   <log_dir>/.index/delta_00000.parquet   rows added since the last merge
+#
+# Usage (e.g. in results_grid_world_obstacles.ipynb):
+#
+#   index = LogIndex("log")
+#   index.update()
+#   data = index.load(env="obstacles", dim=20, obstacles=40)
+#   index.runs()  # one row per run with its hyperparameters
+#
+
+HYPERPARAMETERS = ["env", "dim", "obstacles", "max_steps", "entropy_coef", "timestamp", "tag"]
+
+
+def _hyperparameters(run: str) -> dict:
+    info = parse_model_name(run)
+    params = {name: getattr(info, name) for name in HYPERPARAMETERS}
+    if params["timestamp"] is not None:
+        params["timestamp"] = params["timestamp"].isoformat()
+    return params
+
+
+def _write_parquet(frame: pd.DataFrame, path: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+class LogIndex:
+
+    def __init__(self, log_dir: str = "log", index_dir: Optional[str] = None, max_deltas: int = 8):
+        self.log_dir = log_dir
+        self.index_dir = index_dir or os.path.join(log_dir, ".index")
+        self.max_deltas = max_deltas
+        self.manifest_path = os.path.join(self.index_dir, "manifest.json")
+        self.manifest = {"runs": {}, "deltas": 0, "next_generation": 0}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    @property
+    def _runs(self) -> dict:
+        return self.manifest["runs"]
+
+    def _data_files(self) -> List[str]:
+        files = [os.path.join(self.index_dir, f"delta_{i:05d}.parquet") for i in range(self.manifest["deltas"])]
+        data_path = os.path.join(self.index_dir, "data.parquet")
+        return ([data_path] if os.path.exists(data_path) else []) + files
+
+    def _save_manifest(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _read_new_rows(self, run: str, csv_path: str, stat: os.stat_result) -> Optional[pd.DataFrame]:
+        """New rows of `csv_path` since the last update of `run` (None if there are none)."""
+        entry = self._runs.get(run)
+        with open(csv_path, "rb") as f:
+            header = f.readline()
+            if not header.endswith(b"\n"):
+                # Empty, or the header is still being written
+                return None
+            columns = header.decode().strip().split(",")
+            if entry is None or entry["columns"] != columns or stat.st_size < entry["offset"]:
+                # New run, or the file was rewritten: a new generation replaces its old rows
+                entry = {"offset": len(header), "rows": 0, "columns": columns,
+                         "generation": self.manifest["next_generation"], **_hyperparameters(run)}
+                self.manifest["next_generation"] += 1
+            f.seek(entry["offset"])
+            data = f.read(stat.st_size - entry["offset"])
+
+        # Only complete lines are ingested, a line being written is read next time
+        data = data[:data.rfind(b"\n") + 1]
+        entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+        self._runs[run] = entry
+        if not data.strip():
+            return None
+
+        frame = pd.read_csv(io.BytesIO(data), names=columns, header=None)
+        entry["rows"] += len(frame)
+        entry["offset"] += len(data)
+        # Float columns keep the files' schemas compatible (a column may hold
+        # integers in one part and decimals in another)
+        frame = frame.astype({c: "float64" for c in frame.columns if pd.api.types.is_integer_dtype(frame[c])})
+        return frame.assign(run=run, generation=entry["generation"])
+
+    def _read(self, runs=None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Current rows of `runs` (default all) from the store, without the ones of replaced generations."""
+        empty = pd.DataFrame(columns=[*(columns or []), "run", "generation"])
+        if runs is not None and len(runs) == 0:
+            # pyarrow rejects an "in" filter with an empty list
+            return empty
+        filters = None if runs is None else [("run", "in", list(runs))]
+        frames = []
+        for path in self._data_files():
+            available = pq.read_schema(path).names
+            read_columns = None if columns is None else [c for c in [*columns, "run", "generation"] if c in available]
+            frames.append(pd.read_parquet(path, columns=read_columns, filters=filters))
+        if not frames:
+            return empty
+        data = pd.concat(frames, ignore_index=True)
+        current = data["run"].map({run: entry["generation"] for run, entry in self._runs.items()})
+        return data[data["generation"] == current].reset_index(drop=True)
+
+    def update(self) -> List[str]:
+        """Ingest the new and changed progress.csv files; returns the runs that got new rows."""
+        new_rows = {}
+        found = set()
+        if os.path.isdir(self.log_dir):
+            with os.scandir(self.log_dir) as entries:
+                for entry in entries:
+                    csv_path = os.path.join(entry.path, "progress.csv")
+                    if not entry.is_dir() or entry.path == self.index_dir or not os.path.isfile(csv_path):
+                        continue
+                    found.add(entry.name)
+                    stat = os.stat(csv_path)
+                    known = self._runs.get(entry.name)
+                    if known is not None and (known["mtime"], known["size"]) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    frame = self._read_new_rows(entry.name, csv_path, stat)
+                    if frame is not None:
+                        new_rows[entry.name] = frame
+
+        # Runs whose logs were deleted (their rows are dropped at the next merge)
+        for run in set(self._runs) - found:
+            del self._runs[run]
+
+        if new_rows:
+            os.makedirs(self.index_dir, exist_ok=True)
+            delta_path = os.path.join(self.index_dir, f"delta_{self.manifest['deltas']:05d}.parquet")
+            _write_parquet(pd.concat(new_rows.values(), ignore_index=True), delta_path)
+            self.manifest["deltas"] += 1
+        if self.manifest["deltas"] > self.max_deltas:
+            self.compact()
+        self._save_manifest()
+        return list(new_rows)
+
+    def compact(self):
+        """Merge the delta files into data.parquet, dropping the rows of replaced or deleted runs."""
+        data = self._read()
+        data = data[data["run"].isin(self._runs.keys())]
+        os.makedirs(self.index_dir, exist_ok=True)
+        _write_parquet(data, os.path.join(self.index_dir, "data.parquet"))
+        for path in self._data_files()[1:]:
+            os.remove(path)
+        self.manifest["deltas"] = 0
+        self._save_manifest()
+
+    def runs(self, **filters) -> pd.DataFrame:
+        """One row per indexed run (hyperparameters and number of rows), optionally filtered by hyperparameters."""
+        rows = [
+            {"run": run, **{name: entry[name] for name in HYPERPARAMETERS}, "rows": entry["rows"]}
+            for run, entry in sorted(self._runs.items())
+        ]
+        runs = pd.DataFrame(rows, columns=["run", *HYPERPARAMETERS, "rows"])
+        runs["timestamp"] = pd.to_datetime(runs["timestamp"])
+        for name, value in filters.items():
+            assert name in HYPERPARAMETERS, f"Unknown hyperparameter {name}"
+            if value is not None:
+                runs = runs[runs[name] == value]
+        return runs.reset_index(drop=True)
+
+    def load(self, columns: Optional[List[str]] = None, **filters) -> pd.DataFrame:
+        """Rows of the runs matching `filters` (e.g. env="obstacles", dim=20), tagged with their hyperparameters.
+
+        Only the rows of those runs are read from the store, and only
+        `columns` (all the logged columns by default).
+        """
+        runs = self.runs(**filters)
+        data = self._read(runs["run"], columns).drop(columns="generation")
+        return data.merge(runs.drop(columns="rows"), on="run", how="left")
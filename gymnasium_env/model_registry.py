@@ -0,0 +1,165 @@
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from gymnasium_env.inference import BatchPolicy
+
+#
+# Index of the trained models stored in `data/`.
+#
+# The train scripts encode their hyperparameters in the model filename:
+#
+#   ppo_cpp_{dim}_{obstacles}_{max_steps}_{entropy}_{YYYYmmdd}_{HHMMSS}[_curriculum|_bc][_masked].zip
+#   ppo_obstacles_{dim}_{obstacles}_{max_steps}_{entropy}_{YYYYmmdd}_{HHMMSS}[_bc][_masked].zip
+#   ppo_grid_3d_{dim}_{max_steps}_{entropy}_{YYYYmmdd}_{HHMMSS}.zip
+#
+# `ModelRegistry` parses these names so that models can be looked up by
+# hyperparameters instead of by typing the full filename, and keeps an
+# in-process LRU of loaded policies so that scripts evaluating many
+# checkpoints do not pay the disk and unpickle cost more than once.
+#
+# Models tagged `_masked` were trained with MaskablePPO and should be run
+# with the environment's `action_masks()` (see `ModelInfo.masked`). Models
+# tagged `_bc` were pretrained by behavior cloning before PPO.
+#
+# Usage:
+#
+#   registry = ModelRegistry("data")
+#   info = registry.latest(env="cpp", dim=5, obstacles=3)
+#   policy = registry.load_policy(info.model_id)
+#
+
+_MODEL_NAME = re.compile(
+    r"^ppo_(?P<env>cpp|obstacles|grid_3d)_(?P<params>[\d._]+?)"
+    r"_(?P<timestamp>\d{8}_\d{6})(?:_(?P<tag>\w+))?$"
+)
+
+
+class ModelInfo(NamedTuple):
+    model_id: str
+    path: str
+    env: Optional[str] = None
+    dim: Optional[int] = None
+    obstacles: Optional[int] = None
+    max_steps: Optional[int] = None
+    entropy_coef: Optional[float] = None
+    timestamp: Optional[datetime] = None
+    tag: Optional[str] = None
+
+    @property
+    def masked(self) -> bool:
+        return self.tag is not None and "masked" in self.tag.split("_")
+
+
+def parse_model_name(model_id: str, path: str = "") -> ModelInfo:
+    """Extract the hyperparameters encoded in a model filename (without `.zip`).
+
+    Names that do not follow the convention (e.g. `ppo_custom_env`) are
+    returned with every hyperparameter set to None.
+    """
+    match = _MODEL_NAME.match(model_id)
+    if match is None:
+        return ModelInfo(model_id, path)
+
+    params = match["params"].split("_")
+    if match["env"] == "grid_3d":
+        if len(params) != 3:
+            return ModelInfo(model_id, path)
+        dim, max_steps, entropy = params
+        obstacles = None
+    else:
+        if len(params) != 4:
+            return ModelInfo(model_id, path)
+        dim, obstacles, max_steps, entropy = params
+        obstacles = int(obstacles)
+
+    return ModelInfo(
+        model_id=model_id,
+        path=path,
+        env=match["env"],
+        dim=int(dim),
+        obstacles=obstacles,
+        max_steps=int(max_steps),
+        entropy_coef=float(entropy),
+        timestamp=datetime.strptime(match["timestamp"], "%Y%m%d_%H%M%S"),
+        tag=match["tag"],
+    )
+
+
+class ModelRegistry:
+
+    def __init__(self, data_dir: str = "data", cache_size: int = 32):
+        self.data_dir = data_dir
+        self.cache_size = cache_size
+        self._models = {}
+        self._policies = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        """Re-scan `data_dir` for `.zip` models."""
+        self._models = {}
+        if not os.path.isdir(self.data_dir):
+            return
+        with os.scandir(self.data_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".zip"):
+                    model_id = entry.name[:-4]
+                    self._models[model_id] = parse_model_name(model_id, entry.path)
+
+    def models(self):
+        return sorted(self._models.values(), key=lambda info: (info.timestamp or datetime.min, info.model_id))
+
+    def find(self, **filters):
+        """Return the models whose hyperparameters match all `filters`, oldest first.
+
+        Example: `registry.find(env="cpp", dim=10, max_steps=500)`.
+        """
+        for key in filters:
+            if key not in ModelInfo._fields:
+                raise ValueError(f"Unknown model attribute: {key}")
+        return [info for info in self.models()
+                if all(getattr(info, key) == value for key, value in filters.items())]
+
+    def latest(self, **filters) -> Optional[ModelInfo]:
+        matches = self.find(**filters)
+        return matches[-1] if matches else None
+
+    def get(self, model_id: str, **filters) -> ModelInfo:
+        """Look up a model by id; `"latest"` picks the newest model matching `filters`."""
+        if model_id == "latest":
+            info = self.latest(**filters)
+            if info is None:
+                raise FileNotFoundError(f"No model in {self.data_dir} matches {filters}")
+            return info
+        if model_id.endswith(".zip"):
+            model_id = model_id[:-4]
+        model_id = os.path.basename(model_id)
+        if model_id not in self._models:
+            self.refresh()
+        if model_id not in self._models:
+            raise FileNotFoundError(f"Model {model_id} not found in {self.data_dir}")
+        return self._models[model_id]
+
+    def load_policy(self, model_id: str, **filters) -> BatchPolicy:
+        """Return a `BatchPolicy` for the model, reusing it if recently loaded."""
+        info = self.get(model_id, **filters)
+        key = (info.model_id, os.path.getmtime(info.path))
+        policy = self._policies.get(key)
+        if policy is not None:
+            self._policies.move_to_end(key)
+            return policy
+
+        policy = BatchPolicy.from_model(info.path)
+        self._policies[key] = policy
+        if len(self._policies) > self.cache_size:
+            self._policies.popitem(last=False)
+        return policy
+
+
+def model_name_from_args(args, index: int, example: str) -> str:
+    """Take the model id from the command line, or ask for it interactively."""
+    if len(args) > index:
+        return args[index]
+    return input(f"Enter model filename (e.g., {example}) or 'latest': ")
@@ -0,0 +1,298 @@
+from typing import Optional
+
+import numpy as np
+
+from gymnasium_env.recorder import TrajectoryWriter
+
+#
+# Classical planners used as experts (e.g. for behavior cloning) and as
+# baselines.
+#
+# The planners read the padded occupancy grid that the environments keep in
+# `env._cells` (cell (x, y) is `_cells[x + 1, y + 1]`, the border is walls)
+# and return the next action, with the same action encoding as the envs:
+# 0 = right (+x), 1 = up (-y), 2 = left (-x), 3 = down (+y).
+#
+#   shortest_path_action(env)  obstacles env: next step of a shortest path to the target
+#   coverage_action(env)       CPP env: next step towards the nearest unvisited cell
+#
+# `shortest_path_actions(envs)` and `coverage_actions(envs)` plan a list of
+# envs of the same size with one batched search; `record_expert_episodes`
+# uses them to step its envs in lockstep.
+#
+# Distances are computed by `bfs_distances`, a breadth-first search written
+# as a wavefront dilation over whole numpy arrays, which also works on a
+# batch of grids at once.
+#
+# The batched baselines run on thousands of seeded layouts at once, as
+# references for the step counts of the learned policies:
+#
+#   shortest_path_baseline(make_env, seeds)  optimal steps to the target (obstacles env)
+#   coverage_baseline(make_env, seeds)       steps of the nearest-unvisited-cell
+#                                            coverage of coverage_action (CPP env)
+#
+
+# Offsets (dx, dy) of the actions right, up, left, down
+ACTION_OFFSETS = np.array([[1, 0], [0, -1], [-1, 0], [0, 1]])
+
+
+def bfs_distances(passable: np.ndarray, sources: np.ndarray, until: Optional[np.ndarray] = None) -> np.ndarray:
+    """Number of 4-connected moves from the nearest source to every cell.
+
+    `passable` and `sources` are boolean arrays of shape (..., H, W); the
+    leading dimensions are a batch of independent grids. Cells that cannot be
+    reached are -1. The grids must be surrounded by non-passable cells (as the
+    padded grids of the envs are).
+
+    With `until` (same shape), the search stops as soon as every grid has
+    reached one of its `until` cells; farther cells are left at -1.
+    """
+    distances = np.full(passable.shape, -1, dtype=np.int32)
+    frontier = sources & passable
+    reached = frontier.copy()
+    distances[frontier] = 0
+    grown = np.empty_like(frontier)
+    distance = 0
+    while frontier.any():
+        if until is not None and (reached & until).any(axis=(-2, -1)).all():
+            break
+        distance += 1
+        grown[...] = False
+        grown[..., 1:, :] |= frontier[..., :-1, :]
+        grown[..., :-1, :] |= frontier[..., 1:, :]
+        grown[..., :, 1:] |= frontier[..., :, :-1]
+        grown[..., :, :-1] |= frontier[..., :, 1:]
+        frontier = grown & passable & ~reached
+        reached |= frontier
+        distances[frontier] = distance
+    return distances
+
+
+def first_action(distances: np.ndarray, start, goal) -> Optional[int]:
+    """First action of a shortest path from `start` to `goal` (padded coordinates).
+
+    `distances` must be `bfs_distances` from `start`. The path is followed
+    backwards from the goal, each time to a neighbor one step closer.
+    """
+    x, y = goal
+    if distances[x, y] <= 0:
+        return None
+    while distances[x, y] > 1:
+        for dx, dy in ACTION_OFFSETS:
+            if distances[x - dx, y - dy] == distances[x, y] - 1:
+                x, y = x - dx, y - dy
+                break
+    offset = (x - start[0], y - start[1])
+    return int(np.flatnonzero((ACTION_OFFSETS == offset).all(axis=1))[0])
+
+
+def _sources(shape, location) -> np.ndarray:
+    sources = np.zeros(shape, dtype=bool)
+    sources[location[0] + 1, location[1] + 1] = True
+    return sources
+
+
+def _batch(envs):
+    """Unwrapped envs, padded passable grids and padded agent locations of a list of envs."""
+    envs = [env.unwrapped for env in envs]
+    cells = np.stack([env._cells for env in envs])
+    agents = np.array([env._agent_location for env in envs]) + 1
+    return envs, cells, cells != envs[0].WALL, agents
+
+
+def shortest_path_actions(envs) -> list:
+    """Next action of a shortest path to the target of each env (obstacles env), None if unreachable.
+
+    One batched BFS serves all the envs, which must have the same size.
+    """
+    envs, cells, passable, agents = _batch(envs)
+    distances = bfs_distances(passable, _location_mask(cells.shape, agents))
+    return [first_action(distances[i], agents[i], env._target_location + 1) for i, env in enumerate(envs)]
+
+
+def shortest_path_action(env) -> Optional[int]:
+    """Next action of a shortest path to the target (obstacles env), None if unreachable."""
+    return shortest_path_actions([env])[0]
+
+
+def coverage_actions(envs) -> list:
+    """Next action towards the nearest unvisited cell of each env (CPP env), None if none is reachable.
+
+    Ties are broken by the lowest (x, y), so the agent sweeps the grid column
+    by column (a boustrophedon pattern) wherever the obstacles allow it. One
+    batched BFS serves all the envs, which must have the same size.
+    """
+    envs, cells, passable, agents = _batch(envs)
+    distances = bfs_distances(passable, _location_mask(cells.shape, agents))
+    never = np.iinfo(np.int32).max
+    candidates = np.where((cells == envs[0].FREE) & (distances > 0), distances, never)
+    actions = []
+    for i in range(len(envs)):
+        goal = np.unravel_index(np.argmin(candidates[i]), candidates.shape[1:])
+        actions.append(None if candidates[i][goal] == never else first_action(distances[i], agents[i], goal))
+    return actions
+
+
+def coverage_action(env) -> Optional[int]:
+    """Next action towards the nearest unvisited cell (CPP env), None if none is reachable."""
+    return coverage_actions([env])[0]
+
+
+def record_expert_episodes(make_env, planner, path: str, n_episodes: int, seed: int = 0,
+                           obs_dtypes: Optional[dict] = None, max_attempts: Optional[int] = None,
+                           n_envs: int = 16) -> dict:
+    """Record `n_episodes` successful episodes of `planner` into the dataset at `path`.
+
+    `planner` maps a list of envs to their actions (e.g. `coverage_actions`):
+    `n_envs` episodes are stepped in lockstep, so that one batched BFS plans
+    the step of all of them. Episodes the planner cannot complete (a target
+    or free cells enclosed by obstacles) are discarded, so the dataset only
+    holds expert behaviour. Episode `i` is reset with `seed + i` and episodes
+    are written in that order, so the dataset does not depend on `n_envs`.
+    Returns the number of recorded and discarded episodes and of recorded
+    transitions.
+    """
+    envs = [make_env() for _ in range(n_envs)]
+    writer = TrajectoryWriter(path, envs[0].observation_space, envs[0].action_space, obs_dtypes=obs_dtypes)
+    max_attempts = max_attempts or 2 * n_episodes
+    recorded = attempts = written = 0
+    running = {}   # env index -> (attempt, observation, transitions)
+    finished = {}  # attempt -> transitions of a completed episode, None if discarded
+    while True:
+        # Start new episodes only while the running and completed ones could
+        # fall short of n_episodes, so the attempts are those of a sequential run
+        completed = sum(transitions is not None for transitions in finished.values())
+        for i, env in enumerate(envs):
+            if i not in running and attempts < max_attempts and recorded + completed + len(running) < n_episodes:
+                obs, _ = env.reset(seed=seed + attempts)
+                running[i] = (attempts, obs, [])
+                attempts += 1
+        if not running:
+            break
+        indices = list(running)
+        for i, action in zip(indices, planner([envs[i] for i in indices])):
+            attempt, obs, transitions = running.pop(i)
+            if action is None:
+                finished[attempt] = None
+                continue
+            next_obs, reward, terminated, truncated, _ = envs[i].step(action)
+            transitions.append((obs, action, reward, terminated, truncated))
+            if terminated or truncated:
+                finished[attempt] = transitions if terminated else None
+            else:
+                running[i] = (attempt, next_obs, transitions)
+        while written in finished:
+            transitions = finished.pop(written)
+            written += 1
+            if transitions is not None:
+                for transition in transitions:
+                    writer.add(*transition)
+                writer.end_episode()
+                recorded += 1
+    writer.close()
+    for env in envs:
+        env.close()
+    return {"episodes": recorded, "discarded": attempts - recorded, "transitions": writer.n_transitions}
+
+
+def _layouts(make_env, seeds):
+    """Padded grids, agent and target locations of the layouts drawn by `reset(seed=...)`."""
+    env = make_env().unwrapped
+    cells = np.empty((len(seeds), env.size + 2, env.size + 2), dtype=env._cells.dtype)
+    agents = np.empty((len(seeds), 2), dtype=np.int64)
+    targets = np.empty((len(seeds), 2), dtype=np.int64)
+    for i, layout in enumerate(env.seeded_layouts(seeds)):
+        env.reset(options={"layout": layout})
+        cells[i] = env._cells
+        agents[i] = env._agent_location
+        targets[i] = getattr(env, "_target_location", (-1, -1))
+    env.close()
+    return env, cells, agents + 1, targets + 1
+
+
+def _location_mask(shape, locations) -> np.ndarray:
+    mask = np.zeros(shape, dtype=bool)
+    mask[np.arange(len(locations)), locations[:, 0], locations[:, 1]] = True
+    return mask
+
+
+def shortest_path_baseline(make_env, seeds, batch_size: int = 1024) -> np.ndarray:
+    """Length of the shortest path from agent to target of each seeded layout (-1 if unreachable)."""
+    steps = np.empty(len(seeds), dtype=np.int64)
+    for start in range(0, len(seeds), batch_size):
+        env, cells, agents, targets = _layouts(make_env, seeds[start:start + batch_size])
+        passable = cells != env.WALL
+        agent_mask = _location_mask(cells.shape, agents)
+        distances = bfs_distances(passable, _location_mask(cells.shape, targets), until=agent_mask)
+        steps[start:start + len(agents)] = distances[agent_mask]
+    return steps
+
+
+def coverage_baseline(make_env, seeds, max_steps: Optional[int] = None, batch_size: int = 1024) -> dict:
+    """Run the expert of `coverage_actions` on every seeded layout in lockstep.
+
+    Every step, one BFS from the agents of all the grids finds each agent's
+    nearest unvisited cell, the lowest (x, y) among the nearest ones, and
+    the agent moves one step along the same shortest path as `first_action`.
+    These are the steps of the boustrophedon sweep used for behavior
+    cloning. Returns per-layout arrays: `steps` taken, `covered` (every free
+    cell visited) and `lower_bound` (reachable free cells - 1, the steps of
+    a perfect coverage).
+    """
+    seeds = np.asarray(seeds)
+    results = {
+        "steps": np.zeros(len(seeds), dtype=np.int64),
+        "covered": np.zeros(len(seeds), dtype=bool),
+        "lower_bound": np.zeros(len(seeds), dtype=np.int64),
+    }
+    never = np.iinfo(np.int32).max
+    for start in range(0, len(seeds), batch_size):
+        env, cells, agents, _ = _layouts(make_env, seeds[start:start + batch_size])
+        passable = cells != env.WALL
+        free = cells == env.FREE
+        n = len(agents)
+        reachable = bfs_distances(passable, _location_mask(cells.shape, agents)) >= 0
+        results["lower_bound"][start:start + n] = (reachable & passable).sum(axis=(1, 2)) - 1
+
+        steps = np.zeros(n, dtype=np.int64)
+        active = np.arange(n)
+        while len(active):
+            # Stops once the nearest unvisited cells of every grid are reached
+            distances = bfs_distances(passable[active], _location_mask((len(active), *cells.shape[1:]), agents[active]),
+                                      until=free[active])
+            candidates = np.where(free[active] & (distances > 0), distances, never).reshape(len(active), -1)
+            goals = np.argmin(candidates, axis=1)
+            moving = candidates[np.arange(len(active)), goals] != never
+            if max_steps is not None:
+                moving &= steps[active] < max_steps
+
+            active = active[moving]
+            distances = distances[moving]
+            rows = np.arange(len(active))
+            # Walk back from the goals to the cells next to the agents, taking
+            # the first action (in ACTION_OFFSETS order) one step closer, as first_action does
+            position = np.stack(np.unravel_index(goals[moving], cells.shape[1:]), axis=1)
+            remaining = distances[rows, position[:, 0], position[:, 1]]
+            while (remaining > 1).any():
+                back = remaining > 1
+                previous = position[:, None, :] - ACTION_OFFSETS[None, :, :]
+                previous_distances = distances[rows[:, None], previous[..., 0], previous[..., 1]]
+                choice = np.argmax(previous_distances == (remaining - 1)[:, None], axis=1)
+                position[back] = previous[back, choice[back]]
+                remaining[back] -= 1
+
+            agents[active] = position
+            steps[active] += 1
+            free[active, position[:, 0], position[:, 1]] = False
+
+        results["steps"][start:start + n] = steps
+        results["covered"][start:start + n] = ~free.any(axis=(1, 2))
+    return results
+
+
+def efficiency_ratio(policy_steps, baseline_steps, success) -> np.ndarray:
+    """Policy steps / baseline steps of the successful episodes (NaN for the others)."""
+    policy_steps = np.asarray(policy_steps, dtype=np.float64)
+    baseline_steps = np.asarray(baseline_steps, dtype=np.float64)
+    valid = np.asarray(success, dtype=bool) & (baseline_steps > 0)
+    return np.where(valid, policy_steps / np.where(valid, baseline_steps, 1.0), np.nan)
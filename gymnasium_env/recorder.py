@@ -0,0 +1,292 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+import gymnasium as gym
+
+#
+# Offline trajectory datasets (for offline RL and behavior cloning).
+#
+# `TrajectoryRecorder` is a wrapper that appends every transition
+# (obs, action, reward, terminated, truncated) of the wrapped environment to a
+# dataset directory. The columns are stored in chunks of `chunk_size`
+# transitions, each chunk column being a memory-mapped `.npy` file, so
+# recording tens of millions of transitions never holds more than the
+# current chunk in memory (and only as page cache):
+#
+#   <path>/meta.json                   spaces, dtypes and transitions per chunk
+#   <path>/episodes.npy                (n_episodes, 2) int64: first transition, length
+#   <path>/chunk_00000_obs_<key>.npy   observations (key "obs" for Box spaces)
+#   <path>/chunk_00000_action.npy      actions
+#   <path>/chunk_00000_reward.npy      rewards (float32)
+#   <path>/chunk_00000_flags.npy       bit 0: terminated, bit 1: truncated
+#
+# Columns use the smallest dtype that holds their values: uint8 actions,
+# integer observations narrowed to their bounds, and `obs_dtypes` can narrow
+# float observations that only take integer values (e.g. the "neighbors"
+# matrix of the CPP environment). Recording into an existing dataset appends
+# new chunks to it.
+#
+# `TrajectoryDataset` reads a dataset back, streaming batches chunk by chunk
+# from the memory-mapped files.
+#
+# Usage:
+#
+#   env = TrajectoryRecorder(GridWorldCPPEnv(), "datasets/cpp_random", obs_dtypes={"neighbors": np.uint8})
+#   ... run episodes ...
+#   env.close()
+#
+#   dataset = TrajectoryDataset("datasets/cpp_random")
+#   for batch in dataset.iter_batches(4096, shuffle=True):
+#       batch["obs"]["neighbors"], batch["action"], batch["reward"], ...
+#
+
+TERMINATED, TRUNCATED = 1, 2
+
+
+def _integer_dtype(low, high) -> np.dtype:
+    return np.result_type(np.min_scalar_type(int(np.min(low))), np.min_scalar_type(int(np.max(high))))
+
+
+def _observation_columns(space: gym.Space, obs_dtypes: Optional[dict] = None) -> dict:
+    """Return {key: {"shape", "dtype", "stored_dtype"}} for the observations of `space`."""
+    obs_dtypes = obs_dtypes or {}
+    spaces = dict(space.spaces) if isinstance(space, gym.spaces.Dict) else {"obs": space}
+    columns = {}
+    for key in sorted(spaces):
+        subspace = spaces[key]
+        if isinstance(subspace, gym.spaces.Discrete):
+            shape, dtype = (), np.dtype(np.int64)
+            stored = _integer_dtype(subspace.start, subspace.start + subspace.n - 1)
+        elif isinstance(subspace, gym.spaces.Box):
+            shape, dtype = subspace.shape, subspace.dtype
+            stored = dtype
+            if np.issubdtype(dtype, np.integer) and subspace.is_bounded():
+                stored = _integer_dtype(subspace.low, subspace.high)
+        else:
+            raise TypeError(f"Unsupported observation space for recording: {subspace}")
+        stored = np.dtype(obs_dtypes.get(key, stored))
+        columns[key] = {"shape": list(shape), "dtype": dtype.str, "stored_dtype": stored.str}
+    return columns
+
+
+def _save_atomic(path: str, save):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        save(f)
+    os.replace(tmp_path, path)
+
+
+class TrajectoryWriter:
+    """Append-only writer of a dataset directory (see the module comment)."""
+
+    def __init__(self, path: str, observation_space: gym.Space, action_space: gym.Space,
+                 chunk_size: int = 1_000_000, obs_dtypes: Optional[dict] = None):
+        assert isinstance(action_space, gym.spaces.Discrete), "Only Discrete action spaces are supported"
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            self.episodes = np.load(os.path.join(path, "episodes.npy")).tolist()
+        else:
+            self.meta = {
+                "observations": _observation_columns(observation_space, obs_dtypes),
+                "action_dtype": _integer_dtype(action_space.start, action_space.start + action_space.n - 1).str,
+                "chunk_size": chunk_size,
+                "chunks": [],
+            }
+            self.episodes = []
+
+        self.chunk_size = self.meta["chunk_size"]
+        self.n_transitions = sum(self.meta["chunks"])
+        self._episode_start = self.n_transitions
+        self._columns = None
+        self._count = 0
+
+    def _chunk_file(self, index: int, column: str) -> str:
+        return os.path.join(self.path, f"chunk_{index:05d}_{column}.npy")
+
+    def _column_specs(self):
+        specs = {f"obs_{key}": (tuple(column["shape"]), column["stored_dtype"])
+                 for key, column in self.meta["observations"].items()}
+        specs["action"] = ((), self.meta["action_dtype"])
+        specs["reward"] = ((), "<f4")
+        specs["flags"] = ((), "|u1")
+        return specs
+
+    def _open_chunk(self):
+        index = len(self.meta["chunks"])
+        self.meta["chunks"].append(0)
+        self._columns = {
+            column: np.lib.format.open_memmap(
+                self._chunk_file(index, column), mode="w+", dtype=dtype, shape=(self.chunk_size, *shape)
+            )
+            for column, (shape, dtype) in self._column_specs().items()
+        }
+        self._count = 0
+
+    def _close_chunk(self):
+        index = len(self.meta["chunks"]) - 1
+        for column, array in self._columns.items():
+            array.flush()
+            if self._count < self.chunk_size:
+                # Shrink the last chunk to the transitions actually written
+                trimmed = np.array(array[:self._count])
+                _save_atomic(self._chunk_file(index, column), lambda f: np.save(f, trimmed))
+        self._columns = None
+        self.flush()
+
+    def add(self, observation, action, reward, terminated: bool, truncated: bool):
+        if self._columns is None:
+            self._open_chunk()
+        i = self._count
+        if isinstance(observation, dict):
+            for key in self.meta["observations"]:
+                self._columns[f"obs_{key}"][i] = observation[key]
+        else:
+            self._columns["obs_obs"][i] = observation
+        self._columns["action"][i] = action
+        self._columns["reward"][i] = reward
+        self._columns["flags"][i] = TERMINATED * bool(terminated) | TRUNCATED * bool(truncated)
+
+        self._count += 1
+        self.n_transitions += 1
+        self.meta["chunks"][-1] = self._count
+        if self._count == self.chunk_size:
+            self._close_chunk()
+
+    def end_episode(self, truncated: bool = False):
+        """Close the current episode; `truncated` flags its last transition (e.g. an early reset)."""
+        length = self.n_transitions - self._episode_start
+        if length == 0:
+            return
+        if truncated and self._columns is not None and self._count > 0:
+            self._columns["flags"][self._count - 1] |= TRUNCATED
+        self.episodes.append([self._episode_start, length])
+        self._episode_start = self.n_transitions
+
+    def flush(self):
+        """Write the episode index and metadata (the chunks are flushed by the OS)."""
+        episodes = np.array(self.episodes, dtype=np.int64).reshape(-1, 2)
+        _save_atomic(os.path.join(self.path, "episodes.npy"), lambda f: np.save(f, episodes))
+        _save_atomic(os.path.join(self.path, "meta.json"), lambda f: f.write(json.dumps(self.meta, indent=2).encode()))
+
+    def close(self):
+        self.end_episode(truncated=True)
+        if self._columns is not None:
+            self._close_chunk()
+        else:
+            self.flush()
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """Records every transition of the wrapped environment with a `TrajectoryWriter`."""
+
+    def __init__(self, env: gym.Env, path: str, chunk_size: int = 1_000_000, obs_dtypes: Optional[dict] = None):
+        super().__init__(env)
+        self.writer = TrajectoryWriter(path, env.observation_space, env.action_space, chunk_size, obs_dtypes)
+        self._observation = None
+        self._done = True
+
+    def reset(self, **kwargs):
+        if not self._done:
+            self.writer.end_episode(truncated=True)
+        self._observation, info = self.env.reset(**kwargs)
+        self._done = False
+        return self._observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.writer.add(self._observation, action, reward, terminated, truncated)
+        self._observation = observation
+        if terminated or truncated:
+            self.writer.end_episode()
+            self._done = True
+        return observation, reward, terminated, truncated, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
+
+
+class TrajectoryDataset:
+    """Read-only view of a dataset directory written by `TrajectoryWriter`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.episodes = np.load(os.path.join(path, "episodes.npy"))
+        self.chunk_sizes = np.array(self.meta["chunks"], dtype=np.int64)
+        self.chunk_starts = np.concatenate([[0], np.cumsum(self.chunk_sizes)])
+        self.observation_keys = list(self.meta["observations"])
+        self._chunks = {}
+
+    def __len__(self) -> int:
+        return int(self.chunk_starts[-1])
+
+    def chunk(self, index: int) -> dict:
+        """Memory-mapped columns of chunk `index` (nothing is read until indexed)."""
+        if index not in self._chunks:
+            columns = [f"obs_{key}" for key in self.observation_keys] + ["action", "reward", "flags"]
+            self._chunks[index] = {
+                column: np.load(os.path.join(self.path, f"chunk_{index:05d}_{column}.npy"), mmap_mode="r")
+                for column in columns
+            }
+        return self._chunks[index]
+
+    def _batch(self, columns: dict, rows) -> dict:
+        obs = {
+            key: np.asarray(columns[f"obs_{key}"][rows], dtype=self.meta["observations"][key]["dtype"])
+            for key in self.observation_keys
+        }
+        flags = np.asarray(columns["flags"][rows])
+        return {
+            "obs": obs["obs"] if self.observation_keys == ["obs"] else obs,
+            "action": np.asarray(columns["action"][rows], dtype=np.int64),
+            "reward": np.asarray(columns["reward"][rows]),
+            "terminated": (flags & TERMINATED).astype(bool),
+            "truncated": (flags & TRUNCATED).astype(bool),
+        }
+
+    def iter_batches(self, batch_size: int, shuffle: bool = False, seed: Optional[int] = None):
+        """Yield batches of transitions, reading one chunk at a time.
+
+        With `shuffle`, the chunks are visited in random order and the
+        transitions are shuffled within each chunk.
+        """
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.chunk_sizes)) if shuffle else range(len(self.chunk_sizes))
+        for index in order:
+            size = int(self.chunk_sizes[index])
+            columns = self.chunk(int(index))
+            if shuffle:
+                rows = rng.permutation(size)
+                for start in range(0, size, batch_size):
+                    # Sorted indices keep the reads of a batch sequential in the file
+                    yield self._batch(columns, np.sort(rows[start:start + batch_size]))
+            else:
+                for start in range(0, size, batch_size):
+                    yield self._batch(columns, slice(start, min(start + batch_size, size)))
+
+    def episode(self, index: int) -> dict:
+        """All the transitions of episode `index` (which may span two chunks)."""
+        start, length = self.episodes[index]
+        parts = []
+        chunk = int(np.searchsorted(self.chunk_starts, start, side="right") - 1)
+        while length > 0:
+            offset = start - self.chunk_starts[chunk]
+            n = min(length, self.chunk_sizes[chunk] - offset)
+            parts.append(self._batch(self.chunk(chunk), slice(int(offset), int(offset + n))))
+            start, length, chunk = start + n, length - n, chunk + 1
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            key: ({k: np.concatenate([p[key][k] for p in parts]) for k in parts[0][key]}
+                  if isinstance(parts[0][key], dict) else np.concatenate([p[key] for p in parts]))
+            for key in parts[0]
+        }
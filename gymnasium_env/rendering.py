@@ -0,0 +1,214 @@
+import multiprocessing
+import queue
+import time
+from typing import Optional
+
+import numpy as np
+import pygame
+
+#
+# Drawing and asynchronous display of the pygame grid environments.
+#
+# The environments describe what is on screen with a small "render state"
+# (see `_render_state` in grid_world_render.py, grid_world_obstacles.py and
+# grid_world_cpp.py):
+#
+#   size      grid size
+#   agent     agent (x, y)
+#   agents    (n, 2) array of the agents (x, y) of a multi-agent env, drawn
+#             instead of `agent` (which the viewport follows), optional
+#   target    target (x, y), optional
+#   cells     (size, size) array of cell values indexed by [x, y], optional:
+#             1 = obstacle, 2 = visited
+#   text      status line drawn at the top left, optional
+#   viewport  width in cells of the view, which follows the agent on large
+#             maps, optional (the whole grid by default)
+#
+# `draw_grid` turns a render state into a pygame Surface. The obstacle and
+# visited cells are blitted as one scaled array surface and the gridlines are
+# left out once the cells get narrower than GRIDLINE_MIN_CELL_PIXELS, so large
+# grids cost about as much to draw as small ones. It is used by the
+# "human" and "rgb_array" modes, and by `AsyncRenderer`, which implements the
+# "human_async" mode: the environment sends render states to a viewer running
+# in a separate process through a queue that holds a single frame, so
+# stepping never waits for the display. States are sent at most `fps` times
+# per second and a frame that was not displayed yet is replaced by the newer
+# one, so the viewer always shows the latest state.
+#
+
+WALL, VISITED = 1, 2
+
+# Colors of the free, obstacle and visited cells, indexed by cell value
+CELL_COLORS = np.array([(255, 255, 255), (0, 0, 0), (144, 238, 144)], dtype=np.uint8)
+
+# Gridlines are only drawn when the cells are at least this many pixels wide
+GRIDLINE_MIN_CELL_PIXELS = 8
+
+_font = None
+
+
+def _viewport_origin(state: dict, viewport: int) -> np.ndarray:
+    """Top-left cell of the `viewport` x `viewport` window centered on the agent, inside the grid."""
+    return np.clip(np.asarray(state["agent"]) - viewport // 2, 0, state["size"] - viewport)
+
+
+def draw_grid(state: dict, window_size: int) -> pygame.Surface:
+    global _font
+    canvas = pygame.Surface((window_size, window_size))
+    canvas.fill((255, 255, 255))
+    size = state["size"]
+    cells = state.get("cells")
+
+    # With a viewport, only the cells around the agent are drawn
+    origin = np.zeros(2, dtype=int)
+    viewport = state.get("viewport")
+    if viewport is not None and viewport < size:
+        origin = _viewport_origin(state, viewport)
+        size = viewport
+        if cells is not None:
+            cells = cells[origin[0]:origin[0] + size, origin[1]:origin[1] + size]
+    pix_square_size = window_size / size  # The size of a single grid square in pixels
+
+    # Obstacles in black and visited cells in light green, drawn as one array of
+    # cell colors scaled to the window (a single blit, whatever the grid size)
+    if cells is not None and cells.any():
+        layer = pygame.surfarray.make_surface(CELL_COLORS[cells])
+        canvas.blit(pygame.transform.scale(layer, (window_size, window_size)), (0, 0))
+
+    # Target as a red square, at least 3 pixels wide on large grids
+    target = state.get("target")
+    if target is not None:
+        target = np.asarray(target) - origin
+        if ((target >= 0) & (target < size)).all():
+            pygame.draw.rect(
+                canvas,
+                (255, 0, 0),
+                pygame.Rect(pix_square_size * target, (max(pix_square_size, 3), max(pix_square_size, 3))),
+            )
+
+    # Agents as blue circles, at least 2 pixels wide on large grids
+    agents = state.get("agents")
+    for agent in ([state["agent"]] if agents is None else agents):
+        pygame.draw.circle(
+            canvas,
+            (0, 0, 255),
+            (np.asarray(agent) - origin + 0.5) * pix_square_size,
+            max(pix_square_size / 3, 2),
+        )
+
+    if state.get("text"):
+        if _font is None:
+            pygame.font.init()
+            _font = pygame.font.SysFont(None, 24)
+        canvas.blit(_font.render(state["text"], True, (0, 0, 0)), (5, 5))
+
+    # Finally, add some gridlines (they would cover the whole canvas on large grids)
+    if pix_square_size >= GRIDLINE_MIN_CELL_PIXELS:
+        for x in range(size + 1):
+            pygame.draw.line(canvas, 0, (0, pix_square_size * x), (window_size, pix_square_size * x), width=3)
+            pygame.draw.line(canvas, 0, (pix_square_size * x, 0), (pix_square_size * x, window_size), width=3)
+
+    return canvas
+
+
+def surface_to_array(canvas: pygame.Surface) -> np.ndarray:
+    """(height, width, 3) uint8 copy of the pixels of `canvas`."""
+    return np.transpose(np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2))
+
+
+class PygameViewer:
+    """Window showing render states with `draw_grid`; runs inside the `AsyncRenderer` process."""
+
+    def __init__(self, window_size: int = 512, title: str = "gymnasium_env"):
+        self.window_size = window_size
+        self.title = title
+        self.window = None
+
+    def open(self):
+        pygame.init()
+        pygame.display.init()
+        pygame.display.set_caption(self.title)
+        self.window = pygame.display.set_mode((self.window_size, self.window_size))
+
+    def poll(self) -> bool:
+        """Process the window events; False once the window was closed."""
+        return not any(event.type == pygame.QUIT for event in pygame.event.get())
+
+    def show(self, state: dict) -> bool:
+        canvas = draw_grid(state, self.window_size)
+        self.window.blit(canvas, canvas.get_rect())
+        pygame.display.update()
+        return self.poll()
+
+    def close(self):
+        pygame.display.quit()
+        pygame.quit()
+
+
+def _viewer_loop(viewer, frames):
+    viewer.open()
+    while True:
+        try:
+            state = frames.get(timeout=0.1)
+        except queue.Empty:
+            # Keep the window responsive while no frames arrive
+            if not viewer.poll():
+                break
+            continue
+        if state is None or not viewer.show(state):
+            break
+    viewer.close()
+
+
+class AsyncRenderer:
+    """Shows render states in a viewer process without blocking the caller.
+
+    `viewer` must be picklable and provide open(), poll(), show(state) and
+    close() (e.g. `PygameViewer`); it is opened in the new process.
+    """
+
+    def __init__(self, viewer, fps: float = 30):
+        # fork does not re-import the main script, so scripts without an
+        # `if __name__ == "__main__"` guard (like the run_*.py ones) work
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        self._frames = context.Queue(maxsize=1)
+        self._process = context.Process(target=_viewer_loop, args=(viewer, self._frames), daemon=True)
+        self._process.start()
+        self.interval = 1.0 / fps
+        self._next_frame = 0.0
+
+    def due(self) -> bool:
+        """True when a new frame should be sent (at most `fps` per second, while the viewer is open)."""
+        now = time.perf_counter()
+        if now < self._next_frame:
+            return False
+        self._next_frame = now + self.interval
+        return self._process.is_alive()
+
+    def submit(self, state: dict):
+        try:
+            self._frames.put_nowait(state)
+        except queue.Full:
+            # The viewer has not taken the previous frame yet: replace it
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._frames.put_nowait(state)
+            except queue.Full:
+                pass
+
+    def close(self, state: Optional[dict] = None):
+        """Show `state` (e.g. the final one), then close the viewer."""
+        if self._process.is_alive():
+            if state is not None:
+                self.submit(state)
+            try:
+                self._frames.put(None, timeout=1.0)
+            except queue.Full:
+                pass
+            self._process.join(timeout=5.0)
+        if self._process.is_alive():
+            self._process.terminate()
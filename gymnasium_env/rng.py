@@ -0,0 +1,140 @@
+import numpy as np
+
+#
+# Pre-drawn random numbers for the environment resets.
+#
+# Placing the agent, the target and the obstacles used to call
+# `self.np_random.integers(...)` once per location (plus retries in a
+# `while` loop), paying the numpy Generator dispatch overhead for every
+# single draw. `RandomBuffer` draws uniform numbers in blocks of
+# `block_size` from the environment's generator and serves the resets from
+# that block, so most resets do not call into the Generator at all.
+#
+# The buffer is rebound automatically when the environment is reseeded
+# (`reset(seed=...)` creates a new Generator), so seeded resets stay
+# reproducible. Its position can be saved and restored exactly with
+# `get_state`/`set_state`, which store the generator state at the start of
+# the current block and the position inside it.
+#
+# `sample_layouts` is the batched counterpart: it draws, in one call, the
+# cells that `reset(seed=s)` would place for each of many seeds, so that a
+# caller running many environments (the batched evaluation, the planner
+# baselines) can pass them to `reset` in options["layout"] instead of
+# reseeding every environment. `check_layout` validates those cells.
+#
+
+
+class RandomBuffer:
+
+    def __init__(self, block_size: int = 4096):
+        self.block_size = block_size
+        self._generator = None
+        self._block = np.empty(0)
+        self._block_state = None
+        self._pos = 0
+
+    def bind(self, generator: np.random.Generator):
+        """Use `generator` from now on; buffered values of a previous generator are dropped."""
+        if generator is not self._generator:
+            self._generator = generator
+            self._block = np.empty(0)
+            self._block_state = None
+            self._pos = 0
+
+    def _refill(self):
+        self._block_state = self._generator.bit_generator.state
+        self._block = self._generator.random(self.block_size)
+        self._pos = 0
+
+    def random(self, n: int) -> np.ndarray:
+        """Return `n` floats uniformly distributed in [0, 1)."""
+        if n > self.block_size:
+            return self._generator.random(n)
+        if self._pos + n > len(self._block):
+            self._refill()
+        values = self._block[self._pos:self._pos + n]
+        self._pos += n
+        return values
+
+    def integers(self, high: int, n: int) -> np.ndarray:
+        """Return `n` integers uniformly distributed in [0, high)."""
+        return (self.random(n) * high).astype(np.int64)
+
+    def sample_distinct(self, n_cells: int, k: int) -> np.ndarray:
+        """Return `k` distinct cell indices in [0, n_cells), in random order.
+
+        Equivalent to drawing cells one by one and redrawing repeated ones,
+        which is how the environments used to place their objects.
+        """
+        if k > n_cells:
+            raise ValueError(f"Cannot place {k} objects in {n_cells} cells")
+        chosen = np.empty(0, dtype=np.int64)
+        while len(chosen) < k:
+            candidates = np.concatenate([chosen, self.integers(n_cells, 2 * (k - len(chosen)) + 4)])
+            # Keep the first occurrence of every cell, in drawing order
+            _, first = np.unique(candidates, return_index=True)
+            chosen = candidates[np.sort(first)][:k]
+        return chosen
+
+    def get_state(self):
+        """Return (generator state at the start of the current block, position in the block)."""
+        if self._block_state is None:
+            return self._generator.bit_generator.state, -1
+        return self._block_state, self._pos
+
+    def set_state(self, generator: np.random.Generator, state):
+        """Restore a state returned by `get_state`, using `generator` from now on."""
+        block_state, pos = state
+        self.bind(generator)
+        generator.bit_generator.state = block_state
+        if pos < 0:
+            self._block = np.empty(0)
+            self._block_state = None
+            self._pos = 0
+        else:
+            self._refill()
+            self._pos = pos
+
+
+def check_layout(layout, n_cells: int, k: int) -> np.ndarray:
+    """`layout` as an array of cell indices, asserting that it holds `k` distinct cells in [0, n_cells)."""
+    cells = np.asarray(layout, dtype=np.int64).reshape(-1)
+    assert len(cells) == k, f"The layout must have {k} cells, got {len(cells)}"
+    assert ((cells >= 0) & (cells < n_cells)).all(), f"The layout cells must be in [0, {n_cells})"
+    assert len(np.unique(cells)) == k, "The layout cells must be distinct"
+    return cells
+
+
+def sample_layouts(seeds, n_cells: int, k: int) -> np.ndarray:
+    """The `k` distinct cells in [0, n_cells) that `sample_distinct` draws after `reset(seed=s)`, for each seed.
+
+    Returns a (len(seeds), k) array of cell indices. Row `i` is drawn from
+    its own `np.random.default_rng(seeds[i])` (the generator `reset(seed=...)`
+    creates), and the repeated cells of all the rows are removed at once.
+    """
+    if k > n_cells:
+        raise ValueError(f"Cannot place {k} objects in {n_cells} cells")
+    seeds = np.asarray(seeds, dtype=np.int64).reshape(-1)
+    # The first draw of sample_distinct; a block of the buffer starts with the same values
+    width = 2 * k + 4
+    draws = np.empty((len(seeds), width))
+    for i, seed in enumerate(seeds):
+        draws[i] = np.random.default_rng(int(seed)).random(width)
+    candidates = (draws * n_cells).astype(np.int64)
+
+    # Keep the first occurrence of every cell of each row, in drawing order
+    order = np.argsort(candidates, axis=1, kind="stable")
+    ranked = np.take_along_axis(candidates, order, axis=1)
+    first_ranked = np.ones(ranked.shape, dtype=bool)
+    first_ranked[:, 1:] = ranked[:, 1:] != ranked[:, :-1]
+    first = np.empty_like(first_ranked)
+    np.put_along_axis(first, order, first_ranked, axis=1)
+    positions = np.argsort(~first, axis=1, kind="stable")[:, :k]
+    layouts = np.take_along_axis(candidates, positions, axis=1)
+
+    # Rows with fewer than k distinct cells draw again, as sample_distinct does
+    for i in np.flatnonzero(first.sum(axis=1) < k):
+        buffer = RandomBuffer()
+        buffer.bind(np.random.default_rng(int(seeds[i])))
+        layouts[i] = buffer.sample_distinct(n_cells, k)
+    return layouts
@@ -0,0 +1,193 @@
+import os
+import queue
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import gymnasium as gym
+
+from gymnasium_env.rendering import draw_grid, surface_to_array
+
+#
+# Background recording of episode videos for the pygame grid environments
+# (grid_world_render.py, grid_world_obstacles.py and grid_world_cpp.py).
+#
+# Instead of collecting rendered frames, `EpisodeVideoRecorder` keeps the
+# render state of each step (see gymnasium_env/rendering.py) in a compact
+# form: the grid cells are stored once at reset and then only as the cells
+# that changed (e.g. the newly visited cell of the CPP env), next to the
+# agent position and status text. When an episode ends, this log is handed
+# to a worker thread that replays it, draws the frames with `draw_grid` and
+# encodes them one at a time:
+#
+#   <path>/<name_prefix>_00000.gif   animated GIF (needs Pillow)
+#   <path>/<name_prefix>_00000.npy   raw (frames, height, width, 3) uint8 video,
+#                                    written frame by frame to a memory-mapped file
+#
+# At most `max_pending` finished episodes wait for the worker; when it falls
+# behind, the end of the next episode waits for it, so memory stays bounded
+# however many episodes are recorded.
+#
+# Usage:
+#
+#   env = EpisodeVideoRecorder(GridWorldCPPEnv(), "videos/cpp_ppo")
+#   ... run episodes ...
+#   env.close()  # waits for the pending videos
+#
+
+FORMATS = ("gif", "npy")
+
+# Colors drawn by `draw_grid` (white, black, visited, target, agent), and the
+# blends of the black text over the white and visited backgrounds
+_BASE_COLORS = [(255, 255, 255), (0, 0, 0), (144, 238, 144), (255, 0, 0), (0, 0, 255)]
+_PALETTE = _BASE_COLORS + [
+    tuple(round(c * level / 32) for c in background)
+    for background in [(255, 255, 255), (144, 238, 144)] for level in range(1, 32)
+]
+
+
+def _palette_image():
+    from PIL import Image
+
+    image = Image.new("P", (1, 1))
+    colors = [c for color in _PALETTE for c in color]
+    image.putpalette(colors + [0] * (768 - len(colors)))
+    return image
+
+
+class _EpisodeLog:
+    """Render states of one episode: the first one in full, then the cells that changed."""
+
+    def __init__(self, state: dict):
+        self.first = state
+        self.steps = []
+        self._cells = state.get("cells")
+
+    def add(self, state: dict):
+        state = dict(state)
+        cells = state.pop("cells", None)
+        if cells is not None:
+            changed = np.flatnonzero(cells != self._cells)
+            state["changed"] = (changed.astype(np.int32), cells.flat[changed])
+            self._cells = cells
+        self.steps.append(state)
+
+    def __len__(self) -> int:
+        return len(self.steps) + 1
+
+    def states(self):
+        """Replay the full render states of the episode."""
+        cells = self.first.get("cells")
+        if cells is not None:
+            cells = cells.copy()
+        yield self.first
+        for step in self.steps:
+            state = dict(step)
+            changed = state.pop("changed", None)
+            if changed is not None:
+                cells.flat[changed[0]] = changed[1]
+                state["cells"] = cells
+            yield state
+
+
+class EpisodeVideoRecorder(gym.Wrapper):
+    """Records the episodes of the wrapped environment as videos, encoded on a worker thread."""
+
+    def __init__(self, env: gym.Env, path: str, video_format: str = "gif", fps: Optional[float] = None,
+                 window_size: int = 256, episode_trigger: Optional[Callable[[int], bool]] = None,
+                 max_pending: int = 4, name_prefix: str = "episode"):
+        super().__init__(env)
+        assert video_format in FORMATS, f"video_format must be one of {FORMATS}"
+        assert hasattr(env.unwrapped, "_render_state"), "Only the pygame grid environments can be recorded"
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.video_format = video_format
+        self.fps = fps or env.metadata.get("render_fps", 4)
+        self.window_size = window_size
+        self.episode_trigger = episode_trigger
+        self.name_prefix = name_prefix
+
+        self.episode_id = -1
+        self._log = None
+        self._error = None
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._worker = threading.Thread(target=self._encode_loop, daemon=True)
+        self._worker.start()
+
+    def reset(self, **kwargs):
+        if self._error is not None:
+            raise self._error
+        self._end_episode()
+        observation, info = self.env.reset(**kwargs)
+        self.episode_id += 1
+        if self.episode_trigger is None or self.episode_trigger(self.episode_id):
+            self._log = _EpisodeLog(self.env.unwrapped._render_state())
+        return observation, info
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        if self._log is not None:
+            self._log.add(self.env.unwrapped._render_state())
+            if terminated or truncated:
+                self._end_episode()
+        return observation, reward, terminated, truncated, info
+
+    def _end_episode(self):
+        if self._log is not None:
+            # Blocks while `max_pending` episodes are waiting for the worker
+            self._pending.put((self.episode_id, self._log))
+            self._log = None
+
+    def _video_file(self, episode_id: int) -> str:
+        return os.path.join(self.path, f"{self.name_prefix}_{episode_id:05d}.{self.video_format}")
+
+    def _frames(self, log: _EpisodeLog):
+        for state in log.states():
+            yield surface_to_array(draw_grid(state, self.window_size))
+
+    def _encode_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            episode_id, log = item
+            try:
+                if self.video_format == "gif":
+                    self._write_gif(self._video_file(episode_id), log)
+                else:
+                    self._write_npy(self._video_file(episode_id), log)
+            except Exception as error:
+                self._error = error
+
+    def _write_gif(self, filename: str, log: _EpisodeLog):
+        from PIL import Image
+
+        # Mapping the frames to the fixed palette of the grid colors is much
+        # faster than an adaptive palette, and palette images take a third of
+        # the memory of the RGB frames
+        palette = _palette_image()
+        frames = [
+            Image.fromarray(frame).quantize(palette=palette, dither=Image.Dither.NONE)
+            for frame in self._frames(log)
+        ]
+        frames[0].save(filename, save_all=True, append_images=frames[1:], duration=1000 / self.fps, loop=0,
+                       optimize=False)  # the palette is already minimal, skip Pillow's per-frame remapping
+
+    def _write_npy(self, filename: str, log: _EpisodeLog):
+        video = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=np.uint8, shape=(len(log), self.window_size, self.window_size, 3)
+        )
+        for i, frame in enumerate(self._frames(log)):
+            video[i] = frame
+        video.flush()
+        del video
+
+    def close(self):
+        """Encode the current and pending episodes, then close the environment."""
+        if self._worker.is_alive():
+            self._end_episode()
+            self._pending.put(None)
+            self._worker.join()
+        super().close()
+        if self._error is not None:
+            raise self._error
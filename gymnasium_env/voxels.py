@@ -0,0 +1,116 @@
+from typing import Optional
+
+import numpy as np
+
+#
+# Sparse occupancy volume for the obstacles of the 3D grid world.
+#
+# A dense boolean volume of a 1000x1000x1000 grid takes 1 GB (125 MB
+# bit-packed), even when it holds a few thousand obstacles. `VoxelGrid`
+# splits the volume into chunks of `chunk`^3 voxels and only stores the
+# chunks that contain obstacles, each one as a row of `chunk`^3 / 8 bytes
+# (one bit per voxel) in a single 2D array. A dict maps the chunk index to
+# its row, so looking up a voxel is a dict lookup and a bit test, and the
+# memory grows with the number of occupied chunks, not with size^3 (at worst,
+# with obstacles in every chunk, it is the size^3 / 8 bytes of a bit-packed
+# volume).
+#
+# Voxels outside the grid are reported as occupied, like the padded border
+# of walls of the 2D environments.
+#
+# Usage:
+#
+#   voxels = VoxelGrid.from_points(1000, obstacles)  # (n, 3) array of x, y, z
+#   voxels.occupied(x, y, z)                         # one voxel
+#   voxels.occupied_points(points)                   # (n,) bool for (n, 3) points
+#
+
+# Offsets (dx, dy, dz) of the 6 face neighbors, in the order of the actions of
+# the 3D environment: right, up, left, down, forward, backward
+NEIGHBOR_OFFSETS = np.array([[1, 0, 0], [0, 1, 0], [-1, 0, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]])
+_OFFSETS = [tuple(offset) for offset in NEIGHBOR_OFFSETS.tolist()]
+
+
+class VoxelGrid:
+
+    def __init__(self, size: int, chunk: int = 16):
+        assert chunk ** 3 % 8 == 0, "chunk^3 must be a multiple of 8"
+        self.size = size
+        self.chunk = chunk
+        self.chunks_per_axis = -(-size // chunk)
+        self.count = 0
+        self._rows = {}
+        self._bits = np.zeros((0, chunk ** 3 // 8), dtype=np.uint8)
+
+    @classmethod
+    def from_points(cls, size: int, points: np.ndarray, chunk: int = 16) -> "VoxelGrid":
+        """Volume whose occupied voxels are the distinct `points` ((n, 3) array of x, y, z)."""
+        voxels = cls(size, chunk)
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 3)
+        if len(points):
+            keys, byte, bit = voxels._split(points)
+            chunks, rows = np.unique(keys, return_inverse=True)
+            voxels._bits = np.zeros((len(chunks), voxels._bits.shape[1]), dtype=np.uint8)
+            np.bitwise_or.at(voxels._bits, (rows, byte), bit)
+            voxels._rows = dict(zip(chunks.tolist(), range(len(chunks))))
+            # Distinct points, counted on the points rather than on the bits (no
+            # temporary array the size of the volume)
+            voxels.count = len(np.unique((points[:, 0] * size + points[:, 1]) * size + points[:, 2]))
+        return voxels
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the bit-packed chunks."""
+        return self._bits.nbytes
+
+    def _split(self, points: np.ndarray):
+        """Chunk key, byte in the chunk row and bit mask of each point."""
+        c, n = self.chunk, self.chunks_per_axis
+        chunk_index = points // c
+        keys = (chunk_index[:, 0] * n + chunk_index[:, 1]) * n + chunk_index[:, 2]
+        local = points % c
+        offset = (local[:, 0] * c + local[:, 1]) * c + local[:, 2]
+        return keys, offset >> 3, (1 << (offset & 7)).astype(np.uint8)
+
+    def occupied(self, x: int, y: int, z: int) -> bool:
+        """True if voxel (x, y, z) holds an obstacle or is outside the grid."""
+        size, c = self.size, self.chunk
+        if not (0 <= x < size and 0 <= y < size and 0 <= z < size):
+            return True
+        n = self.chunks_per_axis
+        row = self._rows.get(((x // c) * n + y // c) * n + z // c)
+        if row is None:
+            return False
+        offset = ((x % c) * c + y % c) * c + z % c
+        return bool(self._bits[row, offset >> 3] >> (offset & 7) & 1)
+
+    def occupied_points(self, points: np.ndarray) -> np.ndarray:
+        """Vectorized `occupied` for an (n, 3) array of points."""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 3)
+        inside = ((points >= 0) & (points < self.size)).all(axis=1)
+        result = ~inside
+        keys, byte, bit = self._split(points[inside])
+        rows = np.array([self._rows.get(key, -1) for key in keys.tolist()], dtype=np.int64)
+        stored = rows >= 0
+        hits = np.zeros(len(rows), dtype=bool)
+        hits[stored] = (self._bits[rows[stored], byte[stored]] & bit[stored]) != 0
+        result[inside] = hits
+        return result
+
+    def neighbors(self, location, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Occupancy (0/1) of the 6 face neighbors of `location`, in NEIGHBOR_OFFSETS order."""
+        if out is None:
+            out = np.zeros(6, dtype=np.uint8)
+        x, y, z = (int(v) for v in location)
+        for i, (dx, dy, dz) in enumerate(_OFFSETS):
+            out[i] = self.occupied(x + dx, y + dy, z + dz)
+        return out
+
+    def points(self) -> np.ndarray:
+        """(count, 3) array of the occupied voxels."""
+        c, n = self.chunk, self.chunks_per_axis
+        chunks = np.array(sorted(self._rows, key=self._rows.get), dtype=np.int64)
+        rows, offsets = np.nonzero(np.unpackbits(self._bits, axis=1, bitorder="little"))
+        chunk_index = np.stack([chunks // (n * n), chunks // n % n, chunks % n], axis=1)[rows]
+        local = np.stack([offsets // (c * c), offsets // c % c, offsets % c], axis=1)
+        return chunk_index * c + local
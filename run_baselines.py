@@ -0,0 +1,57 @@
+#
+# python run_baselines.py cpp dim obstacles max_steps [layouts]
+# python run_baselines.py obstacles dim obstacles max_steps [layouts]
+#
+# Runs the classical baselines of gymnasium_env/planners.py on `layouts`
+# seeded layouts (reset(seed=0), reset(seed=1), ...) at once:
+#   cpp        nearest-unvisited-cell coverage planner, ties broken by the lowest
+#              (x, y): the boustrophedon expert of the --bc warm start
+#   obstacles  BFS shortest path from the agent to the target
+#
+# The test modes of train_grid_world_cpp.py and train_grid_world_obstacles.py
+# compare the learned policies with these baselines on the same layouts.
+#
+
+import sys
+import time
+import numpy as np
+from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
+from gymnasium_env.grid_world_obstacles import GridWorldRenderEnv
+from gymnasium_env.planners import coverage_baseline, shortest_path_baseline
+
+if len(sys.argv) not in [5, 6] or sys.argv[1] not in ['cpp', 'obstacles']:
+    print("Usage: python run_baselines.py <cpp|obstacles> dim obstacles max_steps [layouts]")
+    sys.exit(1)
+
+env_name = sys.argv[1]
+DIM = int(sys.argv[2])
+OBSTACLES = int(sys.argv[3])
+MAX_STEPS = int(sys.argv[4])
+LAYOUTS = int(sys.argv[5]) if len(sys.argv) > 5 else 1000
+
+seeds = np.arange(LAYOUTS)
+start = time.perf_counter()
+
+if env_name == 'cpp':
+    results = coverage_baseline(
+        lambda: GridWorldCPPEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS), seeds, max_steps=MAX_STEPS
+    )
+    elapsed = time.perf_counter() - start
+    steps = results["steps"]
+    covered = results["covered"]
+    print(f"--- Coverage planner on {LAYOUTS} layouts ({elapsed:.1f}s) ---")
+    print(f"Full Coverage Rate: {covered.mean()*100:.2f}%")
+    print(f"Average Steps: {steps.mean():.1f} Standard Deviation: {steps.std():.1f} Min Steps: {steps.min()} Max Steps: {steps.max()}")
+    if covered.any():
+        overhead = steps[covered] / np.maximum(results["lower_bound"][covered], 1)
+        print(f"Steps / lower bound (free cells - 1), fully covered layouts: Mean: {overhead.mean():.3f} Max: {overhead.max():.3f}")
+else:
+    steps = shortest_path_baseline(
+        lambda: GridWorldRenderEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS), seeds
+    )
+    elapsed = time.perf_counter() - start
+    reachable = steps >= 0
+    print(f"--- BFS shortest path on {LAYOUTS} layouts ({elapsed:.1f}s) ---")
+    print(f"Reachable Targets: {reachable.mean()*100:.2f}%")
+    print(f"Average Steps: {steps[reachable].mean():.1f} Standard Deviation: {steps[reachable].std():.1f} "
+          f"Min Steps: {steps[reachable].min()} Max Steps: {steps[reachable].max()}")
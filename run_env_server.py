@@ -0,0 +1,51 @@
+#
+# python run_env_server.py cpp dim obstacles max_steps [address]
+# python run_env_server.py obstacles dim obstacles max_steps [address]
+# python run_env_server.py 3d dim obstacles max_steps [address]
+#
+# Serves environments to remote learners (see gymnasium_env/env_server.py).
+# `address` is "host:port" (default 127.0.0.1:5555) or "unix:/path". Each
+# client connection gets its own pool of environments, e.g. for 8 CPP
+# environments on each of two servers:
+#
+#   python run_env_server.py cpp 5 3 200 0.0.0.0:5555    # on each simulation host
+#
+#   from stable_baselines3.common.vec_env import VecMonitor
+#   from gymnasium_env.env_server import RemoteVecEnv
+#   env = VecMonitor(RemoteVecEnv(["host1:5555", "host2:5555"], n_envs=8, info_keys=["coverage"]))
+#
+# VecMonitor records the episode returns and lengths (rollout/ep_rew_mean),
+# which the servers do not send.
+#
+# The protocol pickles the spaces and attribute calls: only listen on trusted networks.
+#
+
+import sys
+from gymnasium_env.env_server import EnvServer
+
+if len(sys.argv) not in [5, 6] or sys.argv[1] not in ['cpp', 'obstacles', '3d']:
+    print("Usage: python run_env_server.py <cpp|obstacles|3d> dim obstacles max_steps [address]")
+    sys.exit(1)
+
+env_name = sys.argv[1]
+DIM = int(sys.argv[2])
+OBSTACLES = int(sys.argv[3])
+MAX_STEPS = int(sys.argv[4])
+ADDRESS = sys.argv[5] if len(sys.argv) > 5 else "127.0.0.1:5555"
+
+if env_name == 'cpp':
+    from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
+    make_env = lambda: GridWorldCPPEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS)
+elif env_name == 'obstacles':
+    from gymnasium_env.grid_world_obstacles import GridWorldRenderEnv
+    make_env = lambda: GridWorldRenderEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS)
+else:
+    from gymnasium_env.grid_world_3D import GridWorldEnv
+    make_env = lambda: GridWorldEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS)
+
+server = EnvServer(make_env, ADDRESS)
+print(f"Serving {env_name} environments on {ADDRESS}")
+try:
+    server.run()
+except KeyboardInterrupt:
+    pass
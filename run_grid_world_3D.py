@@ -1,13 +1,10 @@
 import gymnasium as gym
-from gymnasium_env.grid_world_3D import GridWorldEnv
+from gymnasium_env import register_envs
 from gymnasium.wrappers import FlattenObservation
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldEnv,
-)
+register_envs()
 
-env = gym.make("gymnasium_env/GridWorld-v0", size=5)
+env = gym.make("gymnasium_env/GridWorld3D-v0", size=5)
 
 # usando o wrapper
 env = FlattenObservation(env)
@@ -1,5 +1,15 @@
+#
+# python run_grid_world_cpp.py [dataset_dir]
+#
+# Runs a few episodes of random actions. With `dataset_dir`, the transitions
+# are recorded there for offline RL (see gymnasium_env/recorder.py).
+#
+
+import sys
+import numpy as np
 import gymnasium as gym
-from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
+from gymnasium_env import register_envs
+from gymnasium_env.recorder import TrajectoryRecorder
 
 def get_direction(action):
     return {
@@ -9,10 +19,7 @@ def get_direction(action):
         3: "down"
     }.get(action, "unknown")
 
-gym.register(
-    id="gymnasium_env/GridWorldCPP-v0",
-    entry_point=GridWorldCPPEnv,
-)
+register_envs()
 
 # Small 5x5 grid with 3 obstacles for easy visualization
 env = gym.make(
@@ -22,6 +29,9 @@ env = gym.make(
     obs_quantity=3,
     max_steps=100,
 )
+if len(sys.argv) > 1:
+    # "neighbors" only holds the cell values 0, 1 and 2
+    env = TrajectoryRecorder(env, sys.argv[1], obs_dtypes={"neighbors": np.uint8})
 
 NUM_EPISODES = 3
 
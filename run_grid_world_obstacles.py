@@ -1,5 +1,5 @@
 import gymnasium as gym
-from gymnasium_env.grid_world_obstacles import GridWorldRenderEnv
+from gymnasium_env import register_envs
 from gymnasium.wrappers import FlattenObservation
 from stable_baselines3.common.env_checker import check_env
 
@@ -11,12 +11,9 @@ def get_direction(action):
         3: "down"
     }.get(action, "unknown")
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldRenderEnv,
-)
+register_envs()
 
-env = gym.make("gymnasium_env/GridWorld-v0", render_mode="human", size=5, obs_quantity=4)
+env = gym.make("gymnasium_env/GridWorld-v1", render_mode="human", size=5, obs_quantity=4)
 #env = FlattenObservation(env)
 #check_env(env)
 
@@ -1,12 +1,9 @@
 import gymnasium as gym
-from gymnasium_env.grid_world_render import GridWorldRenderEnv
+from gymnasium_env import register_envs
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldRenderEnv,
-)
+register_envs()
 
-env = gym.make("gymnasium_env/GridWorld-v0", render_mode="human", size=5)
+env = gym.make("gymnasium_env/GridWorldRender-v0", render_mode="human", size=5)
 
 (state, _) = env.reset()
 done = False
@@ -1,10 +1,7 @@
 import gymnasium as gym
-from gymnasium_env.grid_world import GridWorldEnv
+from gymnasium_env import register_envs
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldEnv,
-)
+register_envs()
 
 env = gym.make("gymnasium_env/GridWorld-v0")
 
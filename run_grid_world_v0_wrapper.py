@@ -1,11 +1,8 @@
 import gymnasium as gym
-from gymnasium_env.grid_world import GridWorldEnv
+from gymnasium_env import register_envs
 from gymnasium.wrappers import FlattenObservation
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldEnv,
-)
+register_envs()
 
 env = gym.make("gymnasium_env/GridWorld-v0", size=5)
 
@@ -0,0 +1,189 @@
+#
+# python sweep_grid_world_cpp.py --dims 5 10 20 --obstacles 3 12 48 --max-steps 200 500 1000 --timesteps 500000
+#
+# Trains and tests one CPP model per combination of (dim, obstacles, max_steps).
+# Train jobs run `train_grid_world_cpp.py train ...` in a subprocess; test jobs
+# run a batched evaluation of the trained model (see gymnasium_env/evaluation.py).
+# Jobs are scheduled on a local process pool sized to the available cores,
+# and each job is limited to `--threads` torch/BLAS threads so that parallel
+# jobs do not oversubscribe the CPU.
+#
+# The state of the sweep is saved in sweeps/<name>/state.json after every
+# finished job. Running the same command again (same --name) skips the
+# finished jobs and resumes the incomplete ones. The results of all the
+# tested models are aggregated into sweeps/<name>/results.csv.
+#
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from multiprocessing import get_context
+
+# Must match ENTROPY_COEF in train_grid_world_cpp.py, it is part of the model name
+ENTROPY_COEF = 0.05
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_grid_world_cpp.py")
+
+RESULT_COLUMNS = ["dim", "obstacles", "max_steps", "total_timesteps", "model",
+                  "success_rate", "avg_coverage", "std_coverage", "min_coverage",
+                  "avg_steps", "std_steps", "avg_reward"]
+
+
+def limit_threads(threads: int):
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+
+def train_job(job: dict, threads: int, log_path: str) -> int:
+    env = dict(os.environ, **{variable: str(threads) for variable in THREAD_VARIABLES})
+    command = [sys.executable, TRAIN_SCRIPT, "train", str(job["dim"]), str(job["obstacles"]),
+               str(job["max_steps"]), str(job["total_timesteps"]), job["model"]]
+    with open(log_path, "a") as log_file:
+        return subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT, env=env).returncode
+
+
+def test_job(job: dict, episodes: int, seed: int) -> dict:
+    from gymnasium_env.evaluation import evaluate_policy, summarize
+    from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
+    from gymnasium_env.model_registry import ModelRegistry
+
+    policy = ModelRegistry("data").load_policy(job["model"])
+    results = evaluate_policy(
+        policy,
+        lambda: GridWorldCPPEnv(size=job["dim"], obs_quantity=job["obstacles"], max_steps=job["max_steps"]),
+        n_episodes=episodes,
+        seed=seed,
+    )
+    return summarize(results)
+
+
+def load_state(state_path: str) -> dict:
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            return json.load(f)
+    return {"jobs": {}}
+
+
+def save_state(state: dict, state_path: str):
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def write_results(state: dict, results_path: str):
+    rows = []
+    for job in state["jobs"].values():
+        if job.get("result"):
+            row = {key: job[key] for key in ["dim", "obstacles", "max_steps", "total_timesteps", "model"]}
+            row.update(job["result"])
+            rows.append(row)
+    rows.sort(key=lambda row: (row["dim"], row["obstacles"], row["max_steps"]))
+
+    with open(results_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{'dim':>4} {'obst':>5} {'steps':>6} {'success':>8} {'coverage':>9} {'avg steps':>10}  model")
+    for row in rows:
+        print(f"{row['dim']:>4} {row['obstacles']:>5} {row['max_steps']:>6} "
+              f"{row['success_rate']:>8.1%} {row['avg_coverage']:>9.1%} {row['avg_steps']:>10.1f}  {row['model']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train/test sweep for the CPP environment")
+    parser.add_argument("--name", default="cpp", help="sweep name, reuse it to resume a sweep")
+    parser.add_argument("--dims", type=int, nargs="+", default=[5])
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[3])
+    parser.add_argument("--max-steps", type=int, nargs="+", default=[200])
+    parser.add_argument("--timesteps", type=int, default=500_000)
+    parser.add_argument("--episodes", type=int, default=100, help="test episodes per model")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first test episode")
+    parser.add_argument("--threads", type=int, default=1, help="torch/BLAS threads per job")
+    parser.add_argument("--workers", type=int, default=None, help="parallel jobs (default: cores / threads)")
+    args = parser.parse_args()
+
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    sweep_dir = os.path.join("sweeps", args.name)
+    os.makedirs(sweep_dir, exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    state_path = os.path.join(sweep_dir, "state.json")
+    state = load_state(state_path)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for dim, obstacles, max_steps in itertools.product(args.dims, args.obstacles, args.max_steps):
+        if obstacles >= dim * dim - 1:
+            print(f"Skipping dim={dim} obstacles={obstacles}: too many obstacles for the grid")
+            continue
+        key = f"{dim}_{obstacles}_{max_steps}_{args.timesteps}"
+        if key not in state["jobs"]:
+            state["jobs"][key] = {
+                "dim": dim, "obstacles": obstacles, "max_steps": max_steps,
+                "total_timesteps": args.timesteps,
+                # The model name is fixed when the job is created so that a
+                # resumed sweep continues the same run
+                "model": f"ppo_cpp_{dim}_{obstacles}_{max_steps}_{ENTROPY_COEF}_{timestamp}",
+                "trained": False, "result": None,
+            }
+    save_state(state, state_path)
+
+    print(f"--- Sweep {args.name}: {len(state['jobs'])} configurations, {workers} workers ---")
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn"),
+        initializer=limit_threads, initargs=(args.threads,),
+    )
+    pending = {}
+
+    def submit(key):
+        job = state["jobs"][key]
+        if not job["trained"] and os.path.exists(f"data/{job['model']}.zip"):
+            job["trained"] = True
+        if not job["trained"]:
+            log_path = os.path.join(sweep_dir, f"{job['model']}.log")
+            pending[executor.submit(train_job, job, args.threads, log_path)] = ("train", key)
+        elif job["result"] is None:
+            pending[executor.submit(test_job, job, args.episodes, args.seed)] = ("test", key)
+
+    with executor:
+        for key in state["jobs"]:
+            submit(key)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, key = pending.pop(future)
+                job = state["jobs"][key]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"[{kind}] {job['model']} failed: {e}")
+                    continue
+                if kind == "train":
+                    if outcome != 0:
+                        print(f"[train] {job['model']} failed with exit code {outcome}, see {sweep_dir}/{job['model']}.log")
+                        continue
+                    job["trained"] = True
+                    print(f"[train] {job['model']} finished")
+                    submit(key)
+                else:
+                    job["result"] = outcome
+                    print(f"[test] {job['model']}: coverage {outcome['avg_coverage']:.1%}, "
+                          f"success {outcome['success_rate']:.1%}")
+            save_state(state, state_path)
+
+    results_path = os.path.join(sweep_dir, "results.csv")
+    write_results(state, results_path)
+    print(f"\nResults saved to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
 
 #
-# python train_grid_world_render_v0.py <train|test|run>
+# python train_grid_world_3D.py <train|test|run> [model_name|latest]
 #
 
 import gymnasium as gym
-from gymnasium_env.grid_world_3D import GridWorldEnv
-from gymnasium.wrappers import FlattenObservation
+from gymnasium_env import EnvPool, register_envs
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.logger import configure
+from gymnasium_env.checkpoint import PreemptionCheckpoint, configure_logger, find_incomplete_run
+from gymnasium_env.model_registry import ModelRegistry, model_name_from_args
 from datetime import datetime
 
 def print_action(action: int) -> str:
@@ -22,51 +22,56 @@ def print_action(action: int) -> str:
     }.get(action, "unknown")
 
 import sys
-if sys.argv[1] not in ['train', 'test', 'run']:
-    print("Usage: python train_grid_world_3D.py <train|test|run>")
+if len(sys.argv) < 2 or sys.argv[1] not in ['train', 'test', 'run']:
+    print("Usage: python train_grid_world_3D.py <train|test|run> [model_name|latest]")
     sys.exit(1)
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldEnv,
-)
+register_envs()
 
 DIM=10
 MAX_STEPS=500
 TOTAL_TIMESTEPS=500_000
 ENTROPY_COEF=0.02
+CHECKPOINT_FREQ=50_000
+MODEL_EXAMPLE="ppo_grid_3d_10_500_0.02_20250924_103000"
 
 if sys.argv[1] == 'train':
     env = gym.make(
-        "gymnasium_env/GridWorld-v0", 
+        "gymnasium_env/GridWorld3D-v0", 
         size=DIM, 
         max_steps=MAX_STEPS,
-        render_mode="rgb_array"
+        render_mode="rgb_array",
+        obs_format="flat"
     )
-    env = FlattenObservation(env)
     check_env(env)
-    model = PPO("MlpPolicy", env, verbose=1, ent_coef=ENTROPY_COEF)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    new_logger = configure(
-        f'log/ppo_grid_3d_{DIM}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}',
-        ["stdout", "csv", "tensorboard"]
-    )
+    # Resume an interrupted run with the same hyperparameters, if there is one
+    run_prefix = f'ppo_grid_3d_{DIM}_{MAX_STEPS}_{ENTROPY_COEF}_'
+    run_name = find_incomplete_run(run_prefix) or run_prefix + timestamp
+    checkpoint = PreemptionCheckpoint(f'log/{run_name}/checkpoint', save_freq=CHECKPOINT_FREQ)
+    model = checkpoint.load(env)
+    if model is None:
+        model = PPO("MlpPolicy", env, verbose=1, ent_coef=ENTROPY_COEF)
+    new_logger = configure_logger(f'log/{run_name}')
     model.set_logger(new_logger)
-    model.learn(total_timesteps=TOTAL_TIMESTEPS)
-    model.save(f'data/ppo_grid_3d_{DIM}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}.zip')
+    model.learn(total_timesteps=TOTAL_TIMESTEPS - model.num_timesteps, reset_num_timesteps=False, callback=checkpoint)
+    if checkpoint.interrupted:
+        print(f'training interrupted, run the same command again to resume {run_name}')
+        sys.exit(143)
+    model.save(f'data/{run_name}.zip')
     print('model trained')
 
 elif sys.argv[1] == 'run':
-    model_name = input("Enter model filename (without path and extension): ")
+    model_name = model_name_from_args(sys.argv, 2, MODEL_EXAMPLE)
     print('loading model')
-    model = PPO.load(f'data/{model_name}.zip')
+    model = ModelRegistry("data").load_policy(model_name, env="grid_3d", dim=DIM)
     env = gym.make(
-        "gymnasium_env/GridWorld-v0", 
+        "gymnasium_env/GridWorld3D-v0", 
         size=DIM, 
         max_steps=MAX_STEPS, 
-        render_mode="human"
+        render_mode="human",
+        obs_format="flat"
     )
-    env = FlattenObservation(env)
     (obs, _) = env.reset()
     done = False
 
@@ -78,18 +83,20 @@ elif sys.argv[1] == 'run':
         steps += 1
 
 else:
-    model_name = input("Enter model filename (without path and extension): ")
+    model_name = model_name_from_args(sys.argv, 2, MODEL_EXAMPLE)
     print('loading model')
     success = 0
-    model = PPO.load(f'data/{model_name}.zip')
+    model = ModelRegistry("data").load_policy(model_name, env="grid_3d", dim=DIM)
+    # The same environment is reset for every episode instead of being made again
+    pool = EnvPool()
     for i in range(100):    
-        env = gym.make(
-            "gymnasium_env/GridWorld-v0", 
+        env = pool.acquire(
+            "gymnasium_env/GridWorld3D-v0", 
             size=DIM, 
             max_steps=MAX_STEPS,
-            render_mode="rgb_array"
+            render_mode="rgb_array",
+            obs_format="flat"
         )
-        env = FlattenObservation(env)
         (obs, _) = env.reset()
         done = False
 
@@ -105,5 +112,7 @@ else:
             print(f"Episode {i+1}: Success in {steps} steps")
         else:
             print(f"Episode {i+1}: Failed to reach goal in {MAX_STEPS} steps")
+        pool.release(env)
     
+    pool.close()
     print(f"Success rate: {success / 100 * 100}%")
\ No newline at end of file
@@ -1,15 +1,59 @@
 #
-# python train_grid_world_cpp.py <train|test|run|curriculum> dim obstacles max_steps total_timesteps
+# python train_grid_world_cpp.py train dim obstacles max_steps total_timesteps [run_name] [--mask] [--bc]
+# python train_grid_world_cpp.py curriculum dim obstacles max_steps total_timesteps [model_name]
+# python train_grid_world_cpp.py <test|run> dim obstacles [model_name|latest] [--record dataset_dir] [--video video_dir]
+#
+# --mask trains with MaskablePPO (sb3-contrib), which never picks actions that
+# bump into an obstacle or wall (see GridWorldCPPEnv.action_masks). The model
+# name gets the `_masked` tag, and test/run apply the masks to such models.
+#
+# --bc pretrains the policy by behavior cloning on episodes of a classical
+# planner (nearest-unvisited-cell coverage, see gymnasium_env/planners.py) before PPO.
+# The expert episodes are recorded once in datasets/expert_cpp_<dim>_<obstacles>_<max_steps>.
+#
+# --record appends the transitions of test/run to an offline dataset
+# (see gymnasium_env/recorder.py).
+#
+# --video saves a GIF of every test episode, drawn and encoded in the
+# background (see gymnasium_env/video.py).
 #
 
 import gymnasium as gym
+from gymnasium_env import register_envs
 from gymnasium_env.grid_world_cpp import GridWorldCPPEnv
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.logger import configure
+from gymnasium_env.checkpoint import PreemptionCheckpoint, configure_logger, find_incomplete_run
+from gymnasium_env.model_registry import ModelRegistry, model_name_from_args
+from gymnasium_env.recorder import TrajectoryDataset, TrajectoryRecorder
+from gymnasium_env.video import EpisodeVideoRecorder
+from gymnasium_env.evaluation import CoverageTracker
+from gymnasium_env.planners import coverage_actions, coverage_baseline, efficiency_ratio, record_expert_episodes
+from gymnasium_env.behavior_cloning import pretrain_policy
+from gymnasium_env.curriculum import CurriculumStage, DEFAULT_STAGES, find_incomplete_curriculum, run_curriculum
 from datetime import datetime
+import numpy as np
+import os
 import sys
 
+# Option flags are removed from argv so that the positional arguments keep their index
+MASK = '--mask' in sys.argv
+if MASK:
+    sys.argv.remove('--mask')
+BC = '--bc' in sys.argv
+if BC:
+    sys.argv.remove('--bc')
+RECORD = None # test/run: directory where the transitions are recorded
+if '--record' in sys.argv:
+    index = sys.argv.index('--record')
+    RECORD = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+VIDEO = None # test: directory where the episode videos are saved
+if '--video' in sys.argv:
+    index = sys.argv.index('--video')
+    VIDEO = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+
 def print_action(action: int) -> str:
     return {
         0: "right",
@@ -18,34 +62,39 @@ def print_action(action: int) -> str:
         3: "down",
     }.get(action, "unknown")
 
-if sys.argv[1] not in ['train', 'test', 'run', 'curriculum']:
+if len(sys.argv) < 2 or sys.argv[1] not in ['train', 'test', 'run', 'curriculum']:
     print("Usage: python train_grid_world_cpp.py <train|test|run|curriculum> dim obstacles max_steps total_timesteps")
     sys.exit(1)
 elif sys.argv[1] in ['train','curriculum']:
-    if len(sys.argv) != 6:
-        print("Usage for training: python train_grid_world_cpp.py train|curriculum dim obstacles max_steps total_timesteps")
+    if len(sys.argv) not in [6, 7]:
+        print("Usage for training: python train_grid_world_cpp.py train|curriculum dim obstacles max_steps total_timesteps [run_name|model_name] [--mask] [--bc]")
         sys.exit(1)
 elif sys.argv[1] in ['test', 'run']:
-    if len(sys.argv) != 4:
-        print("Usage for testing/running: python train_grid_world_cpp.py test|run dim obstacles")
+    if len(sys.argv) not in [4, 5]:
+        print("Usage for testing/running: python train_grid_world_cpp.py test|run dim obstacles [model_name|latest]")
         sys.exit(1)
 
 # --- Hyperparameters ---
 mode = sys.argv[1]
 DIM = int(sys.argv[2]) # 5, 10, 20
 OBSTACLES = int(sys.argv[3]) # 3, 12, 48
-MAX_STEPS = int(sys.argv[4]) # 200, 500, 1000
-TOTAL_TIMESTEPS = int(sys.argv[5]) # 500_000
 ENTROPY_COEF = 0.05
+COVERAGE_THRESHOLD = 0.95 # curriculum: average coverage needed to advance to the next stage
+EVAL_INTERVAL = 50_000 # curriculum: timesteps between checkpoints/evaluations
+CHECKPOINT_FREQ = 50_000 # train/curriculum: timesteps between checkpoints
+BC_EPISODES = 1000 # --bc: expert episodes recorded from the planner
+BC_EPOCHS = 10 # --bc: supervised epochs over the expert episodes
+TEST_SEED = 0 # test: episode i uses the layout of reset(seed=TEST_SEED + i)
+if mode in ['train', 'curriculum']:
+    MAX_STEPS = int(sys.argv[4]) # 200, 500, 1000
+    TOTAL_TIMESTEPS = int(sys.argv[5]) # 500_000
+else:
+    MAX_STEPS = 200 # overridden by the value encoded in the model name
 # -----------------------
 
-try:
-    gym.register(
-        id="gymnasium_env/GridWorldCPP-v0",
-        entry_point=GridWorldCPPEnv,
-    )
-except Exception:
-    pass
+MODEL_EXAMPLE = "ppo_cpp_5_3_200_0.05_20260324_100000"
+
+register_envs()
 
 
 
@@ -60,17 +109,46 @@ if mode == 'train':
     )
     check_env(env)
 
-    model = PPO("MultiInputPolicy", env, verbose=1, ent_coef=ENTROPY_COEF, device="cpu")
-
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_dir = f'log/ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}'
-    model_path = f'data/ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}.zip'
+    # An explicit run name (used by sweep_grid_world_cpp.py) replaces the generated one.
+    # Otherwise an interrupted run with the same hyperparameters is resumed, if there is one.
+    run_prefix = f'ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_'
+    tags = [tag for tag, enabled in [('bc', BC), ('masked', MASK)] if enabled]
+    tag = '_'.join(tags) or None
+    run_name = sys.argv[6] if len(sys.argv) > 6 else (
+        find_incomplete_run(run_prefix, tag=tag) or run_prefix + timestamp + ''.join('_' + tag for tag in tags))
+    log_dir = f'log/{run_name}'
+    model_path = f'data/{run_name}.zip'
 
-    new_logger = configure(log_dir, ["stdout", "csv", "tensorboard"])
+    algorithm = PPO
+    if MASK:
+        from sb3_contrib import MaskablePPO
+        algorithm = MaskablePPO
+
+    checkpoint = PreemptionCheckpoint(f'{log_dir}/checkpoint', save_freq=CHECKPOINT_FREQ)
+    model = checkpoint.load(env, algorithm=algorithm)
+    if model is None:
+        model = algorithm("MultiInputPolicy", env, verbose=1, ent_coef=ENTROPY_COEF, device="cpu")
+        if BC:
+            # Warm start: imitate the planner before PPO (a resumed run already did it)
+            dataset_path = f'datasets/expert_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}'
+            if not os.path.exists(f'{dataset_path}/meta.json'):
+                print(f"Recording {BC_EPISODES} expert episodes to {dataset_path}...")
+                summary = record_expert_episodes(
+                    lambda: GridWorldCPPEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS),
+                    coverage_actions, dataset_path, BC_EPISODES, obs_dtypes={"neighbors": np.uint8},
+                )
+                print(summary)
+            pretrain_policy(model.policy, TrajectoryDataset(dataset_path), epochs=BC_EPOCHS)
+
+    new_logger = configure_logger(log_dir)
     model.set_logger(new_logger)
 
-    print(f"Starting learning with {TOTAL_TIMESTEPS} timesteps...")
-    model.learn(total_timesteps=TOTAL_TIMESTEPS)
+    print(f"Starting learning with {TOTAL_TIMESTEPS - model.num_timesteps} timesteps...")
+    model.learn(total_timesteps=TOTAL_TIMESTEPS - model.num_timesteps, reset_num_timesteps=False, callback=checkpoint)
+    if checkpoint.interrupted:
+        print(f"Training interrupted, run the same command again to resume {run_name}")
+        sys.exit(143)
     model.save(model_path)
     print(f"Model trained and saved to {model_path}")
     print(f"Logs saved to {log_dir}")
@@ -78,47 +156,44 @@ if mode == 'train':
 elif mode == 'curriculum':
 
     print("--- Starting CPP Curriculum Learning Training ---")
-    
-    model_name = input("Enter model filename (e.g., ppo_cpp_5_3_200_0.05_20260324_100000): ")
-    model_path = f'data/{model_name}.zip'
 
-    env = gym.make(        
-        "gymnasium_env/GridWorldCPP-v0",
-        size=DIM,
-        obs_quantity=OBSTACLES,
-        max_steps=MAX_STEPS,
-        render_mode="rgb_array"
-    )
+    # The first stage is the one given on the command line, followed by the
+    # larger default stages (10x10 with 12 obstacles, then 20x20 with 48 obstacles)
+    stages = [CurriculumStage(DIM, OBSTACLES, MAX_STEPS, TOTAL_TIMESTEPS, COVERAGE_THRESHOLD)]
+    stages += [stage._replace(total_timesteps=TOTAL_TIMESTEPS, coverage_threshold=COVERAGE_THRESHOLD)
+               for stage in DEFAULT_STAGES if stage.size > DIM]
 
-    # Carrega os pesos do modelo 5x5 e associa ao novo ambiente
-    model = PPO.load(
-        model_path,
-        env=env,
-        device="cpu"
-    )
-
-    # Continua o treinamento com os pesos já inicializados
-    model.learn(total_timesteps=MAX_STEPS, reset_num_timesteps=False)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_dir = f'log/ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}_curriculum'
-    model_path = f'data/ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}_curriculum.zip'
+    # Optional pre-trained model used as the starting point of the first stage
+    initial_model = None
+    if len(sys.argv) > 6:
+        initial_model = ModelRegistry("data").get(sys.argv[6], env="cpp").path
 
-    new_logger = configure(log_dir, ["stdout", "csv", "tensorboard"])
-    model.set_logger(new_logger)
-
-    print(f"Starting learning with {TOTAL_TIMESTEPS} timesteps...")
-    model.learn(total_timesteps=TOTAL_TIMESTEPS)
-    model.save(model_path)
-    print(f"Model trained and saved to {model_path}")
-    print(f"Logs saved to {log_dir}")
+    # Rerunning the same command resumes the unfinished curriculum with the same
+    # stages and initial model, if there is one; otherwise a new one is started
+    run_prefix = f'data/curriculum/ppo_cpp_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{TOTAL_TIMESTEPS}_'
+    run_dir = (find_incomplete_curriculum(run_prefix, stages, initial_model)
+               or run_prefix + datetime.now().strftime("%Y%m%d_%H%M%S"))
+    model_path = run_curriculum(
+        stages, run_dir,
+        initial_model=initial_model,
+        ent_coef=ENTROPY_COEF,
+        eval_interval=EVAL_INTERVAL,
+        checkpoint_freq=CHECKPOINT_FREQ,
+    )
+    if model_path is None:
+        print("Curriculum interrupted, run the same command again to resume it")
+        sys.exit(143)
+    print(f"Curriculum finished, final model saved to {model_path}")
+    print(f"Progress and checkpoints saved to {run_dir}")
 
 elif mode == 'run':
-    model_name = input("Enter model filename (e.g., ppo_cpp_5_3_200_0.05_20260324_100000): ")
-    model_path = f'data/{model_name}.zip'
+    registry = ModelRegistry("data")
+    model_info = registry.get(model_name_from_args(sys.argv, 4, MODEL_EXAMPLE), env="cpp", dim=DIM, obstacles=OBSTACLES)
+    model_path = model_info.path
+    MAX_STEPS = model_info.max_steps or MAX_STEPS
     print(f'--- Loading model from {model_path} for a run ---')
 
-    model = PPO.load(model_path)
+    model = registry.load_policy(model_info.model_id)
     env = gym.make(
         "gymnasium_env/GridWorldCPP-v0",
         size=DIM,
@@ -126,6 +201,8 @@ elif mode == 'run':
         max_steps=MAX_STEPS,
         render_mode="human"
     )
+    if RECORD:
+        env = TrajectoryRecorder(env, RECORD, obs_dtypes={"neighbors": np.uint8})
 
     (obs, info) = env.reset()
     done = False
@@ -133,7 +210,8 @@ elif mode == 'run':
     steps = 0
     total_reward = 0
     while not done and not truncated:
-        action, _ = model.predict(obs, deterministic=False)
+        action_masks = info['action_mask'] if model_info.masked else None
+        action, _ = model.predict(obs, deterministic=False, action_masks=action_masks)
         obs, reward, done, truncated, info = env.step(action.item())
         total_reward += reward
         steps += 1
@@ -142,12 +220,18 @@ elif mode == 'run':
               f"Done: {done}, Truncated: {truncated}")
     print(f"--- Run Finished --- Total reward: {total_reward:.2f}, Coverage: {info['coverage']:.1%}")
 
+    if RECORD:
+        env.close()
+        print(f"Transitions recorded to {RECORD}")
+
 elif mode == 'test':
-    model_name = input("Enter model filename (e.g., ppo_cpp_5_3_200_0.05_20260324_100000): ")
-    model_path = f'data/{model_name}.zip'
+    registry = ModelRegistry("data")
+    model_info = registry.get(model_name_from_args(sys.argv, 4, MODEL_EXAMPLE), env="cpp", dim=DIM, obstacles=OBSTACLES)
+    model_path = model_info.path
+    MAX_STEPS = model_info.max_steps or MAX_STEPS
     print(f'--- Loading model from {model_path} for testing ---')
 
-    model = PPO.load(model_path)
+    model = registry.load_policy(model_info.model_id)
     env = gym.make(
         "gymnasium_env/GridWorldCPP-v0",
         size=DIM,
@@ -155,24 +239,35 @@ elif mode == 'test':
         max_steps=MAX_STEPS,
         render_mode="rgb_array"
     )
+    if RECORD:
+        env = TrajectoryRecorder(env, RECORD, obs_dtypes={"neighbors": np.uint8})
+    if VIDEO:
+        env = EpisodeVideoRecorder(env, VIDEO)
 
     num_episodes = 100
     full_coverage_count = 0
     total_coverages = []
     total_steps_list = []
+    full_coverage_list = []
+    tracker = CoverageTracker(DIM, num_episodes, MAX_STEPS)
 
     for i in range(num_episodes):
-        (obs, info) = env.reset()
+        # Seeded layouts, so that the baseline below runs on the same ones
+        (obs, info) = env.reset(seed=TEST_SEED + i)
+        tracker.record(i, 0, env.unwrapped._agent_location, info)
         done = False
         truncated = False
         steps = 0
         while not done and not truncated:
-            action, _ = model.predict(obs, deterministic=False)
+            action_masks = info['action_mask'] if model_info.masked else None
+            action, _ = model.predict(obs, deterministic=False, action_masks=action_masks)
             obs, reward, done, truncated, info = env.step(action.item())
             steps += 1
+            tracker.record(i, steps, env.unwrapped._agent_location, info)
 
         total_coverages.append(info['coverage'])
         total_steps_list.append(steps)
+        full_coverage_list.append(done)
 
         if done and not truncated:
             full_coverage_count += 1
@@ -180,7 +275,6 @@ elif mode == 'test':
         else:
             print(f"Episode {i+1}: Coverage {info['coverage']:.1%} in {steps} steps.")
 
-    import numpy as np
     full_coverage_rate = (full_coverage_count / num_episodes) * 100
     avg_coverage = np.mean(total_coverages) * 100
     standard_deviation = np.std(total_coverages) * 100
@@ -190,3 +284,31 @@ elif mode == 'test':
     print(f"Full Coverage Rate: {full_coverage_rate:.2f}% ({full_coverage_count}/{num_episodes})")
     print(f"Average Coverage: {avg_coverage:.2f}% Standard Deviation: {standard_deviation:.2f}% Min Coverage: {np.min(total_coverages)*100:.2f}% Max Coverage: {np.max(total_coverages)*100:.2f}%")
     print(f"Average Steps: {avg_steps:.1f} Standard Deviation: {standard_deviation_steps:.1f} Min Steps: {np.min(total_steps_list)} Max Steps: {np.max(total_steps_list)}")
+
+    coverage_summary = tracker.summary()
+    print(f"Revisit Ratio (steps onto visited cells): {coverage_summary['revisit_ratio']:.1%}")
+    for fraction in ['50%', '90%', '100%']:
+        print(f"Steps to {fraction} coverage: reached in {coverage_summary[f'reached_{fraction}']:.0%} of the episodes, "
+              f"Median: {coverage_summary[f'steps_to_{fraction}_q50']:.0f} 90th percentile: {coverage_summary[f'steps_to_{fraction}_q90']:.0f}")
+    heatmap = tracker.heatmap()
+    busiest = tuple(int(v) for v in np.unravel_index(np.argmax(heatmap), heatmap.shape))
+    print(f"Visits per cell (all episodes): Mean: {heatmap.mean():.1f} Max: {heatmap.max()} at {busiest}")
+
+    # Reference: nearest-unvisited-cell coverage planner on the same layouts
+    baseline = coverage_baseline(
+        lambda: GridWorldCPPEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS),
+        np.arange(TEST_SEED, TEST_SEED + num_episodes), max_steps=MAX_STEPS,
+    )
+    ratios = efficiency_ratio(total_steps_list, baseline["steps"], np.array(full_coverage_list) & baseline["covered"])
+    print(f"Baseline (coverage planner): Full Coverage Rate: {baseline['covered'].mean()*100:.2f}% "
+          f"Average Steps: {baseline['steps'].mean():.1f} (lower bound {baseline['lower_bound'].mean():.1f})")
+    if not np.all(np.isnan(ratios)):
+        print(f"Efficiency Ratio (policy steps / baseline steps, fully covered by both): "
+              f"Mean: {np.nanmean(ratios):.2f} Median: {np.nanmedian(ratios):.2f}")
+
+    if RECORD or VIDEO:
+        env.close()
+    if RECORD:
+        print(f"Transitions recorded to {RECORD}")
+    if VIDEO:
+        print(f"Episode videos saved to {VIDEO}")
@@ -1,15 +1,55 @@
 #
-# python train_grid_world_obstacles.py <train|test|run>
+# python train_grid_world_obstacles.py <train|test|run> [model_name|latest] [--mask] [--bc] [--record dataset_dir] [--video video_dir]
+#
+# --mask trains with MaskablePPO (sb3-contrib), which never picks actions that
+# bump into an obstacle or wall (see GridWorldRenderEnv.action_masks). The
+# model name gets the `_masked` tag, and test/run apply the masks to such models.
+#
+# --bc pretrains the policy by behavior cloning on episodes of a classical
+# planner (BFS shortest path, see gymnasium_env/planners.py) before PPO.
+# The expert episodes are recorded once in datasets/expert_obstacles_<dim>_<obstacles>_<max_steps>_<encoding>.
+#
+# --record appends the transitions of test/run to an offline dataset
+# (see gymnasium_env/recorder.py).
+#
+# --video saves a GIF of every test episode, drawn and encoded in the
+# background (see gymnasium_env/video.py).
 #
 
 import gymnasium as gym
+from gymnasium_env import register_envs
 from gymnasium_env.grid_world_obstacles import GridWorldRenderEnv
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.logger import configure
+from gymnasium_env.checkpoint import PreemptionCheckpoint, configure_logger, find_incomplete_run
+from gymnasium_env.model_registry import ModelRegistry, model_name_from_args
+from gymnasium_env.recorder import TrajectoryDataset, TrajectoryRecorder
+from gymnasium_env.video import EpisodeVideoRecorder
+from gymnasium_env.planners import efficiency_ratio, record_expert_episodes, shortest_path_actions, shortest_path_baseline
+from gymnasium_env.behavior_cloning import pretrain_policy
 from datetime import datetime
+import numpy as np
+import os
 import sys
 
+# Option flags are removed from argv so that the positional arguments keep their index
+MASK = '--mask' in sys.argv
+if MASK:
+    sys.argv.remove('--mask')
+BC = '--bc' in sys.argv
+if BC:
+    sys.argv.remove('--bc')
+RECORD = None # test/run: directory where the transitions are recorded
+if '--record' in sys.argv:
+    index = sys.argv.index('--record')
+    RECORD = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+VIDEO = None # test: directory where the episode videos are saved
+if '--video' in sys.argv:
+    index = sys.argv.index('--video')
+    VIDEO = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+
 def print_action(action: int) -> str:
     return {
         0: "right",
@@ -19,18 +59,12 @@ def print_action(action: int) -> str:
     }.get(action, "unknown")
 
 if len(sys.argv) < 2 or sys.argv[1] not in ['train', 'test', 'run']:
-    print("Usage: python train_grid_world_obstacles.py <train|test|run>")
+    print("Usage: python train_grid_world_obstacles.py <train|test|run> [model_name|latest] [--mask] [--bc]")
     sys.exit(1)
 
 mode = sys.argv[1]
 
-try:
-    gym.register(
-        id="gymnasium_env/GridWorld-v1",
-        entry_point=GridWorldRenderEnv,
-    )
-except Exception:
-    pass
+register_envs()
 
 # --- Hyperparameters ---
 DIM = 20
@@ -38,8 +72,15 @@ OBSTACLES = 40
 MAX_STEPS = 500
 TOTAL_TIMESTEPS = 500_000
 ENTROPY_COEF = 0.02
+CHECKPOINT_FREQ = 50_000
+BC_EPISODES = 1000 # --bc: expert episodes recorded from the planner
+BC_EPOCHS = 10 # --bc: supervised epochs over the expert episodes
+TEST_SEED = 0 # test: episode i uses the layout of reset(seed=TEST_SEED + i)
+OBS_ENCODING = "compact" # "int", "compact" (uint8, same values as "int") or "normalized" (float32)
 # -----------------------
 
+MODEL_EXAMPLE = "ppo_obstacles_20_40_500_0.02_20250924_103000"
+
 if mode == 'train':
     print("--- Starting Training ---")
     env = gym.make(
@@ -47,76 +88,125 @@ if mode == 'train':
         size=DIM,
         obs_quantity=OBSTACLES,
         max_steps=MAX_STEPS,
+        obs_encoding=OBS_ENCODING,
         render_mode="rgb_array"
     )
     check_env(env)
 
-    model = PPO("MlpPolicy", env, verbose=1, ent_coef=ENTROPY_COEF, device="cpu")
-
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_dir = f'log/ppo_obstacles_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}'
-    model_path = f'data/ppo_obstacles_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_{timestamp}.zip'
-
-    new_logger = configure(log_dir, ["stdout", "csv", "tensorboard"])
+    # Resume an interrupted run with the same hyperparameters, if there is one
+    run_prefix = f'ppo_obstacles_{DIM}_{OBSTACLES}_{MAX_STEPS}_{ENTROPY_COEF}_'
+    tags = [tag for tag, enabled in [('bc', BC), ('masked', MASK)] if enabled]
+    tag = '_'.join(tags) or None
+    run_name = find_incomplete_run(run_prefix, tag=tag) or run_prefix + timestamp + ''.join('_' + tag for tag in tags)
+    log_dir = f'log/{run_name}'
+    model_path = f'data/{run_name}.zip'
+
+    algorithm = PPO
+    if MASK:
+        from sb3_contrib import MaskablePPO
+        algorithm = MaskablePPO
+
+    checkpoint = PreemptionCheckpoint(f'{log_dir}/checkpoint', save_freq=CHECKPOINT_FREQ)
+    model = checkpoint.load(env, algorithm=algorithm)
+    if model is None:
+        model = algorithm("MlpPolicy", env, verbose=1, ent_coef=ENTROPY_COEF, device="cpu")
+        if BC:
+            # Warm start: imitate the planner before PPO (a resumed run already did it)
+            dataset_path = f'datasets/expert_obstacles_{DIM}_{OBSTACLES}_{MAX_STEPS}_{OBS_ENCODING}'
+            if not os.path.exists(f'{dataset_path}/meta.json'):
+                print(f"Recording {BC_EPISODES} expert episodes to {dataset_path}...")
+                summary = record_expert_episodes(
+                    lambda: GridWorldRenderEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS, obs_encoding=OBS_ENCODING),
+                    shortest_path_actions, dataset_path, BC_EPISODES,
+                )
+                print(summary)
+            pretrain_policy(model.policy, TrajectoryDataset(dataset_path), epochs=BC_EPOCHS)
+
+    new_logger = configure_logger(log_dir)
     model.set_logger(new_logger)
 
-    print(f"Starting learning with {TOTAL_TIMESTEPS} timesteps...")
-    model.learn(total_timesteps=TOTAL_TIMESTEPS)
+    print(f"Starting learning with {TOTAL_TIMESTEPS - model.num_timesteps} timesteps...")
+    model.learn(total_timesteps=TOTAL_TIMESTEPS - model.num_timesteps, reset_num_timesteps=False, callback=checkpoint)
+    if checkpoint.interrupted:
+        print(f"Training interrupted, run the same command again to resume {run_name}")
+        sys.exit(143)
     model.save(model_path)
     print(f"Model trained and saved to {model_path}")
     print(f"Logs saved to {log_dir}")
 
 elif mode == 'run':
-    model_name = input("Enter model filename (e.g., ppo_obstacles_20_40_500_0.02_20250924_103000): ")
-    model_path = f'data/{model_name}.zip'
+    registry = ModelRegistry("data")
+    model_info = registry.get(model_name_from_args(sys.argv, 2, MODEL_EXAMPLE), env="obstacles", dim=DIM, obstacles=OBSTACLES)
+    model_path = model_info.path
     print(f'--- Loading model from {model_path} for a run ---')
 
-    model = PPO.load(model_path)
+    model = registry.load_policy(model_info.model_id)
     env = gym.make(
         "gymnasium_env/GridWorld-v1",
         size=DIM,
         obs_quantity=OBSTACLES,
         max_steps=MAX_STEPS,
+        obs_encoding=OBS_ENCODING,
         render_mode="human"
     )
+    if RECORD:
+        env = TrajectoryRecorder(env, RECORD)
 
-    (obs, _) = env.reset()
+    (obs, info) = env.reset()
     done = False
     truncated = False
     steps = 0
     while not done and not truncated:
-        action, _ = model.predict(obs, deterministic=True)
-        obs, reward, done, truncated, _ = env.step(action.item())
+        action_masks = info['action_mask'] if model_info.masked else None
+        action, _ = model.predict(obs, deterministic=True, action_masks=action_masks)
+        obs, reward, done, truncated, info = env.step(action.item())
         print(f"Step: {steps+1}, Action: {print_action(action.item())}, Reward: {reward:.2f}, Done: {done}, Truncated: {truncated}")
         steps += 1
     print("--- Run Finished ---")
 
+    if RECORD:
+        env.close()
+        print(f"Transitions recorded to {RECORD}")
+
 elif mode == 'test':
-    model_name = input("Enter model filename (e.g., ppo_obstacles_20_40_500_0.02_20250924_103000): ")
-    model_path = f'data/{model_name}.zip'
+    registry = ModelRegistry("data")
+    model_info = registry.get(model_name_from_args(sys.argv, 2, MODEL_EXAMPLE), env="obstacles", dim=DIM, obstacles=OBSTACLES)
+    model_path = model_info.path
     print(f'--- Loading model from {model_path} for testing ---')
 
-    model = PPO.load(model_path)
+    model = registry.load_policy(model_info.model_id)
     env = gym.make(
         "gymnasium_env/GridWorld-v1",
         size=DIM,
         obs_quantity=OBSTACLES,
         max_steps=MAX_STEPS,
+        obs_encoding=OBS_ENCODING,
         render_mode="rgb_array" # No rendering for faster testing
     )
+    if RECORD:
+        env = TrajectoryRecorder(env, RECORD)
+    if VIDEO:
+        env = EpisodeVideoRecorder(env, VIDEO)
 
     num_episodes = 100
     success_count = 0
+    steps_list = []
+    success_list = []
     for i in range(num_episodes):
-        (obs, _) = env.reset()
+        # Seeded layouts, so that the shortest paths below are computed on the same ones
+        (obs, info) = env.reset(seed=TEST_SEED + i)
         done = False
         truncated = False
         steps = 0
         while not done and not truncated:
-            action, _ = model.predict(obs, deterministic=True)
-            obs, reward, done, truncated, _ = env.step(action.item())
+            action_masks = info['action_mask'] if model_info.masked else None
+            action, _ = model.predict(obs, deterministic=True, action_masks=action_masks)
+            obs, reward, done, truncated, info = env.step(action.item())
             steps += 1
-        
+        steps_list.append(steps)
+        success_list.append(done)
+
         if done and not truncated: # Reached the goal
             success_count += 1
             print(f"Episode {i+1}: Success in {steps} steps.")
@@ -125,4 +215,22 @@ elif mode == 'test':
 
     success_rate = (success_count / num_episodes) * 100
     print(f"--- Test Finished ---")
-    print(f"Success Rate: {success_rate:.2f}% ({success_count}/{num_episodes})")
\ No newline at end of file
+    print(f"Success Rate: {success_rate:.2f}% ({success_count}/{num_episodes})")
+
+    # Reference: BFS shortest path on the same layouts
+    shortest = shortest_path_baseline(
+        lambda: GridWorldRenderEnv(size=DIM, obs_quantity=OBSTACLES, max_steps=MAX_STEPS, obs_encoding=OBS_ENCODING),
+        np.arange(TEST_SEED, TEST_SEED + num_episodes),
+    )
+    ratios = efficiency_ratio(steps_list, shortest, success_list)
+    print(f"Reachable Targets: {np.mean(shortest >= 0)*100:.2f}% Average Shortest Path: {shortest[shortest >= 0].mean():.1f} steps")
+    if not np.all(np.isnan(ratios)):
+        print(f"Efficiency Ratio (policy steps / shortest path, successful episodes): "
+              f"Mean: {np.nanmean(ratios):.2f} Median: {np.nanmedian(ratios):.2f}")
+
+    if RECORD or VIDEO:
+        env.close()
+    if RECORD:
+        print(f"Transitions recorded to {RECORD}")
+    if VIDEO:
+        print(f"Episode videos saved to {VIDEO}")
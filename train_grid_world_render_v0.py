@@ -4,8 +4,7 @@
 #
 
 import gymnasium as gym
-from gymnasium_env.grid_world_render import GridWorldRenderEnv
-from gymnasium.wrappers import FlattenObservation
+from gymnasium_env import register_envs
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.logger import configure
@@ -13,14 +12,10 @@ from stable_baselines3.common.logger import configure
 import sys
 train = True if sys.argv[1] == 'train' else False
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldRenderEnv,
-)
+register_envs()
 
 if train:
-    env = gym.make("gymnasium_env/GridWorld-v0", size=10, render_mode="rgb_array")
-    env = FlattenObservation(env)
+    env = gym.make("gymnasium_env/GridWorldRender-v0", size=10, render_mode="rgb_array", obs_format="flat")
     check_env(env)
     model = PPO("MlpPolicy", env, verbose=1, device="cpu")
     new_logger = configure('log/ppo_custom_env', ["stdout", "csv", "tensorboard"])
@@ -31,8 +26,7 @@ if train:
 
 print('loading model')
 model = PPO.load("data/ppo_custom_env")
-env = gym.make("gymnasium_env/GridWorld-v0", size=10, render_mode="human")
-env = FlattenObservation(env)
+env = gym.make("gymnasium_env/GridWorldRender-v0", size=10, render_mode="human", obs_format="flat")
 (obs, _) = env.reset()
 done = False
 
@@ -1,15 +1,10 @@
 import gymnasium as gym
-from gymnasium_env.grid_world import GridWorldEnv
-from gymnasium.wrappers import FlattenObservation
+from gymnasium_env import register_envs
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_checker import check_env
 
-gym.register(
-    id="gymnasium_env/GridWorld-v0",
-    entry_point=GridWorldEnv,
-)
-env = gym.make("gymnasium_env/GridWorld-v0", size=5)
-env = FlattenObservation(env)
+register_envs()
+env = gym.make("gymnasium_env/GridWorld-v0", size=5, obs_format="flat")
 check_env(env)
 
 model = PPO("MlpPolicy", env, verbose=1)